@@ -22,7 +22,7 @@ bl_info = {
 
 import bpy  # noqa: E402
 
-from . import rendering, ui_elements, ui_layout  # noqa: E402
+from . import rendering, scheduler, ui_elements, ui_layout  # noqa: E402
 
 CLASSES = (
     ui_elements.DataElements, 
@@ -32,6 +32,7 @@ CLASSES = (
     ui_elements.ParameterSettingsElements,
     ui_elements.RenderSettingsElements,
     rendering.RENDER_OT_render,
+    rendering.RENDER_OT_dry_run,
     ui_layout.WM_OT_parameter_tuning, 
     ui_layout.WM_OT_render_settings,
     ui_layout.VIEW3D_PT_objects, 
@@ -48,11 +49,14 @@ def register():
             c.register()
     
 def unregister():
+    # Handlers of a render that's still running would outlive the addon
+    scheduler.remove_stale_handlers()
+
     for c in reversed(CLASSES):
         bpy.utils.unregister_class(c)
 
         if hasattr(c, 'unregister') and callable(c.unregister):
-            c.register()
+            c.unregister()
     
 if __name__ == '__main__':
     register()
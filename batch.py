@@ -0,0 +1,254 @@
+"""
+Headless entry point for rendering a dataset from a job file:
+
+    blender -b scene.blend -P batch.py -- job.json
+
+The job file (JSON or TOML) mirrors the addon's property groups. Every section
+and key is optional; anything left out keeps the value saved in the .blend.
+Objects, collections and materials are referenced by name.
+
+    {
+        "objects": {"camera": "Camera", "camera_track": "Track", "rgb_bin": "RGB", ...},
+        "segmentation_colors": {"bin_int_mat": "SEG Interior", "grease": [1, 1, 0], ...},
+        "materials": {"bin_int_mat": "Bin Interior", "bin_int_group": "Group", ...},
+        "parameters": {"azimuth_step": 10, "max_elevation": 60, ...},
+        "render_settings": {"directory": "/data/renders", "render_sequence": "0", ...}
+    }
+"""
+import bpy
+import os
+import sys
+
+if __name__ == '__main__' and not __package__:
+    # Blender runs `-P` scripts as loose files, so load this directory as the
+    # addon package and hand over to the packaged copy of this module.
+    import importlib.util
+
+    _addon_dir: str = os.path.dirname(os.path.abspath(__file__))
+    _spec = importlib.util.spec_from_file_location(
+        'gb_render', os.path.join(_addon_dir, '__init__.py'), submodule_search_locations=[_addon_dir]
+    )
+    _addon = importlib.util.module_from_spec(_spec)
+    sys.modules['gb_render'] = _addon
+    _spec.loader.exec_module(_addon)
+
+    # The addon might already be enabled in the user's preferences
+    if not hasattr(bpy.types.Scene, 'gb_data'):
+        _addon.register()
+
+    from gb_render import batch
+    sys.exit(batch.main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []))
+
+import argparse  # noqa: E402
+import hashlib  # noqa: E402
+import json  # noqa: E402
+import time  # noqa: E402
+import tomllib  # noqa: E402
+
+from bpy.types import Context, Scene, PropertyGroup  # noqa: E402
+from .utils import AnimationSequence, RenderConfig, RENDER_SEQUENCES, get_objects, create_frames, plan_report, print_plan_report, check_disk_space  # noqa: E402
+from .profiling import RunProfile  # noqa: E402
+from .work_queue import WorkQueue, Lease  # noqa: E402
+
+# Job file sections and the scene property groups they are applied to
+JOB_SECTIONS: dict[str, str] = {
+    'objects': 'object_selection_elements',
+    'segmentation_colors': 'segmentation_colors_elements',
+    'materials': 'material_elements',
+    'parameters': 'parameter_settings_elements',
+    'render_settings': 'render_settings_elements'
+}
+
+# Where pointer properties look up the names given in a job file
+DATA_BLOCKS: dict[str, str] = {
+    'Object': 'objects',
+    'Collection': 'collections',
+    'Material': 'materials'
+}
+
+def load_job(path: str) -> dict:
+    with open(path, 'rb') as f:
+        if path.endswith('.toml'):
+            return tomllib.load(f)
+        return json.load(f)
+
+def apply_job(scene: Scene, job: dict):
+    for section, values in job.items():
+        if section not in JOB_SECTIONS:
+            raise Exception(f'Unknown job section "{section}". Expected one of: {", ".join(JOB_SECTIONS)}')
+
+        props: PropertyGroup = getattr(scene, JOB_SECTIONS[section])
+        for key, value in values.items():
+            prop = props.bl_rna.properties.get(key)
+            if prop is None:
+                raise Exception(f'Unknown setting "{key}" in job section "{section}"')
+
+            # Pointers are given by name and looked up in the matching bpy.data collection
+            if prop.type == 'POINTER':
+                data_blocks = getattr(bpy.data, DATA_BLOCKS[prop.fixed_type.identifier])
+                if value not in data_blocks:
+                    raise Exception(f'"{value}" for "{section}.{key}" does not exist in this file')
+                value = data_blocks[value]
+            elif prop.type == 'ENUM':
+                value = str(value)
+
+            setattr(props, key, value)
+
+def shard_frames(frame_start: int, frame_end: int, index: int, count: int, interleave: bool=False) -> list[int]:
+    frames: list[int] = list(range(frame_start, frame_end + 1))
+    if interleave:
+        return frames[index::count]
+
+    # Contiguous blocks, the first shards take one extra frame when it doesn't divide evenly
+    size, remainder = divmod(len(frames), count)
+    start: int = index*size + min(index, remainder)
+    return frames[start:start + size + (1 if index < remainder else 0)]
+
+def run_job(ctx: Context, job: dict, shard: tuple[int, int] | None=None, interleave: bool=False,
+            threads: int=0, write_metadata: bool=True, metadata_only: bool=False, legacy_keyframes: bool=False,
+            dry_run: bool=False, queue: WorkQueue | None=None, chunk_size: int=50, resume: bool=False):
+    scene: Scene = ctx.scene
+    apply_job(scene, job)
+
+    # Chunks can come back from other workers half rendered, so queue workers always skip finished frames.
+    # Relaunched workers do too, rather than clearing what they rendered before crashing.
+    if queue is not None or resume:
+        scene.render_settings_elements.resume = True
+
+    if threads > 0:
+        scene.render.threads_mode = 'FIXED'
+        scene.render.threads = threads
+
+    # Same validation the render operator does
+    get_objects(scene)
+    directory: str = bpy.path.abspath(scene.render_settings_elements.directory)
+    if directory == '' or not os.path.isdir(directory):
+        raise Exception(f'Render directory "{directory}" does not exist')
+
+    # Every worker checks the whole plan, which errs on the side of refusing
+    if not metadata_only:
+        report: dict = plan_report(scene)
+        print_plan_report(report)
+        if dry_run:
+            return
+        check_disk_space(report)
+
+    start: float = time.perf_counter()
+
+    profile: RunProfile = RunProfile()
+    with profile.phase('create_frames'):
+        frames = create_frames(scene)
+
+    # Shards and queue workers keep separate manifests so workers never append to the same file
+    manifest_name: str = 'manifest'
+    if shard is not None:
+        manifest_name = f'manifest_{shard[0]:02d}'
+    elif queue is not None:
+        manifest_name = f'manifest_{queue.worker}'
+    animation: AnimationSequence = AnimationSequence(ctx, frames, manifest_name=manifest_name, bulk_keyframes=not legacy_keyframes,
+                                                     profile=profile, force_keyframes=legacy_keyframes, metadata_only=metadata_only)
+
+    if metadata_only:
+        animation.create_metadata()
+        return
+
+    if queue is not None:
+        run_queue(animation, queue, frames, chunk_size, RENDER_SEQUENCES[int(scene.render_settings_elements.render_sequence)])
+        animation.close_shards()
+
+        # Whoever sees the queue finished first writes metadata.json
+        if write_metadata and queue.finished() and queue.claim('metadata'):
+            animation.create_metadata()
+        animation.finish_run()
+
+        print(f'Worker {queue.worker} finished in {time.perf_counter() - start:.1f}s')
+        return
+
+    # Every shard keyframes the whole plan, so frame numbers and file names stay globally consistent
+    shard_frame_list: list[int] | None = None
+    if shard is not None:
+        shard_frame_list = shard_frames(scene.frame_start, scene.frame_end, *shard, interleave)
+        print(f'Shard {shard[0] + 1}/{shard[1]}: rendering {len(shard_frame_list)} of {scene.frame_end - scene.frame_start + 1} frames')
+
+    for frame_type in RENDER_SEQUENCES[int(scene.render_settings_elements.render_sequence)]:
+        print(f'Rendering {frame_type.value} frames')
+        animation.render(frame_type, blocking=True, frames=shard_frame_list)
+
+    animation.close_shards()
+
+    if write_metadata:
+        animation.create_metadata()
+    animation.finish_run()
+
+    print(f'Animation rendered successfully in {time.perf_counter() - start:.1f}s')
+
+def run_queue(animation: AnimationSequence, queue: WorkQueue, frames, chunk_size: int, frame_types: tuple):
+    """
+    Renders chunks from the queue until none are left, waiting on chunks other workers still hold
+    in case their lease runs out.
+    """
+    # Every worker plans on its own, so the plans have to match before sharing a queue
+    queue.publish([int(frame) for frame in frames['frame']], chunk_size, hashlib.sha256(frames.tobytes()).hexdigest())
+    queue.requeue_own()
+
+    while True:
+        lease: Lease | None = queue.lease()
+        if lease is None:
+            if queue.finished():
+                return
+            time.sleep(min(queue.lease_timeout/4, 30))
+            continue
+
+        print(f'Worker {queue.worker}: rendering chunk {lease.chunk} ({len(lease.frames)} frames), {queue.status()}')
+        try:
+            for frame_type in frame_types:
+                animation.render(frame_type, blocking=True, frames=lease.frames)
+        except BaseException:
+            queue.release(lease)
+            raise
+
+        if not queue.complete(lease):
+            print(f'Lease on chunk {lease.chunk} expired before it finished, another worker picked it up')
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog='blender -b scene.blend -P batch.py --', description='Render a dataset from a job file')
+    parser.add_argument('job', help='Path to a .json or .toml job file')
+    parser.add_argument('--shard', nargs=2, type=int, metavar=('INDEX', 'COUNT'), help='Only render shard INDEX (zero based) of COUNT')
+    parser.add_argument('--interleave', action='store_true', help='Shards take every COUNT-th frame instead of contiguous blocks')
+    parser.add_argument('--threads', type=int, default=0, help='Render threads, 0 detects the processor count')
+    parser.add_argument('--skip-metadata', action='store_true', help="Don't write metadata.json after rendering")
+    parser.add_argument('--metadata-only', action='store_true', help='Only write metadata.json')
+    parser.add_argument('--legacy-keyframes', action='store_true', help='Insert keyframes one frame at a time, for timing comparisons')
+    parser.add_argument('--resume', action='store_true', help="Skip frames already in the completion manifest, even if the job turns resume off")
+    parser.add_argument('--dry-run', action='store_true', help='Only report the frames, time and disk space the render would take')
+    parser.add_argument('--queue', nargs='?', const='', metavar='FOLDER',
+                        help='Lease chunks from a work queue shared with other workers, by default in the dataset folder')
+    parser.add_argument('--worker', help='Name of this queue worker, defaults to the host name and process id')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Frames per queue chunk')
+    parser.add_argument('--lease-timeout', type=float, default=600, help='Seconds without a heartbeat before a chunk is handed out again')
+    args = parser.parse_args(argv)
+
+    if args.shard is not None and not 0 <= args.shard[0] < args.shard[1]:
+        parser.error('--shard INDEX must be between 0 and COUNT - 1')
+    if args.queue is not None and args.shard is not None:
+        parser.error('--queue and --shard can\'t be used together')
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+
+    try:
+        job: dict = load_job(args.job)
+
+        queue: WorkQueue | None = None
+        if args.queue is not None:
+            apply_job(bpy.context.scene, job)
+            folder: str = args.queue or os.path.join(RenderConfig(bpy.context.scene).dataset_folder, 'queue')
+            queue = WorkQueue(bpy.path.abspath(folder), args.worker, args.lease_timeout)
+
+        run_job(bpy.context, job, shard=args.shard, interleave=args.interleave, threads=args.threads,
+                write_metadata=not args.skip_metadata, metadata_only=args.metadata_only, legacy_keyframes=args.legacy_keyframes,
+                dry_run=args.dry_run, queue=queue, chunk_size=args.chunk_size, resume=args.resume)
+    except Exception as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+    return 0
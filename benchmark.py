@@ -0,0 +1,419 @@
+"""
+Benchmark suite that builds a synthetic grease bin scene and times the render pipeline:
+
+    blender -b --factory-startup -P benchmark.py -- --output results.json
+
+The scene has everything get_objects expects, so results only depend on the addon,
+Blender and the machine. Results are JSON with the commit they were measured on,
+and `--compare` prints the ratios to an earlier results file.
+"""
+import bpy
+import os
+import sys
+
+if __name__ == '__main__' and not __package__:
+    # Blender runs `-P` scripts as loose files, so load this directory as the
+    # addon package and hand over to the packaged copy of this module.
+    import importlib.util
+
+    _addon_dir: str = os.path.dirname(os.path.abspath(__file__))
+    _spec = importlib.util.spec_from_file_location(
+        'gb_render', os.path.join(_addon_dir, '__init__.py'), submodule_search_locations=[_addon_dir]
+    )
+    _addon = importlib.util.module_from_spec(_spec)
+    sys.modules['gb_render'] = _addon
+    _spec.loader.exec_module(_addon)
+
+    # The addon might already be enabled in the user's preferences
+    if not hasattr(bpy.types.Scene, 'gb_data'):
+        _addon.register()
+
+    from gb_render import benchmark
+    sys.exit(benchmark.main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []))
+
+import argparse  # noqa: E402
+import bmesh  # noqa: E402
+import json  # noqa: E402
+import math  # noqa: E402
+import platform  # noqa: E402
+import shutil  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import numpy as np  # noqa: E402
+
+from types import SimpleNamespace  # noqa: E402
+from bpy.types import Context, Scene, Object, Collection, Material, ShaderNodeTree  # noqa: E402
+from .utils import AnimationSequence, FrameType, create_frames  # noqa: E402
+from .planner import plan_grid  # noqa: E402
+from .output import FrameWriter  # noqa: E402
+from .profiling import RunProfile  # noqa: E402
+
+# Bumped whenever a benchmark changes, results are only comparable within a version
+BENCHMARK_VERSION: int = 1
+
+# Sweep for the keyframe benchmark, 5 liquid levels x 3 zooms x 6 elevations x 12 azimuths = 1080 frames
+SCENE_PARAMETERS: dict[str, object] = {
+    'starting_liquid_level': 20,
+    'liquid_level_step': 20,
+    'azimuth_step': 30,
+    'starting_elevation': 10,
+    'max_elevation': 60,
+    'elevation_step': 10,
+    'starting_zoom': 1,
+    'zoom_step': 0.5,
+    'zoom_levels': 3,
+    'focal_length': 50
+}
+
+# Sweep for the plan benchmark, 10 liquid levels x 10 zooms x 90 elevations x 360 azimuths = 3.24M frames
+PLAN_PARAMETERS: SimpleNamespace = SimpleNamespace(
+    starting_liquid_level=10, liquid_level_step=10, azimuth_step=1, starting_elevation=1, max_elevation=90,
+    elevation_step=1, starting_zoom=0.5, zoom_step=0.1, zoom_levels=10
+)
+
+def build_scene(scene: Scene, directory: str, resolution: int, samples: int):
+    """
+    Replaces the scene's contents with a bin, grease, cutters, a camera on a track and the
+    compositor setup the addon switches between images and masks with.
+    """
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+
+    rgb_collection: Collection = new_collection(scene, 'GB RGB')
+    seg_collection: Collection = new_collection(scene, 'GB SEG')
+
+    # Shaders are wrapped in a node group with float inputs, like the production materials
+    group: ShaderNodeTree = bpy.data.node_groups.new('GB Benchmark Shader', 'ShaderNodeTree')
+    group.interface.new_socket('Roughness', in_out='INPUT', socket_type='NodeSocketFloat')
+    group.interface.new_socket('Shader', in_out='OUTPUT', socket_type='NodeSocketShader')
+    group_input = group.nodes.new('NodeGroupInput')
+    group_output = group.nodes.new('NodeGroupOutput')
+    bsdf = group.nodes.new('ShaderNodeBsdfPrincipled')
+    group.links.new(group_input.outputs['Roughness'], bsdf.inputs['Roughness'])
+    group.links.new(bsdf.outputs['BSDF'], group_output.inputs['Shader'])
+
+    bin_interior: Material = shader_material('GB Bin Interior', group)
+    bin_exterior: Material = shader_material('GB Bin Exterior', group)
+    grease_material: Material = shader_material('GB Grease', group)
+
+    seg_props = scene.segmentation_colors_elements
+    seg_interior: Material = emission_material('GB SEG Interior', tuple(seg_props.bin_interior))
+    seg_exterior: Material = emission_material('GB SEG Exterior', tuple(seg_props.bin_exterior))
+    seg_rim: Material = emission_material('GB SEG Rim', tuple(seg_props.bin_rim))
+    seg_grease: Material = emission_material('GB SEG Grease', tuple(seg_props.grease))
+
+    # Meshes sit on the ground, cutters remove everything above their origin
+    bin_height: float = 2
+    grease_height: float = 1.8
+    new_mesh_object('GB Bin', rgb_collection, bin_exterior, lambda bm: cylinder(bm, 1, bin_height))
+    new_mesh_object('GB SEG Bin', seg_collection, seg_exterior, lambda bm: cylinder(bm, 1, bin_height))
+    grease: Object = new_mesh_object('GB Grease', rgb_collection, grease_material, lambda bm: cylinder(bm, 0.95, grease_height))
+    seg_grease_object: Object = new_mesh_object('GB SEG Grease', seg_collection, seg_grease, lambda bm: cylinder(bm, 0.95, grease_height))
+
+    bin_cutter: Object = new_mesh_object('GB Bin Cutter', scene.collection, None, lambda bm: block(bm, 4))
+    seg_cutter: Object = new_mesh_object('GB SEG Cutter', scene.collection, None, lambda bm: block(bm, 4))
+    for cutter, target in ((bin_cutter, grease), (seg_cutter, seg_grease_object)):
+        cutter.hide_render = True
+        modifier = target.modifiers.new('Cutter', 'BOOLEAN')
+        modifier.operation = 'DIFFERENCE'
+        modifier.object = cutter
+
+    # The track is a vertical circle, rotating it around Z sets the azimuth and scaling it sets the zoom
+    track_data = bpy.data.curves.new('GB Camera Track', 'CURVE')
+    track_data.dimensions = '3D'
+    track_data.use_path = True
+    spline = track_data.splines.new('POLY')
+    spline.points.add(63)
+    for i, point in enumerate(spline.points):
+        angle: float = 2*math.pi*i/64
+        point.co = (6*math.cos(angle), 6*math.sin(angle), 0, 1)
+    spline.use_cyclic_u = True
+
+    camera_track: Object = bpy.data.objects.new('GB Camera Track', track_data)
+    camera_track.rotation_euler = (0, math.radians(90), 0)
+    scene.collection.objects.link(camera_track)
+
+    camera: Object = bpy.data.objects.new('GB Camera', bpy.data.cameras.new('GB Camera'))
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+    follow_path = camera.constraints.new('FOLLOW_PATH')
+    follow_path.name = 'Follow Path'
+    follow_path.target = camera_track
+    track_to = camera.constraints.new('TRACK_TO')
+    track_to.target = grease
+    track_to.track_axis = 'TRACK_NEGATIVE_Z'
+    track_to.up_axis = 'UP_Y'
+
+    sun: Object = bpy.data.objects.new('GB Sun', bpy.data.lights.new('GB Sun', 'SUN'))
+    sun.rotation_euler = (math.radians(40), 0, math.radians(30))
+    scene.collection.objects.link(sun)
+
+    # Render layers feed a switch, off is the image and on is the emission pass for masks
+    scene.use_nodes = True
+    scene.view_layers['ViewLayer'].use_pass_emit = True
+    tree = scene.node_tree
+    tree.nodes.clear()
+    render_layers = tree.nodes.new('CompositorNodeRLayers')
+    switch = tree.nodes.new('CompositorNodeSwitch')
+    switch.name = 'Switch'
+    composite = tree.nodes.new('CompositorNodeComposite')
+    tree.links.new(render_layers.outputs['Image'], switch.inputs[0])
+    tree.links.new(render_layers.outputs['Emit'], switch.inputs[1])
+    tree.links.new(switch.outputs[0], composite.inputs['Image'])
+
+    object_props = scene.object_selection_elements
+    object_props.camera = camera
+    object_props.camera_track = camera_track
+    object_props.bin_cutter = bin_cutter
+    object_props.seg_bin_cutter = seg_cutter
+    object_props.grease = grease
+    object_props.rgb_bin = rgb_collection
+    object_props.seg_bin = seg_collection
+
+    mat_props = scene.material_elements
+    mat_props.bin_int_mat = bin_interior
+    mat_props.bin_ext_mat = bin_exterior
+    mat_props.grease_mat = grease_material
+    mat_props.bin_int_group = 'Group'
+    mat_props.bin_ext_group = 'Group'
+    mat_props.grease_group = 'Group'
+
+    seg_props.bin_int_mat = seg_interior
+    seg_props.bin_ext_mat = seg_exterior
+    seg_props.bin_rim_mat = seg_rim
+    seg_props.grease_mat = seg_grease
+
+    param_props = scene.parameter_settings_elements
+    for key, value in SCENE_PARAMETERS.items():
+        setattr(param_props, key, value)
+
+    render_props = scene.render_settings_elements
+    render_props.directory = directory
+    render_props.dataset_name = 'benchmark'
+    render_props.resume = False
+    render_props.width = resolution
+    render_props.height = resolution
+    render_props.sample_amount = samples
+    render_props.render_sequence = '0'
+
+    # Fixed seed and device so runs are comparable
+    scene.cycles.device = 'CPU'
+    scene.cycles.seed = 0
+
+def new_collection(scene: Scene, name: str) -> Collection:
+    collection: Collection = bpy.data.collections.new(name)
+    scene.collection.children.link(collection)
+    return collection
+
+def new_mesh_object(name: str, collection: Collection, material: Material | None, build) -> Object:
+    mesh = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    build(bm)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    if material is not None:
+        mesh.materials.append(material)
+
+    obj: Object = bpy.data.objects.new(name, mesh)
+    collection.objects.link(obj)
+    return obj
+
+def cylinder(bm, radius: float, height: float):
+    bmesh.ops.create_cone(bm, cap_ends=True, segments=48, radius1=radius, radius2=radius, depth=height)
+    bmesh.ops.translate(bm, verts=bm.verts, vec=(0, 0, height/2))
+
+def block(bm, size: float):
+    bmesh.ops.create_cube(bm, size=size)
+    bmesh.ops.translate(bm, verts=bm.verts, vec=(0, 0, size/2))
+
+def shader_material(name: str, group: ShaderNodeTree) -> Material:
+    material: Material = bpy.data.materials.new(name)
+    material.use_nodes = True
+    nodes = material.node_tree.nodes
+    nodes.clear()
+
+    group_node = nodes.new('ShaderNodeGroup')
+    group_node.name = 'Group'
+    group_node.node_tree = group
+    output = nodes.new('ShaderNodeOutputMaterial')
+    material.node_tree.links.new(group_node.outputs['Shader'], output.inputs['Surface'])
+
+    return material
+
+def emission_material(name: str, color: tuple[float, float, float]) -> Material:
+    material: Material = bpy.data.materials.new(name)
+    material.use_nodes = True
+    nodes = material.node_tree.nodes
+    nodes.clear()
+
+    # Segmentation colors are read from and written to the material's RGB node
+    rgb = nodes.new('ShaderNodeRGB')
+    rgb.outputs[0].default_value = (*color, 1)
+    emission = nodes.new('ShaderNodeEmission')
+    output = nodes.new('ShaderNodeOutputMaterial')
+    material.node_tree.links.new(rgb.outputs[0], emission.inputs['Color'])
+    material.node_tree.links.new(emission.outputs['Emission'], output.inputs['Surface'])
+
+    return material
+
+def bench_plan(repeats: int=3) -> dict:
+    # Best of several runs, the first one also pays for allocating the arrays
+    times: list[float] = []
+    for _ in range(repeats):
+        start: float = time.perf_counter()
+        frames: int = len(plan_grid(PLAN_PARAMETERS))
+        times.append(time.perf_counter() - start)
+
+    return {'frames': frames, 'seconds': min(times), 'frames_per_second': frames/min(times)}
+
+def bench_keyframes(ctx: Context, frames: np.ndarray, bulk: bool) -> dict:
+    profile: RunProfile = RunProfile()
+    AnimationSequence(ctx, frames, bulk_keyframes=bulk, profile=profile, force_keyframes=True)
+    seconds: float = profile.summary()['generate_keyframes']['total']
+
+    return {'frames': len(frames), 'seconds': seconds, 'frames_per_second': len(frames)/seconds}
+
+def bench_render(ctx: Context, frames: np.ndarray, frame_type: FrameType, count: int) -> dict:
+    profile: RunProfile = RunProfile()
+    animation: AnimationSequence = AnimationSequence(ctx, frames, profile=profile)
+
+    # The first frame builds the BVH and loads kernels, so it's timed separately
+    animation.render(frame_type, blocking=True, frames=list(range(1, count + 2)))
+    times: list[float] = [duration for name, _, duration, _ in profile.events if name == f'render_{frame_type.value}']
+    save_times: list[float] = [duration for name, _, duration, _ in profile.events if name == 'save_frame']
+
+    return {
+        'frames': count,
+        'first_frame_seconds': times[0],
+        'mean_seconds': float(np.mean(times[1:])),
+        'median_seconds': float(np.median(times[1:])),
+        'frames_per_second': 1/float(np.mean(times[1:])),
+        'save_seconds': float(np.mean(save_times[1:]))
+    }
+
+def bench_io(directory: str, resolution: int, count: int) -> dict:
+    # Smooth gradients with a little noise compress roughly like renders
+    rng: np.random.Generator = np.random.default_rng(0)
+    y, x = np.mgrid[0:resolution, 0:resolution]/resolution
+    image: np.ndarray = np.stack([x, y, (x + y)/2, np.ones_like(x)], axis=-1).astype(np.float32)
+    image[..., :3] += rng.normal(0, 0.02, (resolution, resolution, 3)).astype(np.float32)
+
+    writer: FrameWriter = FrameWriter(workers=min(os.cpu_count() or 1, 4))
+    start: float = time.perf_counter()
+    for i in range(count):
+        buffer: np.ndarray = writer.acquire(image.size)
+        buffer[:] = image.ravel()
+        writer.submit(buffer, resolution, resolution, os.path.join(directory, f'io_{resolution}_{i:04d}.png'), channels=3)
+    writer.close()
+    seconds: float = time.perf_counter() - start
+
+    written: int = sum(os.path.getsize(os.path.join(directory, f'io_{resolution}_{i:04d}.png')) for i in range(count))
+    return {
+        'frames': count,
+        'seconds': seconds,
+        'frames_per_second': count/seconds,
+        'megapixels_per_second': count*resolution*resolution/seconds/1e6,
+        'megabytes_written': written/1e6
+    }
+
+def run_benchmarks(ctx: Context, render_frames: int, resolution: int, samples: int, io_resolutions: list[int], io_frames: int) -> dict:
+    results: dict[str, dict] = {}
+    directory: str = tempfile.mkdtemp(prefix='gb-benchmark-')
+    try:
+        build_scene(ctx.scene, directory, resolution, samples)
+
+        print('Benchmarking frame planning')
+        results['plan'] = bench_plan()
+
+        frames: np.ndarray = create_frames(ctx.scene)
+        print('Benchmarking keyframes')
+        results['keyframes_bulk'] = bench_keyframes(ctx, frames, bulk=True)
+        results['keyframes_legacy'] = bench_keyframes(ctx, frames, bulk=False)
+
+        print('Benchmarking mask renders')
+        results['render_mask'] = bench_render(ctx, frames, FrameType.MASK, render_frames)
+        print('Benchmarking RGB renders')
+        results['render_rgb'] = bench_render(ctx, frames, FrameType.RAW, render_frames)
+
+        # Single pass renders read the sequence from the scene, like the other passes
+        print('Benchmarking single pass renders')
+        ctx.scene.render_settings_elements.render_sequence = '3'
+        try:
+            results['render_combined'] = bench_render(ctx, frames, FrameType.COMBINED, render_frames)
+        finally:
+            ctx.scene.render_settings_elements.render_sequence = '0'
+
+        # Above 1 when one pass over both view layers beats a mask pass and an RGB pass
+        separate: float = results['render_mask']['mean_seconds'] + results['render_rgb']['mean_seconds']
+        results['single_pass_speedup'] = {'ratio': separate/results['render_combined']['mean_seconds']}
+
+        for io_resolution in io_resolutions:
+            print(f'Benchmarking output at {io_resolution}x{io_resolution}')
+            results[f'io_{io_resolution}'] = bench_io(directory, io_resolution, io_frames)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict):
+    if baseline.get('benchmark_version') != results['benchmark_version']:
+        print('Warning: the baseline was measured with a different benchmark version')
+
+    print(f'Compared to {baseline.get("commit") or "baseline"} (ratio above 1 is faster):')
+    for name, metrics in results['results'].items():
+        old: dict | None = baseline['results'].get(name)
+        if old is None or 'frames_per_second' not in old:
+            continue
+        print(f'  {name:<20} {metrics["frames_per_second"]/old["frames_per_second"]:.3f}x')
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog='blender -b --factory-startup -P benchmark.py --', description='Benchmark the render pipeline on a synthetic scene')
+    parser.add_argument('--output', default='benchmark.json', help='Where to write the results')
+    parser.add_argument('--frames', type=int, default=8, help='Frames rendered for each render benchmark, after one warm up frame')
+    parser.add_argument('--resolution', type=int, default=256, help='Render resolution for the render benchmarks')
+    parser.add_argument('--samples', type=int, default=16, help='Samples for RGB frames')
+    parser.add_argument('--io-resolutions', type=int, nargs='+', default=[512, 1024, 2048], help='Resolutions for the output benchmarks')
+    parser.add_argument('--io-frames', type=int, default=16, help='Frames written for each output benchmark')
+    parser.add_argument('--compare', metavar='RESULTS', help='Earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    try:
+        results: dict = {
+            'benchmark_version': BENCHMARK_VERSION,
+            'commit': git_commit(),
+            'blender_version': bpy.app.version_string,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.time(),
+            'settings': {
+                'frames': args.frames,
+                'resolution': args.resolution,
+                'samples': args.samples,
+                'io_resolutions': args.io_resolutions,
+                'io_frames': args.io_frames
+            },
+            'results': run_benchmarks(bpy.context, args.frames, args.resolution, args.samples, args.io_resolutions, args.io_frames)
+        }
+    except Exception as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps(results['results'], indent=4))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    return 0
@@ -0,0 +1,131 @@
+"""
+Picks RGB sampling settings that fit a per-frame time budget. A few probe frames
+from the corners of the sweep are rendered at decreasing noise thresholds, and the
+lowest threshold whose slowest probe fits the budget is used. When none fit, the
+sample count is lowered instead. Workers that start together calibrate once, the
+first to claim a lock file runs the probes. This module doesn't import bpy.
+"""
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+# Adaptive sampling noise thresholds to try, from fastest to cleanest
+THRESHOLDS: tuple[float, ...] = (0.1, 0.05, 0.02, 0.01)
+
+# The calibrating worker touches its lock after every probe, a lock untouched for longer is abandoned
+LOCK_TIMEOUT: float = 3600
+
+def probe_frames(plan: np.ndarray) -> list[int]:
+    """
+    Frames closest to the lowest and highest elevation with the emptiest and fullest bin,
+    taken from the middle of their azimuth and zoom sweep on a grid.
+    """
+    elevation: np.ndarray = normalize(plan['elevation'])
+    liquid_level: np.ndarray = normalize(plan['liquid_level'])
+
+    probes: set[int] = set()
+    for elevation_corner in (0, 1):
+        for liquid_level_corner in (0, 1):
+            distance: np.ndarray = np.square(elevation - elevation_corner) + np.square(liquid_level - liquid_level_corner)
+            rows: np.ndarray = np.flatnonzero(distance == distance.min())
+            probes.add(int(plan['frame'][rows[len(rows)//2]]))
+
+    return sorted(probes)
+
+def normalize(values: np.ndarray) -> np.ndarray:
+    spread: float = float(values.max() - values.min())
+    return (values - values.min())/spread if spread > 0 else np.zeros(len(values))
+
+def choose_settings(measurements: dict[float, list[float]], samples: int, budget: float) -> dict:
+    """
+    Settings from probe times per noise threshold, all measured with `samples` as the sample limit.
+    Render time is assumed to scale linearly with samples.
+    """
+    fitting: list[float] = [threshold for threshold, times in measurements.items() if max(times) <= budget]
+    if len(fitting) > 0:
+        threshold: float = min(fitting)
+        chosen_samples: int = samples
+    else:
+        threshold: float = max(measurements)
+        chosen_samples: int = max(1, int(samples*budget/max(measurements[threshold])))
+
+    return {
+        'budget': budget,
+        'samples': chosen_samples,
+        'adaptive_threshold': threshold,
+        'predicted_seconds': max(measurements[threshold])*chosen_samples/samples,
+
+        # Only cuts off outliers, so frames stay deterministic
+        'time_limit': 2*budget,
+        'measurements': {str(threshold): times for threshold, times in measurements.items()}
+    }
+
+def claim_lock(path: str) -> bool:
+    """
+    Creates the lock file with this worker as its owner, or returns False if another worker holds it.
+    """
+    try:
+        fd: int = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+
+    try:
+        os.write(fd, json.dumps({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time()}).encode())
+    finally:
+        os.close(fd)
+    return True
+
+def read_lock(path: str) -> dict | None:
+    # None when the lock is gone, or its owner died before writing it
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def lock_is_stale(path: str, owner: dict | None, timeout: float=LOCK_TIMEOUT) -> bool:
+    """
+    True when the owner is a process on this host that no longer runs, or the lock wasn't touched
+    within the timeout.
+    """
+    try:
+        age: float = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return False
+    if age > timeout:
+        return True
+
+    if owner is None or owner.get('host') != socket.gethostname():
+        return False
+    try:
+        os.kill(owner['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        # The owner runs under another user, so it's alive
+        pass
+    return False
+
+def break_lock(path: str, owner: dict | None):
+    """
+    Removes a stale lock, unless another worker already replaced it with a lock of its own.
+    """
+    stale_path: str = f'{path}.{socket.gethostname()}-{os.getpid()}.stale'
+    try:
+        os.rename(path, stale_path)
+    except FileNotFoundError:
+        return
+
+    # Another worker broke the lock first and claimed it again, so that lock goes back
+    if read_lock(stale_path) != owner:
+        try:
+            os.link(stale_path, path)
+        except FileExistsError:
+            pass
+    os.remove(stale_path)
+
+def describe_owner(owner: dict | None) -> str:
+    return 'another worker' if owner is None else f'process {owner["pid"]} on {owner["host"]}'
@@ -0,0 +1,36 @@
+"""
+Content hashes for planned frames. A frame's hash covers its pose and every
+setting that changes its pixels, so a file rendered once can be found again after
+the plan changes, even under a different frame number or in another dataset. This
+module doesn't import bpy.
+"""
+import hashlib
+import json
+
+import numpy as np
+
+# Plan columns that place the camera and the grease, the frame number only names the file
+POSE_COLUMNS: tuple[str, ...] = ('azimuth', 'elevation', 'zoom', 'liquid_level')
+
+def settings_digest(settings: dict) -> str:
+    # Blender colors are property arrays, they're hashed as lists
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=list).encode()).hexdigest()
+
+def frame_hashes(frames: np.ndarray, settings: dict) -> dict[int, str]:
+    digest: str = settings_digest(settings)
+
+    hashes: dict[int, str] = {}
+    for row in frames[['frame', *POSE_COLUMNS]].tolist():
+        # Rounded, so the same pose planned through a different step or sampler still matches
+        pose: str = ','.join(f'{value:.6g}' for value in row[1:])
+        hashes[row[0]] = hashlib.sha256(f'{digest}:{pose}'.encode()).hexdigest()
+
+    return hashes
+
+def plan_hash(frames: np.ndarray, settings: dict) -> str:
+    # Changes when any frame moves to another number, unlike the frame hashes
+    digest = hashlib.sha256(settings_digest(settings).encode())
+    for column in ('frame', *POSE_COLUMNS):
+        digest.update(np.ascontiguousarray(frames[column], dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
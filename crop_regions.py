@@ -0,0 +1,85 @@
+import bpy
+import numpy as np
+
+from bpy.types import Scene, Object
+from bpy_extras.object_utils import world_to_camera_view
+from mathutils import Vector
+
+from .crops import crop_rect
+
+class CropRegions():
+    """
+    Render borders around the bin for every frame, from where the planned pose puts the camera.
+    Render jobs only read the border once, so cropped frames have to be rendered one at a time.
+    """
+    def __init__(self, scene: Scene, camera: Object, objects: list[Object], frames: np.ndarray, padding: float, crop: bool):
+        self.__scene: Scene = scene
+        self.__camera: Object = camera
+        self.__objects: list[Object] = objects
+        self.__frames: np.ndarray = frames
+        self.__padding: float = padding
+        self.__crop: bool = crop
+
+        # x, y, width and height in pixels from the top left, for every frame
+        self.rects: np.ndarray = np.zeros((len(frames), 4), dtype=np.int32)
+        self.__saved: dict[str, object] | None = None
+
+    def plan(self):
+        width, height = self.resolution()
+        corners: list[Vector] = self.__bounds()
+
+        # The border only depends on azimuth, elevation and zoom, so each pose is evaluated once
+        _, first_frames, pose_ids = np.unique(self.__frames[['azimuth', 'elevation', 'zoom']], return_index=True, return_inverse=True)
+        rects: np.ndarray = np.empty((len(first_frames), 4), dtype=np.int32)
+
+        current_frame: int = self.__scene.frame_current
+        for i, row in enumerate(first_frames):
+            self.__scene.frame_set(int(self.__frames['frame'][row]))
+            camera: Object = self.__camera.evaluated_get(bpy.context.evaluated_depsgraph_get())
+            points: np.ndarray = np.array([tuple(world_to_camera_view(self.__scene, camera, corner)) for corner in corners])
+            rects[i] = crop_rect(points, width, height, self.__padding)
+        self.__scene.frame_set(current_frame)
+
+        self.rects = rects[pose_ids.ravel()]
+        coverage: float = float(np.mean(self.rects[:, 2]*self.rects[:, 3]))/(width*height)
+        print(f'Planned crop regions for {len(first_frames)} camera poses, covering {coverage:.0%} of the image on average')
+
+    def apply(self, frame: int):
+        render = self.__scene.render
+        if self.__saved is None:
+            self.__saved = {name: getattr(render, name) for name in ('use_border', 'use_crop_to_border', 'border_min_x', 'border_max_x',
+                                                                     'border_min_y', 'border_max_y')}
+
+        width, height = self.resolution()
+        x, y, rect_width, rect_height = self.rects[frame - 1].tolist()
+
+        # Blender truncates border*size to whole pixels, half a pixel keeps it from landing one short.
+        # The border's y goes up from the bottom of the image.
+        render.use_border = True
+        render.use_crop_to_border = self.__crop
+        render.border_min_x = (x + .5)/width
+        render.border_max_x = min((x + rect_width + .5)/width, 1)
+        render.border_min_y = (height - y - rect_height + .5)/height
+        render.border_max_y = min((height - y + .5)/height, 1)
+
+    def restore(self):
+        if self.__saved is None:
+            return
+
+        for name, value in self.__saved.items():
+            setattr(self.__scene.render, name, value)
+        self.__saved = None
+
+    def resolution(self) -> tuple[int, int]:
+        render = self.__scene.render
+        scale: float = render.resolution_percentage/100
+        return int(render.resolution_x*scale), int(render.resolution_y*scale)
+
+    def __bounds(self) -> list[Vector]:
+        # Corners of the box around every object, the bins don't move between frames
+        points: np.ndarray = np.array([
+            tuple(obj.matrix_world @ Vector(corner)) for obj in self.__objects for corner in obj.bound_box
+        ])
+        low, high = points.min(axis=0), points.max(axis=0)
+
+        return [Vector((x, y, z)) for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])]
@@ -0,0 +1,28 @@
+"""
+Crop rectangles around the bin in pixels, from where its corners land in the camera
+view. This module doesn't import bpy.
+"""
+import math
+import numpy as np
+
+def crop_rect(points: np.ndarray, width: int, height: int, padding: float) -> np.ndarray:
+    """
+    Pixel rectangle from the top left around points in normalized camera view coordinates, grown by
+    padding as a fraction of the larger image side. The whole image if a point is behind the camera
+    or nothing is in view.
+    """
+    full: np.ndarray = np.array([0, 0, width, height])
+    if np.any(points[:, 2] <= 0):
+        return full
+
+    pad: float = padding*max(width, height)
+    x0: int = max(math.floor(points[:, 0].min()*width - pad), 0)
+    x1: int = min(math.ceil(points[:, 0].max()*width + pad), width)
+
+    # Camera view y goes up from the bottom
+    y0: int = max(math.floor((1 - points[:, 1].max())*height - pad), 0)
+    y1: int = min(math.ceil((1 - points[:, 1].min())*height + pad), height)
+
+    if x1 <= x0 or y1 <= y0:
+        return full
+    return np.array([x0, y0, x1 - x0, y1 - y0])
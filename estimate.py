@@ -0,0 +1,85 @@
+"""
+Render time and disk estimates for a planned render. Every finished run appends
+its measured seconds and bytes per frame to a history file in the render
+directory, and estimates come from the latest run with the same resolution and
+samples. This module doesn't import bpy.
+"""
+import json
+import os
+
+HISTORY_FILE: str = 'gb_render_history.jsonl'
+
+def append_history(directory: str, entry: dict):
+    with open(os.path.join(directory, HISTORY_FILE), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+def read_history(directory: str) -> list[dict]:
+    path: str = os.path.join(directory, HISTORY_FILE)
+    if not os.path.isfile(path):
+        return []
+
+    entries: list[dict] = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return entries
+
+def latest_measurement(history: list[dict], key: str, frame_type: str, width: int, height: int,
+                       samples: int | None=None) -> tuple[float, bool] | None:
+    """
+    Latest recorded value for a frame type, and whether it was measured with the same settings.
+    Otherwise the latest value with any settings is scaled by pixel count (and samples), or None
+    if the frame type was never measured.
+    """
+    entries: list[dict] = [entry for entry in history if entry['type'] == frame_type and entry.get(key) is not None]
+    for entry in reversed(entries):
+        if entry['width'] == width and entry['height'] == height and (samples is None or entry['samples'] == samples):
+            return entry[key], True
+
+    if len(entries) == 0:
+        return None
+
+    entry: dict = entries[-1]
+    scale: float = width*height/(entry['width']*entry['height'])
+    if samples is not None:
+        scale *= samples/entry['samples']
+
+    return entry[key]*scale, False
+
+def estimate_render(render_counts: dict[str, int], output_counts: dict[str, int], history: list[dict],
+                    width: int, height: int, samples: int) -> dict:
+    """
+    Predicted seconds for each render pass and bytes for each output type. Mask passes
+    always render with one sample, so their samples don't need to match.
+    """
+    seconds: dict[str, float | None] = {}
+    exact: bool = True
+    for frame_type, count in render_counts.items():
+        measured = latest_measurement(history, 'seconds_per_frame', frame_type, width, height, None if frame_type == 'mask' else samples)
+
+        # Cycles syncs both view layers of a single pass frame, so it costs up to an RGB and a mask frame
+        if measured is None and frame_type == 'combined':
+            rgb = latest_measurement(history, 'seconds_per_frame', 'raw', width, height, samples)
+            mask = latest_measurement(history, 'seconds_per_frame', 'mask', width, height)
+            measured = None if rgb is None else (rgb[0] + (0 if mask is None else mask[0]), False)
+
+        seconds[frame_type] = None if measured is None else measured[0]*count
+        exact = exact and measured is not None and measured[1]
+
+    disk: dict[str, float | None] = {}
+    for frame_type, count in output_counts.items():
+        measured = latest_measurement(history, 'bytes_per_frame', frame_type, width, height)
+        disk[frame_type] = None if measured is None else measured[0]*count
+        exact = exact and measured is not None and measured[1]
+
+    return {
+        'seconds': seconds,
+        'bytes': disk,
+        'total_seconds': None if None in seconds.values() else sum(seconds.values()),
+        'total_bytes': None if None in disk.values() else sum(disk.values()),
+        'exact': exact
+    }
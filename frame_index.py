@@ -0,0 +1,98 @@
+"""
+Per-frame index of a rendered dataset: file names, sweep parameters, camera pose,
+intrinsics and crop region for every frame, written as a NumPy structured array (frames.npy) and a
+CSV with the same columns (frames.csv). This module doesn't import bpy.
+"""
+import csv
+import os
+import numpy as np
+
+def index_dtype(name_length: int) -> np.dtype:
+    return np.dtype([
+        ('frame', np.int32),
+        ('image_file', f'U{name_length}'),
+        ('mask_file', f'U{name_length}'),
+        ('azimuth', np.float32),
+        ('elevation', np.float32),
+        ('zoom', np.float32),
+        ('liquid_level', np.float32),
+        ('cutter_height', np.float32),
+        ('camera_matrix', np.float32, (4, 4)),
+        ('lens', np.float32),
+        ('sensor_width', np.float32),
+        ('sensor_height', np.float32),
+        ('fx', np.float32),
+        ('fy', np.float32),
+        ('cx', np.float32),
+        ('cy', np.float32),
+        ('crop_x', np.int32),
+        ('crop_y', np.int32),
+        ('crop_width', np.int32),
+        ('crop_height', np.int32)
+    ])
+
+def build_index(plan: np.ndarray, image_files: list[str], mask_files: list[str], camera_matrices: np.ndarray,
+                cutter_heights: np.ndarray, intrinsics: dict[str, float], crops: np.ndarray) -> np.ndarray:
+    """
+    Joins the frame plan with per-frame file names, (n, 4, 4) world matrices, cutter heights,
+    (n, 4) crop regions as x, y, width and height from the top left, and the camera intrinsics,
+    which are the same for every frame and refer to the full image.
+    """
+    name_length: int = max((len(name) for name in image_files + mask_files), default=1)
+    index: np.ndarray = np.empty(len(plan), dtype=index_dtype(name_length))
+
+    for name in plan.dtype.names:
+        index[name] = plan[name]
+    index['image_file'] = image_files
+    index['mask_file'] = mask_files
+    index['cutter_height'] = cutter_heights
+    index['camera_matrix'] = camera_matrices
+    for name, value in intrinsics.items():
+        index[name] = value
+    for i, name in enumerate(('crop_x', 'crop_y', 'crop_width', 'crop_height')):
+        index[name] = crops[:, i]
+
+    return index
+
+def camera_intrinsics(lens: float, sensor_width: float, sensor_height: float, sensor_fit: str,
+                      width: int, height: int, shift_x: float=0, shift_y: float=0) -> dict[str, float]:
+    """
+    Pinhole intrinsics in pixels, following how Blender fits the sensor to the image.
+    """
+    if sensor_fit == 'VERTICAL' or (sensor_fit == 'AUTO' and height > width):
+        fitted_size: int = height
+    else:
+        fitted_size: int = width
+    sensor_size: float = sensor_height if sensor_fit == 'VERTICAL' else sensor_width
+    focal: float = lens/sensor_size*fitted_size
+
+    return {
+        'lens': lens,
+        'sensor_width': sensor_width,
+        'sensor_height': sensor_height,
+        'fx': focal,
+        'fy': focal,
+        'cx': width/2 - shift_x*fitted_size,
+        'cy': height/2 + shift_y*fitted_size
+    }
+
+def write_index(folder: str, index: np.ndarray):
+    np.save(os.path.join(folder, 'frames.npy'), index)
+
+    # The CSV flattens the camera matrix into row major m00..m33 columns
+    columns: list[str] = []
+    for name in index.dtype.names:
+        if name == 'camera_matrix':
+            columns.extend(f'm{row}{col}' for row in range(4) for col in range(4))
+        else:
+            columns.append(name)
+
+    flat: list[np.ndarray] = [
+        index[name].reshape(len(index), -1) if name == 'camera_matrix' else index[name][:, np.newaxis] for name in index.dtype.names
+    ]
+    rows: np.ndarray = np.concatenate([column.astype(str) for column in flat], axis=1)
+
+    with open(os.path.join(folder, 'frames.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows.tolist())
@@ -0,0 +1,121 @@
+"""
+Grease cache for renders over many liquid levels. The boolean modifiers that cut the
+grease to the level of the bin cutters are evaluated for every frame and pass, even
+though a sweep only has a handful of levels. The cache bakes each cut mesh once per
+level and pass into a temporary mesh and swaps the baked meshes in from a frame change
+handler, with the modifiers turned off and the interface locked until the pass is done.
+"""
+import bpy
+import numpy as np
+
+from bpy.types import Scene, Object, Mesh, Modifier
+
+class GreaseCache():
+    """
+    Bakes the meshes the cutters cut for each liquid level, and swaps them in while rendering
+    instead of evaluating the boolean modifiers for every frame and pass.
+    """
+    def __init__(self, scene: Scene, cutters: list[Object], frames: np.ndarray, grease_height: float):
+        self.__scene: Scene = scene
+        self.__cutters: list[Object] = cutters
+        self.__frames: np.ndarray = frames
+        self.__grease_height: float = grease_height
+
+        # Every mesh a cutter cuts through a boolean modifier
+        self.__objects: list[Object] = [
+            obj for obj in scene.objects if obj.type == 'MESH' and any(is_cut_by(modifier, cutters) for modifier in obj.modifiers)
+        ]
+
+        self.__meshes: dict[tuple[str, float], Mesh] = {}
+        self.__original_meshes: dict[str, Mesh] = {}
+        self.__modifier_states: dict[tuple[str, str], tuple[bool, bool]] = {}
+        self.__current_level: float | None = None
+        self.__lock_interface: bool = False
+
+    def bake(self):
+        if len(self.__objects) == 0:
+            print('No objects are cut by the cutters, nothing to cache')
+            return
+
+        locations: list[float] = [cutter.location.z for cutter in self.__cutters]
+        for level in np.unique(self.__frames['liquid_level']).tolist():
+            for cutter in self.__cutters:
+                cutter.location.z = self.__grease_height*level*.01
+            self.__scene.view_layers.update()
+
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            for obj in self.__objects:
+                mesh: Mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True, depsgraph=depsgraph)
+                mesh.name = f'GB {obj.name} {level:g}%'
+                self.__meshes[(obj.name, level)] = mesh
+
+        for cutter, location in zip(self.__cutters, locations):
+            cutter.location.z = location
+
+        print(f'Cached {len(self.__meshes)} meshes for {len(self.__objects)} objects')
+
+    def activate(self):
+        """
+        Disables the modifiers the cached meshes already include, and swaps meshes on every frame change.
+        """
+        if len(self.__objects) == 0 or self.frame_changed in bpy.app.handlers.frame_change_pre:
+            return
+
+        # Deactivating deletes the meshes, so later passes bake them again
+        if len(self.__meshes) == 0:
+            self.bake()
+
+        # Render jobs evaluate the meshes that are swapped, the UI mustn't touch them meanwhile
+        self.__lock_interface = self.__scene.render.use_lock_interface
+        self.__scene.render.use_lock_interface = True
+
+        for obj in self.__objects:
+            self.__original_meshes[obj.name] = obj.data
+            for modifier in obj.modifiers:
+                self.__modifier_states[(obj.name, modifier.name)] = (modifier.show_viewport, modifier.show_render)
+                modifier.show_viewport = False
+                modifier.show_render = False
+
+        self.__current_level = None
+        bpy.app.handlers.frame_change_pre.append(self.frame_changed)
+        self.frame_changed(self.__scene)
+
+    def deactivate(self):
+        if self.frame_changed not in bpy.app.handlers.frame_change_pre:
+            return
+
+        bpy.app.handlers.frame_change_pre.remove(self.frame_changed)
+        for obj in self.__objects:
+            obj.data = self.__original_meshes[obj.name]
+            for modifier in obj.modifiers:
+                modifier.show_viewport, modifier.show_render = self.__modifier_states[(obj.name, modifier.name)]
+        self.__scene.render.use_lock_interface = self.__lock_interface
+
+        # The baked meshes would stay in the .blend as orphans
+        self.__remove_meshes()
+
+    def clear(self):
+        self.deactivate()
+        self.__remove_meshes()
+
+    def __remove_meshes(self):
+        for mesh in self.__meshes.values():
+            bpy.data.meshes.remove(mesh)
+        self.__meshes.clear()
+
+    def frame_changed(self, scene: Scene, *args):
+        frame: int = scene.frame_current
+        if not 1 <= frame <= len(self.__frames):
+            return
+
+        # Consecutive frames mostly share a level, so meshes only change when it does
+        level: float = float(self.__frames['liquid_level'][frame - 1])
+        if level == self.__current_level:
+            return
+
+        for obj in self.__objects:
+            obj.data = self.__meshes[(obj.name, level)]
+        self.__current_level = level
+
+def is_cut_by(modifier: Modifier, cutters: list[Object]) -> bool:
+    return modifier.type == 'BOOLEAN' and getattr(modifier, 'operand_type', 'OBJECT') == 'OBJECT' and modifier.object in cutters
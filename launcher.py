@@ -0,0 +1,127 @@
+"""
+Splits one job across several background Blender processes on this machine:
+
+    python launcher.py scene.blend job.json --workers 8
+
+Each worker keyframes the whole frame plan and renders its own shard of it, so
+frame numbers and file names match a single process render. With --queue the
+workers lease chunks from a shared work queue instead, so faster workers take
+on more frames. Workers that crash are relaunched with --resume and skip the
+frames already in their completion manifest. metadata.json is written once after every worker
+has finished. This module doesn't import bpy.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BATCH_SCRIPT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'batch.py')
+
+def available_cpus() -> list[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def batch_command(blender: str, blend_file: str, job: str, *batch_args: str) -> list[str]:
+    return [blender, '-b', blend_file, '-P', BATCH_SCRIPT, '--', job, *batch_args]
+
+def start_worker(command: list[str], log_path: str, cpus: list[int] | None=None) -> subprocess.Popen:
+    # Pin the worker to its own cores where the platform allows it
+    pin = None
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        pin = lambda: os.sched_setaffinity(0, cpus)  # noqa: E731
+
+    with open(log_path, 'a') as log:
+        return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, preexec_fn=pin)
+
+def launch(blender: str, blend_file: str, job: str, workers: int, threads: int=0, interleave: bool=False,
+           log_dir: str='.', max_restarts: int=3, queue: bool=False, chunk_size: int=50) -> int:
+    cpus: list[int] = available_cpus()
+    if threads <= 0:
+        threads = max(len(cpus) // workers, 1)
+
+    os.makedirs(log_dir, exist_ok=True)
+    start: float = time.perf_counter()
+
+    commands: list[list[str]] = []
+    worker_cpus: list[list[int]] = []
+    log_paths: list[str] = []
+    procs: dict[int, subprocess.Popen] = {}
+    for index in range(workers):
+        shard_args: list[str] = ['--threads', str(threads), '--skip-metadata']
+        if queue:
+            # A fixed name lets a relaunched worker take back the chunk it held when it crashed
+            shard_args += ['--queue', '--worker', f'{socket.gethostname()}-{index:02d}', '--chunk-size', str(chunk_size)]
+        else:
+            shard_args += ['--shard', str(index), str(workers)]
+            if interleave:
+                shard_args.append('--interleave')
+
+        commands.append(batch_command(blender, blend_file, job, *shard_args))
+        # Consecutive blocks of cores, wrapping around when workers*threads oversubscribes them
+        worker_cpus.append([cpus[(index*threads + i) % len(cpus)] for i in range(threads)])
+        log_paths.append(os.path.join(log_dir, f'worker_{index:02d}.log'))
+
+        procs[index] = start_worker(commands[index], log_paths[index], worker_cpus[index])
+        print(f'Started worker {index} (pid {procs[index].pid}, {threads} threads), logging to {log_paths[index]}')
+
+    # Watchdog: relaunch crashed workers, they resume from their completion manifest
+    restarts: list[int] = [0]*workers
+    failed: list[int] = []
+    while procs:
+        time.sleep(1)
+        for index, proc in list(procs.items()):
+            if proc.poll() is None:
+                continue
+
+            del procs[index]
+            if proc.returncode == 0:
+                print(f'Worker {index} finished')
+            elif restarts[index] < max_restarts:
+                restarts[index] += 1
+                print(f'Worker {index} exited with code {proc.returncode}, restarting ({restarts[index]}/{max_restarts})')
+                # Even with resume off in the job, the relaunched worker keeps what it already rendered
+                if '--resume' not in commands[index]:
+                    commands[index].append('--resume')
+                procs[index] = start_worker(commands[index], log_paths[index], worker_cpus[index])
+            else:
+                failed.append(index)
+                print(f'Worker {index} exited with code {proc.returncode}, giving up after {max_restarts} restarts')
+
+    if failed:
+        print(f'{len(failed)} of {workers} workers failed, not writing metadata.json')
+        return 1
+
+    # Metadata is written once, after all shards are on disk
+    log_path: str = os.path.join(log_dir, 'metadata.log')
+    if start_worker(batch_command(blender, blend_file, job, '--metadata-only'), log_path).wait() != 0:
+        print(f'Writing metadata.json failed, see {log_path}')
+        return 1
+
+    print(f'All {workers} workers finished in {time.perf_counter() - start:.1f}s')
+    return 0
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description='Render a job with several background Blender processes')
+    parser.add_argument('blend_file', help='Scene to render')
+    parser.add_argument('job', help='Path to a .json or .toml job file')
+    parser.add_argument('--workers', type=int, default=2, help='Number of Blender processes')
+    parser.add_argument('--threads', type=int, default=0, help='Render threads per worker, defaults to an even split of the cores')
+    parser.add_argument('--interleave', action='store_true', help='Workers take every N-th frame instead of contiguous blocks')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'), help='Blender executable, defaults to $BLENDER or blender')
+    parser.add_argument('--log-dir', default='.', help='Where worker logs are written')
+    parser.add_argument('--max-restarts', type=int, default=3, help='How often a crashed worker is relaunched')
+    parser.add_argument('--queue', action='store_true', help='Workers lease chunks from a shared work queue instead of fixed shards')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Frames per queue chunk')
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    return launch(args.blender, args.blend_file, args.job, args.workers, args.threads, args.interleave,
+                  args.log_dir, args.max_restarts, args.queue, args.chunk_size)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,212 @@
+"""
+Completion manifest for resumable renders. Every finished output file is
+appended as one JSON line, so a crash can lose at most the frame that was
+being written. This module doesn't import bpy.
+"""
+import glob
+import hashlib
+import json
+import os
+
+from typing import Iterable
+
+class CompletionManifest():
+    def __init__(self, dataset_folder: str, name: str='manifest'):
+        self.dataset_folder: str = dataset_folder
+        self.path: str = os.path.join(dataset_folder, f'{name}.jsonl')
+
+        # Hashes of finished files by output type and frame, and entries by content hash, from every
+        # manifest in the dataset. Kept up to date with this manifest's appends, and with the other
+        # manifests by refresh, which reads on from where it stopped in each file.
+        self.__frames: dict[str, dict[int, set[str | None]]] | None = None
+        self.__hashes: dict[str, dict] | None = None
+        self.__offsets: dict[str, int] = {}
+
+    def append(self, frame: int, frame_type: str, path: str, offset: int | None=None, size: int | None=None, sha256: str | None=None,
+               content_hash: str | None=None):
+        """
+        Records a finished file, or with an offset, a member of a packed shard file. The content
+        hash identifies the pose and settings the file was rendered with.
+        """
+        entry: dict = {
+            'frame': frame,
+            'type': frame_type,
+            'path': os.path.relpath(path, self.dataset_folder),
+            'size': os.path.getsize(path) if size is None else size,
+            'sha256': file_checksum(path) if sha256 is None else sha256
+        }
+        if offset is not None:
+            entry['offset'] = offset
+        if content_hash is not None:
+            entry['hash'] = content_hash
+
+        # A single write to an O_APPEND file lands as a whole line, even with other workers appending
+        fd: int = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(entry) + '\n').encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if self.__frames is not None:
+            self.__index(entry)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.__frames = None
+        self.__hashes = None
+        self.__offsets = {}
+
+    def completed(self, frame_type: str, verify_checksums: bool=False, content_hashes: dict[int, str] | None=None,
+                  frames: list[int] | None=None) -> set[int]:
+        """
+        Frames with a finished file, out of the given frames or all of them. Given the planned content hashes,
+        files rendered for a different pose or settings under the same frame number don't count. Files recorded
+        without a hash always do. Files other workers finished since the first call are only seen after refresh,
+        or when checksums are verified, which reads the manifests again.
+        """
+        found: dict[int, set[str | None]] = {}
+        if verify_checksums:
+            for entry in read_manifests(self.dataset_folder, verify_checksums):
+                if entry['type'] == frame_type:
+                    found.setdefault(entry['frame'], set()).add(entry.get('hash'))
+        else:
+            self.__load()
+            found = self.__frames.get(frame_type, {})
+
+        return {
+            frame for frame in (found if frames is None else frames) if frame in found and
+                (content_hashes is None or None in found[frame] or content_hashes.get(frame) in found[frame])
+        }
+
+    def find(self, content_hash: str) -> dict | None:
+        """
+        The latest entry with a content hash in this dataset, or None.
+        """
+        self.__load()
+        return self.__hashes.get(content_hash)
+
+    def refresh(self):
+        """
+        Reads the entries appended to every manifest in the dataset since the last read, such as the
+        files of other workers rendering the same dataset.
+        """
+        if self.__frames is None:
+            self.__load()
+            return
+
+        for manifest_path in manifest_paths(self.dataset_folder):
+            offset: int = self.__offsets.get(manifest_path, 0)
+            with open(manifest_path, 'rb') as f:
+                f.seek(offset)
+                data: bytes = f.read()
+
+            # A line that's still being written is read next time
+            end: int = data.rfind(b'\n') + 1
+            self.__offsets[manifest_path] = offset + end
+            for entry in valid_entries(self.dataset_folder, data[:end].decode().splitlines()):
+                self.__index(entry)
+
+    def __load(self):
+        if self.__frames is not None:
+            return
+
+        self.__frames = {}
+        self.__hashes = {}
+        self.__offsets = {}
+        self.refresh()
+
+    def __index(self, entry: dict):
+        self.__frames.setdefault(entry['type'], {}).setdefault(entry['frame'], set()).add(entry.get('hash'))
+        # Later entries win, so a file that was packed into a shard is found in the shard
+        if 'hash' in entry:
+            self.__hashes[entry['hash']] = entry
+
+def manifest_paths(dataset_folder: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(dataset_folder, 'manifest*.jsonl')))
+
+def read_manifests(dataset_folder: str, verify_checksums: bool=False) -> list[dict]:
+    """
+    Entries from every manifest in the dataset whose output file is still on disk and intact.
+    """
+    entries: list[dict] = []
+    for manifest_path in manifest_paths(dataset_folder):
+        with open(manifest_path) as f:
+            entries.extend(valid_entries(dataset_folder, f, verify_checksums))
+
+    return entries
+
+def valid_entries(dataset_folder: str, lines: Iterable[str], verify_checksums: bool=False) -> list[dict]:
+    entries: list[dict] = []
+    for line in lines:
+        # The last line is cut short if a crash happened while appending it
+        try:
+            entry: dict = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        path: str = os.path.join(dataset_folder, entry['path'])
+        if not os.path.isfile(path):
+            continue
+
+        # Packed members only need to fit inside their shard
+        if 'offset' in entry:
+            if os.path.getsize(path) < entry['offset'] + entry['size']:
+                continue
+            if verify_checksums and file_checksum(path, entry['offset'], entry['size']) != entry['sha256']:
+                continue
+        else:
+            if os.path.getsize(path) != entry['size']:
+                continue
+            if verify_checksums and file_checksum(path) != entry['sha256']:
+                continue
+
+        entries.append(entry)
+
+    return entries
+
+def file_checksum(path: str, offset: int=0, size: int=-1) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining: int = size
+        while remaining != 0:
+            block: bytes = f.read(1 << 20 if remaining < 0 else min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block) if remaining > 0 else 0
+
+    return digest.hexdigest()
+
+def content_index(directory: str, exclude: str | None=None) -> dict[str, tuple[str, dict]]:
+    """
+    Finished files by content hash, with their dataset folder, from every dataset in the render directory
+    except the excluded one.
+    """
+    index: dict[str, tuple[str, dict]] = {}
+    for dataset_folder in sorted(glob.glob(os.path.join(directory, '*', ''))):
+        if exclude is not None and os.path.abspath(dataset_folder) == os.path.abspath(exclude):
+            continue
+        for entry in read_manifests(dataset_folder):
+            if 'hash' in entry:
+                index.setdefault(entry['hash'], (dataset_folder, entry))
+
+    return index
+
+def copy_entry(dataset_folder: str, entry: dict, path: str) -> bool:
+    """
+    Copies a recorded file, or a member of a packed shard, to a new path. Returns False without
+    writing anything when the file no longer matches its checksum.
+    """
+    with open(os.path.join(dataset_folder, entry['path']), 'rb') as f:
+        f.seek(entry.get('offset', 0))
+        data: bytes = f.read(entry['size'])
+
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        return False
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
@@ -0,0 +1,113 @@
+"""
+Background output stage for buffered rendering. Frames are copied out of Blender
+into reusable NumPy buffers, then converted, encoded and written by a small thread
+pool while the next frame renders. This module doesn't import bpy.
+"""
+import threading
+import time
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable
+from .png import encode_png, write_file
+
+# Rec. 709 luminance weights, used for black and white output
+LUMINANCE: np.ndarray = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+class FrameWriter():
+    def __init__(self, workers: int=4, max_pending: int=8, compression: int=6):
+        self.__pool: ThreadPoolExecutor = ThreadPoolExecutor(workers, thread_name_prefix='gb-frame-writer')
+        self.__compression: int = compression
+
+        # Backpressure: capturing a frame blocks while max_pending frames are waiting to be written
+        self.__slots: threading.Semaphore = threading.Semaphore(max_pending)
+        self.__free_buffers: list[np.ndarray] = []
+        self.__futures: list[Future] = []
+        self.__lock: threading.Lock = threading.Lock()
+
+        self.encode_times: list[float] = []
+
+    def acquire(self, size: int) -> np.ndarray:
+        """
+        Float buffer of `size` values to copy a frame into, reused once its frame is written.
+        """
+        self.__slots.acquire()
+        with self.__lock:
+            for i, buffer in enumerate(self.__free_buffers):
+                if buffer.size == size:
+                    return self.__free_buffers.pop(i)
+
+        return np.empty(size, dtype=np.float32)
+
+    def submit(self, buffer: np.ndarray, width: int, height: int, path: str, channels: int=4, bit_depth: int=8,
+               on_written: Callable[[str], None] | None=None, label_colors: np.ndarray | None=None, use_palette: bool=False):
+        """
+        Writes an acquired buffer holding bottom-up RGBA floats, as Blender stores images, to a PNG.
+        With label colors, each pixel is written as the index of its nearest color instead, optionally
+        with the colors as the PNG palette.
+        """
+        future: Future = self.__pool.submit(self.__write, buffer, width, height, path, channels, bit_depth, on_written,
+                                            label_colors, use_palette)
+        with self.__lock:
+            self.__futures.append(future)
+
+    def drain(self):
+        """
+        Waits for every submitted frame and raises the first error a write ran into.
+        """
+        with self.__lock:
+            futures, self.__futures = self.__futures, []
+
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.drain()
+        self.__pool.shutdown()
+
+    def __write(self, buffer: np.ndarray, width: int, height: int, path: str, channels: int, bit_depth: int,
+                on_written: Callable[[str], None] | None, label_colors: np.ndarray | None, use_palette: bool):
+        try:
+            start: float = time.perf_counter()
+            rgba: np.ndarray = buffer.reshape(height, width, 4)[::-1]
+
+            if label_colors is None:
+                write_file(path, encode_png(to_integer_pixels(rgba, channels, bit_depth), compression=self.__compression))
+            else:
+                palette: np.ndarray | None = to_integer_pixels(label_colors, 3) if use_palette else None
+                write_file(path, encode_png(to_labels(rgba, label_colors), palette, compression=self.__compression))
+
+            with self.__lock:
+                self.encode_times.append(time.perf_counter() - start)
+        finally:
+            with self.__lock:
+                self.__free_buffers.append(buffer)
+            self.__slots.release()
+
+        if on_written is not None:
+            on_written(path)
+
+def to_labels(rgba: np.ndarray, label_colors: np.ndarray) -> np.ndarray:
+    """
+    Index of the nearest label color for every pixel, which also absorbs small color
+    differences from filtering or compression.
+    """
+    distances: np.ndarray = np.zeros(rgba.shape[:2] + (len(label_colors),), dtype=np.float32)
+    for channel in range(3):
+        distances += np.square(rgba[..., channel, np.newaxis] - label_colors[:, channel])
+
+    return np.argmin(distances, axis=-1).astype(np.uint8)
+
+def to_integer_pixels(rgba: np.ndarray, channels: int=4, bit_depth: int=8) -> np.ndarray:
+    """
+    Quantizes display referred RGBA floats to 1 (luminance), 3 (RGB) or 4 (RGBA) channels.
+    """
+    if channels == 1:
+        pixels: np.ndarray = rgba[..., :3] @ LUMINANCE
+    else:
+        pixels: np.ndarray = rgba[..., :channels]
+
+    max_value: int = 65535 if bit_depth == 16 else 255
+    scaled: np.ndarray = np.clip(pixels, 0, 1)*max_value + 0.5
+
+    return scaled.astype(np.uint16 if bit_depth == 16 else np.uint8)
@@ -0,0 +1,230 @@
+"""
+Frame plan for a render job: one row per rendered frame with its camera pose and
+liquid level. Plans are NumPy structured arrays so they stay small and fast to
+build for hundreds of thousands of frames. This module doesn't import bpy, so it
+works on anything with the sweep settings as attributes (such as RenderConfig).
+"""
+import numpy as np
+
+PLAN_DTYPE: np.dtype = np.dtype([
+    ('frame', np.int32),
+    ('azimuth', np.float32),
+    ('elevation', np.float32),
+    ('zoom', np.float32),
+    ('liquid_level', np.float32)
+])
+
+# Dropped duplicate poses, with the frame that renders the same image instead
+ALIAS_DTYPE: np.dtype = np.dtype(PLAN_DTYPE.descr + [('canonical_frame', np.int32)])
+
+# At this elevation the camera looks straight down, so azimuth only rotates the image
+TOP_DOWN_ELEVATION: float = 90
+
+def liquid_levels(settings) -> np.ndarray:
+    # Every step from the starting level up to a full bin, which is always rendered
+    return np.append(np.arange(settings.starting_liquid_level, 100, settings.liquid_level_step), 100)
+
+def zoom_levels(settings) -> np.ndarray:
+    return settings.starting_zoom + np.arange(settings.zoom_levels)*settings.zoom_step
+
+def elevations(settings) -> np.ndarray:
+    return np.arange(settings.starting_elevation, settings.max_elevation + 1, settings.elevation_step)
+
+def azimuths(settings) -> np.ndarray:
+    return np.arange(0, 360, settings.azimuth_step)
+
+# Direction numbers for Sobol dimensions 2 to 4 (Joe and Kuo), as (degree, coefficients, initial m values)
+SOBOL_DIRECTIONS: list[tuple[int, int, list[int]]] = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1])
+]
+SOBOL_BITS: int = 32
+
+# First primes, one Halton base per dimension
+HALTON_BASES: tuple[int, ...] = (2, 3, 5, 7)
+
+# `sampler` setting values
+GRID: int = 0
+SOBOL: int = 1
+HALTON: int = 2
+STRATIFIED: int = 3
+
+def plan_size(settings) -> int:
+    """
+    Number of frames plan_frames builds, without building it.
+    """
+    if int(settings.sampler) != GRID:
+        return settings.frame_budget
+
+    # Grid azimuths never wrap around, so only top down views are duplicates
+    views: int = len(elevations(settings))*len(azimuths(settings))
+    if settings.skip_duplicates:
+        top_down: int = int(np.sum(elevations(settings) >= TOP_DOWN_ELEVATION))
+        views -= top_down*(len(azimuths(settings)) - 1)
+
+    return len(liquid_levels(settings))*len(zoom_levels(settings))*views
+
+def plan_frames(settings) -> np.ndarray:
+    plan: np.ndarray = plan_grid(settings) if int(settings.sampler) == GRID else plan_samples(settings)
+    if settings.skip_duplicates:
+        plan, aliases = remove_duplicates(plan)
+        if len(aliases) > 0:
+            print(f'Dropped {len(aliases)} duplicate poses from the plan')
+
+    return plan
+
+def plan_aliases(settings) -> np.ndarray:
+    """
+    Poses plan_frames drops as duplicates, numbered as they would be without dropping any.
+    """
+    plan: np.ndarray = plan_grid(settings) if int(settings.sampler) == GRID else plan_samples(settings)
+    return remove_duplicates(plan)[1]
+
+def plan_grid(settings) -> np.ndarray:
+    """
+    Full grid of liquid level x zoom x elevation x azimuth, with azimuth changing fastest.
+    Frames are numbered from 1.
+    """
+    grid: list[np.ndarray] = np.meshgrid(
+        liquid_levels(settings), zoom_levels(settings), elevations(settings), azimuths(settings), indexing='ij'
+    )
+
+    plan: np.ndarray = np.empty(grid[0].size, dtype=PLAN_DTYPE)
+    plan['frame'] = np.arange(1, plan.size + 1)
+    plan['liquid_level'] = grid[0].ravel()
+    plan['zoom'] = grid[1].ravel()
+    plan['elevation'] = grid[2].ravel()
+    plan['azimuth'] = grid[3].ravel()
+
+    return plan
+
+def sample_ranges(settings) -> dict[str, tuple[float, float]]:
+    """
+    Continuous range of every plan column, covering the same poses as the grid.
+    """
+    return {
+        'azimuth': (0, 360),
+        'elevation': (settings.starting_elevation, settings.max_elevation),
+        'zoom': (settings.starting_zoom, settings.starting_zoom + (settings.zoom_levels - 1)*settings.zoom_step),
+        'liquid_level': (settings.starting_liquid_level, 100)
+    }
+
+def plan_samples(settings) -> np.ndarray:
+    """
+    `frame_budget` poses from a seeded low discrepancy sequence or stratified jitter over the
+    continuous ranges. Frames keep the sequence's order, so any prefix of the plan covers the
+    ranges evenly as well.
+    """
+    sampler: int = int(settings.sampler)
+    rng: np.random.Generator = np.random.default_rng(settings.sampler_seed)
+    ranges: dict[str, tuple[float, float]] = sample_ranges(settings)
+
+    if sampler == SOBOL:
+        points: np.ndarray = sobol_points(settings.frame_budget, len(ranges), rng)
+    elif sampler == HALTON:
+        points: np.ndarray = halton_points(settings.frame_budget, len(ranges), rng)
+    elif sampler == STRATIFIED:
+        points: np.ndarray = stratified_points(settings.frame_budget, len(ranges), rng)
+    else:
+        raise Exception(f'Unknown sampler {sampler}')
+
+    plan: np.ndarray = np.empty(settings.frame_budget, dtype=PLAN_DTYPE)
+    plan['frame'] = np.arange(1, plan.size + 1)
+    for i, (name, (low, high)) in enumerate(ranges.items()):
+        plan[name] = low + points[:, i]*(high - low)
+
+    return plan
+
+def sobol_points(count: int, dimensions: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Sobol points in [0, 1) with a random digital shift per dimension, which keeps their
+    stratification while making the seed matter.
+    """
+    directions: np.ndarray = np.empty((dimensions, SOBOL_BITS), dtype=np.uint64)
+
+    # The first dimension is the van der Corput sequence in base 2
+    directions[0] = 1 << np.arange(SOBOL_BITS - 1, -1, -1, dtype=np.uint64)
+    for dimension, (degree, coefficients, initial) in enumerate(SOBOL_DIRECTIONS[:dimensions - 1], start=1):
+        m: list[int] = list(initial)
+        for i in range(degree, SOBOL_BITS):
+            value: int = m[i - degree] ^ (m[i - degree] << degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    value ^= m[i - k] << k
+            m.append(value)
+        directions[dimension] = [m[i] << (SOBOL_BITS - 1 - i) for i in range(SOBOL_BITS)]
+
+    # Gray code order: each point flips the direction of the lowest zero bit of its index
+    indices: np.ndarray = np.arange(count, dtype=np.uint64)
+    gray: np.ndarray = indices ^ (indices >> np.uint64(1))
+    values: np.ndarray = np.zeros((count, dimensions), dtype=np.uint64)
+    for bit in range(SOBOL_BITS):
+        mask: np.ndarray = ((gray >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        values[mask] ^= directions[:, bit]
+
+    shift: np.ndarray = rng.integers(0, 1 << SOBOL_BITS, size=dimensions, dtype=np.uint64)
+    return (values ^ shift).astype(np.float64)/(1 << SOBOL_BITS)
+
+def halton_points(count: int, dimensions: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Halton points in [0, 1) with a random rotation per dimension (Cranley-Patterson).
+    """
+    points: np.ndarray = np.empty((count, dimensions), dtype=np.float64)
+    for dimension, base in enumerate(HALTON_BASES[:dimensions]):
+        # Radical inverse of the index, skipping 0 which puts every dimension at the origin
+        indices: np.ndarray = np.arange(1, count + 1)
+        inverse: np.ndarray = np.zeros(count, dtype=np.float64)
+        scale: float = 1/base
+        while np.any(indices > 0):
+            inverse += (indices % base)*scale
+            indices //= base
+            scale /= base
+        points[:, dimension] = inverse
+
+    return (points + rng.random(dimensions)) % 1
+
+def stratified_points(count: int, dimensions: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Latin hypercube: every dimension is split into `count` strata with one jittered point in
+    each, and the strata are shuffled independently per dimension.
+    """
+    points: np.ndarray = np.empty((count, dimensions), dtype=np.float64)
+    for dimension in range(dimensions):
+        points[:, dimension] = (rng.permutation(count) + rng.random(count))/count
+
+    return points
+
+def canonical_poses(plan: np.ndarray) -> np.ndarray:
+    """
+    (n, 4) poses where frames that render the same image have the same row: azimuth wraps
+    at 360° and top down views all use azimuth 0.
+    """
+    azimuth: np.ndarray = np.where(plan['elevation'] >= TOP_DOWN_ELEVATION, 0, plan['azimuth'] % 360)
+
+    # Rounding absorbs float noise from the steps
+    return np.round(np.stack([azimuth, plan['elevation'], plan['zoom'], plan['liquid_level']], axis=1).astype(np.float64), 3)
+
+def remove_duplicates(plan: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keeps the first frame of every canonical pose and renumbers the plan. Returns the new plan
+    and the dropped frames with the new number of the frame they duplicate.
+    """
+    _, first_rows, inverse = np.unique(canonical_poses(plan), axis=0, return_index=True, return_inverse=True)
+    canonical_rows: np.ndarray = first_rows[inverse.ravel()]
+    keep: np.ndarray = canonical_rows == np.arange(len(plan))
+
+    unique: np.ndarray = plan[keep].copy()
+    unique['frame'] = np.arange(1, unique.size + 1)
+
+    # Kept frames are renumbered in order, so their new number is their rank among kept rows
+    new_frames: np.ndarray = np.cumsum(keep)
+    aliases: np.ndarray = np.empty(np.count_nonzero(~keep), dtype=ALIAS_DTYPE)
+    for name in PLAN_DTYPE.names:
+        aliases[name] = plan[name][~keep]
+    aliases['canonical_frame'] = new_frames[canonical_rows[~keep]]
+
+    return unique, aliases
+
+def describe_frame(row: np.void) -> str:
+    return f'Frame {row["frame"]}: <Azimuth: {row["azimuth"]:g}, Elevation: {row["elevation"]:g}, Zoom: {row["zoom"]:g}, Liquid Level: {row["liquid_level"]:g}>'
@@ -0,0 +1,54 @@
+"""
+Minimal PNG encoder for NumPy images. zlib releases the GIL while compressing, so
+several frames can be encoded at once from a thread pool. This module doesn't
+import bpy.
+"""
+import os
+import struct
+import zlib
+import numpy as np
+
+# PNG color types by channel count
+COLOR_TYPES: dict[int, int] = {1: 0, 2: 4, 3: 2, 4: 6}
+PALETTE_COLOR_TYPE: int = 3
+
+def encode_png(pixels: np.ndarray, palette: np.ndarray | None=None, compression: int=6) -> bytes:
+    """
+    Encodes a top-down (height, width) or (height, width, channels) uint8/uint16 image.
+    With a palette, pixels are uint8 indices into an (n, 3) uint8 array of colors.
+    """
+    height, width = pixels.shape[:2]
+    channels: int = 1 if pixels.ndim == 2 else pixels.shape[2]
+    bit_depth: int = 16 if pixels.dtype == np.uint16 else 8
+    color_type: int = PALETTE_COLOR_TYPE if palette is not None else COLOR_TYPES[channels]
+
+    # PNG stores 16 bit samples big endian
+    if bit_depth == 16:
+        rows: np.ndarray = pixels.astype('>u2').view(np.uint8).reshape(height, -1)
+    else:
+        rows: np.ndarray = pixels.reshape(height, -1)
+
+    # Every row uses the 'Up' filter (difference to the row above), which compresses renders well
+    filtered: np.ndarray = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+    header: bytes = struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0)
+    chunks: list[bytes] = [png_chunk(b'IHDR', header)]
+    if palette is not None:
+        chunks.append(png_chunk(b'PLTE', np.ascontiguousarray(palette, dtype=np.uint8).tobytes()))
+    chunks.append(png_chunk(b'IDAT', zlib.compress(filtered.tobytes(), compression)))
+    chunks.append(png_chunk(b'IEND', b''))
+
+    return b'\x89PNG\r\n\x1a\n' + b''.join(chunks)
+
+def png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+def write_file(path: str, data: bytes):
+    # Readers never see a partially written file
+    temp_path: str = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
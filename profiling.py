@@ -0,0 +1,83 @@
+"""
+Phase timing for render runs. Each event costs a perf_counter call and a getrusage
+call, so profiling stays on for every render. Profiles are written as JSON (a
+summary per phase) and CSV (every event). This module doesn't import bpy.
+"""
+import csv
+import json
+import os
+import sys
+import time
+
+from contextlib import contextmanager
+from typing import Iterator
+
+# Not available on Windows, where peak memory isn't recorded
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_memory() -> int | None:
+    """
+    Peak resident memory of this process in bytes.
+    """
+    if resource is None:
+        return None
+
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    max_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss*1024
+
+class RunProfile():
+    def __init__(self):
+        self.start_time: float = time.time()
+        self.events: list[tuple[str, int | None, float, int | None]] = []
+
+    @contextmanager
+    def phase(self, name: str, frame: int | None=None) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, frame)
+
+    def record(self, name: str, duration: float, frame: int | None=None):
+        self.events.append((name, frame, duration, peak_memory()))
+
+    def summary(self) -> dict[str, dict]:
+        phases: dict[str, list[float]] = {}
+        for name, _, duration, _ in self.events:
+            phases.setdefault(name, []).append(duration)
+
+        return {
+            name: {
+                'count': len(durations),
+                'total': sum(durations),
+                'mean': sum(durations)/len(durations),
+                'max': max(durations)
+            } for name, durations in phases.items()
+        }
+
+    def print_summary(self):
+        print('Run profile:')
+        for name, stats in self.summary().items():
+            print(f'  {name:<20} {stats["count"]:>7}x  {stats["total"]:>9.2f}s total  {stats["mean"]:.4f}s mean  {stats["max"]:.4f}s max')
+
+        memory: int | None = peak_memory()
+        if memory is not None:
+            print(f'  Peak memory: {memory/(1 << 20):.0f} MB')
+
+    def write(self, folder: str, name: str='profile'):
+        with open(os.path.join(folder, f'{name}.json'), 'w') as f:
+            json.dump({
+                'start_time': self.start_time,
+                'wall_time': time.time() - self.start_time,
+                'peak_memory': peak_memory(),
+                'phases': self.summary()
+            }, f, indent=4)
+
+        with open(os.path.join(folder, f'{name}.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['phase', 'frame', 'duration', 'peak_memory'])
+            writer.writerows(self.events)
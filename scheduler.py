@@ -0,0 +1,128 @@
+import bpy
+
+from bpy.types import Scene, Window
+from typing import Callable
+from .utils import AnimationSequence, FrameType
+
+class PassScheduler():
+    """
+    Renders an ordered list of passes through Blender's render job, so the UI stays responsive.
+    Each pass sets up its own engine profile, and the next pass starts as soon as the previous
+    one completes. Cropped frames are rendered as a chain of single frame renders instead, since
+    the border changes every frame.
+    """
+    def __init__(self, animation: AnimationSequence, passes: tuple[FrameType, ...], window: Window,
+                 on_finished: Callable[[], None] | None=None, on_cancelled: Callable[[], None] | None=None):
+        self.animation: AnimationSequence = animation
+        self.passes: tuple[FrameType, ...] = passes
+        self.current: FrameType | None = None
+        self.__window: Window = window
+        self.__on_finished: Callable[[], None] | None = on_finished
+        self.__on_cancelled: Callable[[], None] | None = on_cancelled
+        self.__next: int = 0
+        self.__frames: list[int] = []
+
+        self.__handlers: tuple[tuple[list, Callable], ...] = (
+            (bpy.app.handlers.render_pre, self.pre),
+            (bpy.app.handlers.render_post, self.post),
+            (bpy.app.handlers.render_write, self.render_write),
+            (bpy.app.handlers.render_complete, self.complete),
+            (bpy.app.handlers.render_cancel, self.cancelled)
+        )
+
+    def start(self):
+        if len(self.passes) == 0:
+            raise Exception('The render sequence has no passes')
+
+        # A run that ended without cleaning up, such as after reloading the addon, would fire twice
+        remove_stale_handlers()
+        for handlers, handler in self.__handlers:
+            handlers.append(handler)
+
+        self.__start_next()
+
+    def running(self) -> bool:
+        return any(handler in handlers for handlers, handler in self.__handlers)
+
+    def remove_handlers(self):
+        for handlers, handler in self.__handlers:
+            if handler in handlers:
+                handlers.remove(handler)
+        self.animation.remove_handlers()
+
+    def pre(self, scene: Scene, *args):
+        self.animation.frame_started()
+
+    def post(self, scene: Scene, *args):
+        self.animation.save_frame(self.current)
+
+    def render_write(self, scene: Scene, *args):
+        # Single frame renders only fire this when they write the file, so they finish in complete
+        if not self.animation.renders_per_frame():
+            self.animation.frame_written(self.current)
+
+    def complete(self, scene: Scene, *args):
+        if self.animation.renders_per_frame():
+            self.animation.frame_written(self.current)
+            if len(self.__frames) > 0:
+                bpy.app.timers.register(self.__render_frame, first_interval=0)
+                return
+
+        self.__finish_pass()
+
+    def cancelled(self, scene: Scene, *args):
+        self.remove_handlers()
+        print('Animation rendering cancelled')
+        if self.__on_cancelled is not None:
+            self.__on_cancelled()
+
+    def __finish_pass(self):
+        self.animation.finish_pass(self.current)
+        self.__after_pass()
+
+    def __after_pass(self):
+        if self.__next < len(self.passes):
+            # A new render job can't start while this one is still wrapping up, so it starts
+            # on the next event loop iteration instead of from inside the handler
+            bpy.app.timers.register(self.__start_next, first_interval=0)
+            return
+
+        self.remove_handlers()
+        print('Animation rendered successfully')
+        if self.__on_finished is not None:
+            self.__on_finished()
+
+    def __start_next(self) -> None:
+        self.current = self.passes[self.__next]
+        self.__next += 1
+
+        print(f'Rendering {self.current.value} frames (pass {self.__next}/{len(self.passes)})')
+        if not self.animation.renders_per_frame():
+            with bpy.context.temp_override(window=self.__window):
+                rendering: bool = self.animation.render(self.current)
+            # A pass with nothing left to render finishes right away, without a render job
+            if not rendering:
+                self.__after_pass()
+            # Returning None stops the timer that started this pass
+            return None
+
+        self.__frames = self.animation.prepare_pass(self.current)
+        if len(self.__frames) == 0:
+            self.__finish_pass()
+            return None
+        return self.__render_frame()
+
+    def __render_frame(self) -> None:
+        frame: int = self.__frames.pop(0)
+        print(f'Rendering frame {frame}, {len(self.__frames)} left in this pass')
+        with bpy.context.temp_override(window=self.__window):
+            self.animation.render_frame(frame)
+
+        return None
+
+def remove_stale_handlers():
+    for handlers in (bpy.app.handlers.render_pre, bpy.app.handlers.render_post, bpy.app.handlers.render_write,
+                     bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+        for handler in list(handlers):
+            if type(getattr(handler, '__self__', None)).__name__ == PassScheduler.__name__:
+                handlers.remove(handler)
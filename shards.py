@@ -0,0 +1,152 @@
+"""
+Packs rendered frames into fixed size tar shards for training. A sample is the
+image, the mask and a JSON file with the frame's parameters, all named after the
+zero padded frame number. Parts wait as regular files until every part of their
+sample exists, so masks rendered in an earlier pass survive a crash. Each shard
+has a JSON lines index with the offset and size of every member, so samples can
+be read without scanning the tar. This module doesn't import bpy.
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+
+from .manifest import CompletionManifest
+
+class ShardWriter():
+    def __init__(self, folder: str, manifest: CompletionManifest, parts: tuple[str, ...], name: str='shard',
+                 max_bytes: int=1 << 30):
+        self.folder: str = folder
+        self.parts: tuple[str, ...] = parts
+        self.__manifest: CompletionManifest = manifest
+        self.__name: str = name
+        self.__max_bytes: int = max_bytes
+
+        os.makedirs(folder, exist_ok=True)
+
+        # Never append to shards from an earlier run, their last sample might be cut short
+        self.__number: int = len(glob.glob(os.path.join(folder, f'{name}-*.tar')))
+        self.__tar: tarfile.TarFile | None = None
+        self.__index = None
+
+        self.__pending: dict[int, dict[str, str]] = {}
+        self.__content_hashes: dict[tuple[int, str], str] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def add(self, frame: int, part: str, path: str, metadata: dict, content_hash: str | None=None):
+        """
+        Adds a finished file. Once every part of the frame is there, the sample is packed
+        into the current shard and its files are deleted.
+        """
+        with self.__lock:
+            pending: dict[str, str] = self.__pending.setdefault(frame, {})
+            pending[part] = path
+            if content_hash is not None:
+                self.__content_hashes[(frame, part)] = content_hash
+            if any(part not in pending for part in self.parts):
+                return
+
+            del self.__pending[frame]
+            self.__write_sample(frame, pending, metadata)
+
+    def stage(self, frame: int, part: str, path: str, content_hash: str | None=None):
+        """
+        Registers a file an earlier run finished but couldn't pack yet, without packing it.
+        """
+        with self.__lock:
+            self.__pending.setdefault(frame, {})[part] = path
+            if content_hash is not None:
+                self.__content_hashes[(frame, part)] = content_hash
+
+    def close(self):
+        with self.__lock:
+            self.__close_shard()
+
+    def __write_sample(self, frame: int, paths: dict[str, str], metadata: dict):
+        key: str = f'{frame:08d}'
+        members: list[tuple[str, str | None, bytes]] = []
+        for part, path in paths.items():
+            with open(path, 'rb') as f:
+                members.append((f'{key}.{part}{os.path.splitext(path)[1]}', part, f.read()))
+        members.append((f'{key}.json', None, json.dumps(metadata).encode()))
+
+        # Start a new shard instead of going over the size limit, tar headers are 512 bytes per member
+        sample_size: int = sum(len(data) + 1024 for _, _, data in members)
+        if self.__tar is not None and self.__tar.fileobj.tell() + sample_size > self.__max_bytes:
+            self.__close_shard()
+        if self.__tar is None:
+            self.__open_shard()
+
+        offsets: dict[str, list[int]] = {}
+        for member_name, _, data in members:
+            info: tarfile.TarInfo = tarfile.TarInfo(member_name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+
+            # Data starts right after the member's header
+            header: bytes = info.tobuf(self.__tar.format, self.__tar.encoding, self.__tar.errors)
+            offsets[member_name] = [self.__tar.offset + len(header), info.size]
+            self.__tar.addfile(info, io.BytesIO(data))
+
+        self.__tar.fileobj.flush()
+        os.fsync(self.__tar.fileobj.fileno())
+        self.__index.write(json.dumps({'key': key, 'frame': frame, 'members': offsets}) + '\n')
+        self.__index.flush()
+
+        # The sample is safely packed, so the manifest can point at the shard and the loose files can go
+        for member_name, part, data in members:
+            if part is not None:
+                self.__manifest.append(frame, part, self.__tar.name, offsets[member_name][0], len(data), hashlib.sha256(data).hexdigest(),
+                                       self.__content_hashes.pop((frame, part), None))
+        for path in paths.values():
+            os.remove(path)
+
+    def __open_shard(self):
+        path: str = os.path.join(self.folder, f'{self.__name}-{self.__number:06d}.tar')
+        self.__tar = tarfile.open(path, 'w', format=tarfile.USTAR_FORMAT)
+        self.__index = open(os.path.join(self.folder, f'{self.__name}-{self.__number:06d}.idx.jsonl'), 'w')
+        self.__number += 1
+
+    def __close_shard(self):
+        if self.__tar is None:
+            return
+
+        self.__tar.close()
+        self.__index.close()
+        self.__tar = None
+        self.__index = None
+
+def write_shard_summary(folder: str) -> dict:
+    """
+    Lists every shard in the folder with its samples, written once all shards are finished.
+    """
+    shards: list[dict] = []
+    for index_path in sorted(glob.glob(os.path.join(folder, '*.idx.jsonl'))):
+        keys: list[str] = []
+        with open(index_path) as f:
+            for line in f:
+                # The last line is cut short if a crash happened while appending it
+                try:
+                    keys.append(json.loads(line)['key'])
+                except json.JSONDecodeError:
+                    continue
+
+        tar_path: str = index_path.removesuffix('.idx.jsonl') + '.tar'
+        shards.append({
+            'shard': os.path.basename(tar_path),
+            'index': os.path.basename(index_path),
+            'size': os.path.getsize(tar_path),
+            'samples': len(keys),
+            'first_key': min(keys, default=None),
+            'last_key': max(keys, default=None)
+        })
+
+    summary: dict = {'shards': shards, 'samples': sum(shard['samples'] for shard in shards)}
+    with open(os.path.join(folder, 'shards.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    return summary
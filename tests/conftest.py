@@ -0,0 +1,23 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The addon's __init__ imports bpy, so the modules that don't are loaded from a bare package instead
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package = types.ModuleType('gb_render')
+package.__path__ = [ROOT]
+sys.modules.setdefault('gb_render', package)
+
+@pytest.fixture
+def sweep() -> types.SimpleNamespace:
+    # Sweep settings as RenderConfig has them, small enough to build every plan quickly
+    return types.SimpleNamespace(
+        starting_liquid_level=20, liquid_level_step=40,
+        starting_zoom=1.0, zoom_levels=2, zoom_step=0.5,
+        starting_elevation=30, max_elevation=90, elevation_step=30,
+        azimuth_step=90,
+        sampler=0, frame_budget=64, sampler_seed=7,
+        skip_duplicates=False
+    )
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from gb_render.calibration import break_lock, choose_settings, claim_lock, lock_is_stale, probe_frames, read_lock
+from gb_render.planner import plan_frames
+
+def test_cleanest_fitting_threshold_is_chosen():
+    settings: dict = choose_settings({0.1: [1, 2], 0.05: [2, 3], 0.02: [3, 5]}, 256, 4)
+
+    assert settings['adaptive_threshold'] == 0.05
+    assert settings['samples'] == 256
+    assert settings['predicted_seconds'] == 3
+    assert settings['time_limit'] == 8
+    assert settings['measurements'] == {'0.1': [1, 2], '0.05': [2, 3], '0.02': [3, 5]}
+
+def test_samples_drop_when_no_threshold_fits():
+    # The slowest probe at the fastest threshold takes 8 seconds, so a quarter of the samples fit in 2
+    settings: dict = choose_settings({0.1: [4, 8], 0.05: [6, 12]}, 256, 2)
+
+    assert settings['adaptive_threshold'] == 0.1
+    assert settings['samples'] == 64
+    assert settings['predicted_seconds'] == pytest.approx(2)
+
+    assert choose_settings({0.1: [1000]}, 16, 1)['samples'] == 1
+
+def test_probes_cover_the_sweep_corners(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    probes: list[int] = probe_frames(plan)
+
+    rows: np.ndarray = plan[np.array(probes) - 1]
+    assert len(probes) == 4
+    assert set(zip(rows['elevation'].tolist(), rows['liquid_level'].tolist())) == {(30, 20), (30, 100), (90, 20), (90, 100)}
+
+def test_lock_is_claimed_once(tmp_path):
+    path: str = str(tmp_path/'calibration.json.lock')
+
+    assert claim_lock(path)
+    assert not claim_lock(path)
+    assert read_lock(path)['pid'] == os.getpid()
+    assert not lock_is_stale(path, read_lock(path))
+
+def test_lock_of_a_dead_process_is_stale(tmp_path):
+    path: str = str(tmp_path/'calibration.json.lock')
+    process = subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, {os.path.dirname(os.path.dirname(__file__))!r}); '
+                              f'import calibration; calibration.claim_lock({path!r})'])
+    assert process.returncode == 0
+
+    owner: dict = read_lock(path)
+    assert owner['pid'] != os.getpid()
+    assert lock_is_stale(path, owner)
+
+    break_lock(path, owner)
+    assert claim_lock(path)
+
+def test_untouched_lock_is_stale(tmp_path):
+    path: str = str(tmp_path/'calibration.json.lock')
+    claim_lock(path)
+
+    old: float = time.time() - 7200
+    os.utime(path, (old, old))
+    assert lock_is_stale(path, read_lock(path))
+
+def test_break_lock_keeps_a_new_owner(tmp_path):
+    path: str = str(tmp_path/'calibration.json.lock')
+    claim_lock(path)
+
+    # The lock was already broken and claimed again by the time this worker breaks it
+    stale_owner: dict = {'host': 'elsewhere', 'pid': 1, 'time': 0}
+    break_lock(path, stale_owner)
+    assert read_lock(path)['pid'] == os.getpid()
+    assert os.listdir(tmp_path) == ['calibration.json.lock']
@@ -0,0 +1,43 @@
+import numpy as np
+
+from gb_render.content_hash import frame_hashes, plan_hash, settings_digest
+from gb_render.planner import plan_frames
+
+SETTINGS: dict = {'samples': 64, 'resolution': [512, 512], 'scene': 'abc'}
+
+def test_frame_hashes_follow_poses_not_numbers(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    hashes: dict[int, str] = frame_hashes(plan, SETTINGS)
+    assert len(set(hashes.values())) == len(plan)
+
+    renumbered: np.ndarray = plan[::-1].copy()
+    renumbered['frame'] = np.arange(1, len(plan) + 1)
+    moved: dict[int, str] = frame_hashes(renumbered, SETTINGS)
+    assert moved[1] == hashes[len(plan)]
+    assert set(moved.values()) == set(hashes.values())
+
+def test_frame_hashes_ignore_float_noise(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    noisy: np.ndarray = plan.copy()
+    noisy['zoom'] += 1e-9
+
+    assert frame_hashes(noisy, SETTINGS) == frame_hashes(plan, SETTINGS)
+
+def test_settings_change_every_hash(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    hashes: dict[int, str] = frame_hashes(plan, SETTINGS)
+
+    for changed in ({**SETTINGS, 'samples': 128}, {**SETTINGS, 'scene': 'abd'}):
+        assert set(frame_hashes(plan, changed).values()).isdisjoint(hashes.values())
+
+    # Key order doesn't matter
+    assert settings_digest(dict(reversed(SETTINGS.items()))) == settings_digest(SETTINGS)
+
+def test_plan_hash_is_order_sensitive(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    assert plan_hash(plan, SETTINGS) == plan_hash(plan.copy(), SETTINGS)
+
+    renumbered: np.ndarray = plan[::-1].copy()
+    renumbered['frame'] = np.arange(1, len(plan) + 1)
+    assert plan_hash(renumbered, SETTINGS) != plan_hash(plan, SETTINGS)
+    assert plan_hash(plan, {**SETTINGS, 'samples': 128}) != plan_hash(plan, SETTINGS)
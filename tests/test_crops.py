@@ -0,0 +1,26 @@
+import numpy as np
+
+from gb_render.crops import crop_rect
+
+def test_rect_counts_rows_from_the_top():
+    # Camera view y goes up, so points in the lower left land in the bottom rows
+    points: np.ndarray = np.array([[.1, .1, 5], [.3, .2, 5]])
+
+    assert crop_rect(points, 100, 50, 0).tolist() == [10, 40, 20, 5]
+
+def test_padding_grows_with_the_larger_side():
+    points: np.ndarray = np.array([[.4, .4, 5], [.6, .6, 5]])
+
+    assert crop_rect(points, 200, 100, .05).tolist() == [70, 30, 60, 40]
+
+def test_rect_is_clipped_to_the_image():
+    points: np.ndarray = np.array([[-.5, .5, 5], [.5, 1.5, 5]])
+
+    assert crop_rect(points, 100, 100, .1).tolist() == [0, 0, 60, 60]
+
+def test_full_image_when_the_bin_is_not_in_front():
+    behind: np.ndarray = np.array([[.4, .4, 5], [.6, .6, -1]])
+    outside: np.ndarray = np.array([[1.2, .4, 5], [1.5, .6, 5]])
+
+    assert crop_rect(behind, 64, 48, 0).tolist() == [0, 0, 64, 48]
+    assert crop_rect(outside, 64, 48, 0).tolist() == [0, 0, 64, 48]
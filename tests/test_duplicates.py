@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from gb_render.planner import (GRID, HALTON, PLAN_DTYPE, SOBOL, STRATIFIED, TOP_DOWN_ELEVATION, canonical_poses, plan_aliases,
+                               plan_frames, plan_grid, plan_size, remove_duplicates)
+
+@pytest.mark.parametrize('sampler', [GRID, SOBOL, HALTON, STRATIFIED])
+def test_plan_size_counts_dropped_duplicates(sweep, sampler):
+    sweep.sampler = sampler
+    sweep.skip_duplicates = True
+
+    plan: np.ndarray = plan_frames(sweep)
+    assert plan_size(sweep) == len(plan)
+    assert plan['frame'].tolist() == list(range(1, len(plan) + 1))
+
+def test_remove_duplicates_keeps_one_top_down_view(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+    unique, aliases = remove_duplicates(plan)
+
+    # 3 liquid levels x 2 zooms x (2 elevations x 4 azimuths + 1 top down view)
+    assert len(unique) == 3*2*(2*4 + 1)
+    assert len(unique) + len(aliases) == len(plan)
+    assert len(np.unique(canonical_poses(unique), axis=0)) == len(unique)
+    assert np.all(aliases['elevation'] >= TOP_DOWN_ELEVATION)
+
+    # Every alias points at the kept frame with the same pose
+    for alias in aliases:
+        target: np.void = unique[alias['canonical_frame'] - 1]
+        assert target['elevation'] == alias['elevation']
+        assert target['zoom'] == alias['zoom']
+        assert target['liquid_level'] == alias['liquid_level']
+
+def test_plan_aliases_match_dropped_frames(sweep):
+    sweep.skip_duplicates = True
+    assert len(plan_aliases(sweep)) + plan_size(sweep) == len(plan_grid(sweep))
+
+def test_wrapped_azimuth_is_a_duplicate():
+    plan: np.ndarray = np.zeros(2, dtype=PLAN_DTYPE)
+    plan['frame'] = [1, 2]
+    plan['azimuth'] = [0, 360]
+    plan['elevation'] = 45
+
+    unique, aliases = remove_duplicates(plan)
+    assert len(unique) == 1
+    assert aliases['canonical_frame'].tolist() == [1]
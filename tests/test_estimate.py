@@ -0,0 +1,48 @@
+import pytest
+
+from gb_render.estimate import HISTORY_FILE, append_history, estimate_render, latest_measurement, read_history
+
+def run(frame_type: str, width: int, height: int, samples: int, seconds: float, size: float) -> dict:
+    return {'type': frame_type, 'width': width, 'height': height, 'samples': samples, 'seconds_per_frame': seconds, 'bytes_per_frame': size}
+
+def test_history_skips_cut_off_lines(tmp_path):
+    assert read_history(str(tmp_path)) == []
+
+    append_history(str(tmp_path), run('raw', 512, 512, 64, 2, 1000))
+    with open(tmp_path/HISTORY_FILE, 'a') as f:
+        f.write('{"type": "ra')
+    assert read_history(str(tmp_path)) == [run('raw', 512, 512, 64, 2, 1000)]
+
+def test_latest_matching_run_is_exact():
+    history: list[dict] = [run('raw', 512, 512, 64, 2, 1000), run('raw', 512, 512, 64, 3, 1000), run('raw', 256, 256, 64, 1, 300)]
+
+    assert latest_measurement(history, 'seconds_per_frame', 'raw', 512, 512, 64) == (3, True)
+    assert latest_measurement(history, 'seconds_per_frame', 'mask', 512, 512) is None
+
+def test_other_settings_are_scaled():
+    history: list[dict] = [run('raw', 256, 256, 64, 1, 300)]
+
+    # Four times the pixels and twice the samples
+    assert latest_measurement(history, 'seconds_per_frame', 'raw', 512, 512, 128) == (8, False)
+    assert latest_measurement(history, 'bytes_per_frame', 'raw', 512, 512) == (1200, False)
+
+def test_estimate_totals_passes_and_outputs():
+    history: list[dict] = [run('raw', 512, 512, 64, 2, 1000), run('mask', 512, 512, 1, .5, 100)]
+
+    estimate: dict = estimate_render({'raw': 10, 'mask': 10}, {'raw': 10, 'mask': 10}, history, 512, 512, 64)
+    assert estimate['seconds'] == {'raw': 20, 'mask': 5}
+    assert estimate['total_seconds'] == 25
+    assert estimate['total_bytes'] == 11000
+    assert estimate['exact']
+
+def test_single_pass_falls_back_to_separate_passes():
+    history: list[dict] = [run('raw', 512, 512, 64, 2, 1000)]
+
+    estimate: dict = estimate_render({'combined': 10}, {'raw': 10, 'mask': 10}, history, 512, 512, 64)
+    assert estimate['seconds'] == {'combined': pytest.approx(20)}
+    assert estimate['bytes']['mask'] is None
+    assert estimate['total_bytes'] is None
+    assert not estimate['exact']
+
+    history.append(run('mask', 512, 512, 1, .5, 100))
+    assert estimate_render({'combined': 10}, {}, history, 512, 512, 64)['seconds'] == {'combined': pytest.approx(25)}
@@ -0,0 +1,56 @@
+import csv
+
+import numpy as np
+import pytest
+
+from gb_render.frame_index import build_index, camera_intrinsics, write_index
+from gb_render.planner import plan_frames
+
+@pytest.mark.parametrize('sensor_fit, width, height, focal', [
+    # The sensor width spans the larger side with AUTO fit
+    ('AUTO', 1920, 1080, 50/36*1920),
+    ('AUTO', 1080, 1920, 50/36*1920),
+    ('HORIZONTAL', 1080, 1920, 50/36*1080),
+    ('VERTICAL', 1920, 1080, 50/24*1080)
+])
+def test_focal_length_follows_sensor_fit(sensor_fit, width, height, focal):
+    intrinsics: dict[str, float] = camera_intrinsics(50, 36, 24, sensor_fit, width, height)
+
+    assert intrinsics['fx'] == pytest.approx(focal)
+    assert intrinsics['fy'] == pytest.approx(focal)
+    assert (intrinsics['cx'], intrinsics['cy']) == (width/2, height/2)
+
+@pytest.mark.parametrize('sensor_fit, width, height, fitted_size', [
+    ('AUTO', 1920, 1080, 1920),
+    ('AUTO', 1080, 1920, 1920),
+    ('VERTICAL', 1920, 1080, 1080)
+])
+def test_shift_moves_principal_point(sensor_fit, width, height, fitted_size):
+    intrinsics: dict[str, float] = camera_intrinsics(50, 36, 24, sensor_fit, width, height, shift_x=0.1, shift_y=-0.25)
+
+    # Shifts are fractions of the fitted side, image rows count down from the top
+    assert intrinsics['cx'] == pytest.approx(width/2 - 0.1*fitted_size)
+    assert intrinsics['cy'] == pytest.approx(height/2 - 0.25*fitted_size)
+
+def test_index_joins_plan_and_frames(tmp_path, sweep):
+    plan: np.ndarray = plan_frames(sweep)[:3]
+    matrices: np.ndarray = np.tile(np.eye(4), (3, 1, 1))
+    matrices[:, 0, 3] = [1, 2, 3]
+    crops: np.ndarray = np.array([[0, 0, 64, 64], [8, 16, 32, 48], [1, 2, 3, 4]])
+
+    index: np.ndarray = build_index(plan, ['image_1.png', 'image_2.png', 'image_3.png'], ['mask_1.png', 'mask_2.png', 'mask_3.png'],
+                                    matrices, np.array([.1, .2, .3]), camera_intrinsics(50, 36, 24, 'AUTO', 64, 64), crops)
+    assert index['frame'].tolist() == [1, 2, 3]
+    assert index['azimuth'].tolist() == plan['azimuth'].tolist()
+    assert index['mask_file'][1] == 'mask_2.png'
+    assert index['camera_matrix'][2, 0, 3] == 3
+    assert index[['crop_x', 'crop_y', 'crop_width', 'crop_height']][1].tolist() == (8, 16, 32, 48)
+    assert np.all(index['fx'] == np.float32(50/36*64))
+
+    write_index(str(tmp_path), index)
+    assert np.array_equal(np.load(tmp_path/'frames.npy'), index)
+    with open(tmp_path/'frames.csv', newline='') as f:
+        rows: list[dict] = list(csv.DictReader(f))
+    assert len(rows) == 3
+    assert rows[2]['image_file'] == 'image_3.png'
+    assert float(rows[2]['m03']) == 3
@@ -0,0 +1,87 @@
+import os
+
+from gb_render.manifest import CompletionManifest, content_index, copy_entry, read_manifests
+
+def write(path, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def test_completed_checks_content_hashes(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    manifest.append(1, 'raw', write(tmp_path/'raw_1.png', b'one'), content_hash='a')
+    manifest.append(2, 'raw', write(tmp_path/'raw_2.png', b'two'))
+
+    assert manifest.completed('raw') == {1, 2}
+    assert manifest.completed('mask') == set()
+    # Files without a hash always count, files with another hash don't
+    assert manifest.completed('raw', content_hashes={1: 'b', 2: 'c'}) == {2}
+    assert manifest.completed('raw', content_hashes={1: 'a'}, frames=[1, 3]) == {1}
+
+def test_cached_entries_follow_appends(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    manifest.append(1, 'raw', write(tmp_path/'raw_1.png', b'one'), content_hash='a')
+    assert manifest.completed('raw') == {1}
+
+    manifest.append(2, 'raw', write(tmp_path/'raw_2.png', b'two'), content_hash='b')
+    assert manifest.completed('raw') == {1, 2}
+    assert manifest.find('b')['path'] == 'raw_2.png'
+
+    manifest.clear()
+    assert manifest.completed('raw') == set()
+
+def test_broken_entries_are_skipped(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    manifest.append(1, 'raw', write(tmp_path/'raw_1.png', b'one'))
+    manifest.append(2, 'raw', write(tmp_path/'raw_2.png', b'two'))
+    manifest.append(3, 'raw', write(tmp_path/'raw_3.png', b'three'))
+
+    # A file that changed size, a deleted file and a line cut short by a crash
+    write(tmp_path/'raw_1.png', b'changed')
+    os.remove(tmp_path/'raw_2.png')
+    with open(manifest.path, 'a') as f:
+        f.write('{"frame": 4, "ty')
+
+    assert [entry['frame'] for entry in read_manifests(str(tmp_path))] == [3]
+
+def test_content_index_and_copy(tmp_path):
+    dataset: str = str(tmp_path/'dataset')
+    other: str = str(tmp_path/'other')
+    CompletionManifest(dataset).append(1, 'raw', write(tmp_path/'dataset'/'raw_1.png', b'one'), content_hash='a')
+    CompletionManifest(other).append(5, 'raw', write(tmp_path/'other'/'raw_5.png', b'five'), content_hash='b')
+
+    index = content_index(str(tmp_path), exclude=dataset)
+    assert list(index) == ['b']
+
+    folder, entry = index['b']
+    assert copy_entry(folder, entry, str(tmp_path/'copy.png'))
+    assert (tmp_path/'copy.png').read_bytes() == b'five'
+
+    # A file that no longer matches its checksum isn't copied
+    write(tmp_path/'other'/'raw_5.png', b'fivX')
+    assert not copy_entry(folder, entry, str(tmp_path/'again.png'))
+    assert not (tmp_path/'again.png').exists()
+
+def test_refresh_reads_other_workers_appends(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path), 'manifest_0')
+    other: CompletionManifest = CompletionManifest(str(tmp_path), 'manifest_1')
+    manifest.append(1, 'raw', write(tmp_path/'raw_1.png', b'one'), content_hash='a')
+    assert manifest.completed('raw') == {1}
+
+    other.append(2, 'raw', write(tmp_path/'raw_2.png', b'two'), content_hash='b')
+    assert manifest.completed('raw') == {1}
+
+    manifest.refresh()
+    assert manifest.completed('raw') == {1, 2}
+    assert manifest.find('b')['path'] == 'raw_2.png'
+
+    # A line another worker is still writing waits for the next refresh
+    with open(other.path, 'a') as f:
+        f.write('{"frame": 3, "type": "raw", "path": "raw_3.png",')
+    manifest.refresh()
+    with open(other.path, 'a') as f:
+        f.write(' "size": 5, "sha256": "", "hash": "c"}\n')
+    write(tmp_path/'raw_3.png', b'three')
+    manifest.refresh()
+    assert manifest.completed('raw') == {1, 2, 3}
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from gb_render.planner import PLAN_DTYPE, azimuths, describe_frame, elevations, liquid_levels, plan_frames, plan_size, zoom_levels
+
+@pytest.mark.parametrize('steps', [
+    {},
+    {'azimuth_step': 7, 'elevation_step': 25, 'liquid_level_step': 30},
+    {'starting_liquid_level': 100, 'zoom_levels': 1},
+    {'starting_elevation': 90, 'max_elevation': 90}
+])
+def test_plan_size_matches_plan(sweep, steps):
+    vars(sweep).update(steps)
+
+    plan: np.ndarray = plan_frames(sweep)
+    assert plan.dtype == PLAN_DTYPE
+    assert plan_size(sweep) == len(plan)
+    assert plan['frame'].tolist() == list(range(1, len(plan) + 1))
+
+def test_grid_covers_every_pose(sweep):
+    plan: np.ndarray = plan_frames(sweep)
+
+    # 3 liquid levels x 2 zooms x 3 elevations x 4 azimuths, azimuth changing fastest
+    assert len(plan) == 72
+    assert plan['azimuth'][:4].tolist() == [0, 90, 180, 270]
+    assert plan['elevation'][:5].tolist() == [30, 30, 30, 30, 60]
+    assert plan['liquid_level'][-1] == 100
+
+    poses: set[tuple] = set(plan[['liquid_level', 'zoom', 'elevation', 'azimuth']].tolist())
+    assert len(poses) == len(plan)
+
+def test_sweep_values(sweep):
+    assert liquid_levels(sweep).tolist() == [20, 60, 100]
+    assert zoom_levels(sweep).tolist() == [1.0, 1.5]
+    assert elevations(sweep).tolist() == [30, 60, 90]
+    assert azimuths(sweep).tolist() == [0, 90, 180, 270]
+
+def test_full_bin_is_rendered_once(sweep):
+    # A full bin is always rendered, also when the step doesn't land on it or starts there
+    sweep.liquid_level_step = 50
+    assert liquid_levels(sweep).tolist() == [20, 70, 100]
+
+    sweep.starting_liquid_level = 100
+    assert liquid_levels(sweep).tolist() == [100]
+
+def test_describe_frame(sweep):
+    row: np.void = plan_frames(sweep)[5]
+    assert describe_frame(row) == 'Frame 6: <Azimuth: 90, Elevation: 60, Zoom: 1, Liquid Level: 20>'
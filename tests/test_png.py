@@ -0,0 +1,68 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from gb_render.png import encode_png, write_file
+
+def decode_png(data: bytes) -> tuple[dict, np.ndarray, bytes | None]:
+    """
+    Header, pixels and palette of a PNG whose rows all use the Up filter, as encode_png writes them.
+    """
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    chunks: dict[bytes, bytes] = {}
+    position: int = 8
+    while position < len(data):
+        length: int = struct.unpack('>I', data[position:position + 4])[0]
+        tag: bytes = data[position + 4:position + 8]
+        body: bytes = data[position + 8:position + 8 + length]
+        assert struct.unpack('>I', data[position + 8 + length:position + 12 + length])[0] == zlib.crc32(tag + body)
+        chunks[tag] = body
+        position += 12 + length
+
+    assert list(chunks)[-1] == b'IEND'
+    width, height, bit_depth, color_type, *_ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    raw: np.ndarray = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, -1)
+    assert np.all(raw[:, 0] == 2)
+
+    rows: np.ndarray = np.cumsum(raw[:, 1:], axis=0, dtype=np.uint8)
+    channels: int = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    if bit_depth == 16:
+        pixels: np.ndarray = rows.view('>u2').astype(np.uint16)
+    else:
+        pixels: np.ndarray = rows
+    header: dict = {'width': width, 'height': height, 'bit_depth': bit_depth, 'color_type': color_type}
+    return header, pixels.reshape(height, width, channels), chunks.get(b'PLTE')
+
+@pytest.mark.parametrize('shape, dtype, color_type', [
+    ((5, 7), np.uint8, 0),
+    ((5, 7, 3), np.uint8, 2),
+    ((5, 7, 4), np.uint8, 6),
+    ((5, 7, 2), np.uint8, 4),
+    ((5, 7, 3), np.uint16, 2)
+])
+def test_round_trip(shape, dtype, color_type):
+    pixels: np.ndarray = np.random.default_rng(0).integers(0, np.iinfo(dtype).max, size=shape, endpoint=True).astype(dtype)
+
+    header, decoded, palette = decode_png(encode_png(pixels))
+    assert header == {'width': 7, 'height': 5, 'bit_depth': 8*np.dtype(dtype).itemsize, 'color_type': color_type}
+    assert np.array_equal(decoded.reshape(pixels.shape), pixels)
+    assert palette is None
+
+def test_palette_round_trip():
+    colors: np.ndarray = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0]], dtype=np.uint8)
+    indices: np.ndarray = np.random.default_rng(1).integers(0, 3, size=(4, 6)).astype(np.uint8)
+
+    header, decoded, palette = decode_png(encode_png(indices, palette=colors))
+    assert header['color_type'] == 3
+    assert np.array_equal(decoded[..., 0], indices)
+    assert palette == colors.tobytes()
+
+def test_write_file_replaces_atomically(tmp_path):
+    path: str = str(tmp_path/'frame.png')
+    write_file(path, b'old')
+    write_file(path, b'new')
+
+    assert (tmp_path/'frame.png').read_bytes() == b'new'
+    assert [entry.name for entry in tmp_path.iterdir()] == ['frame.png']
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from gb_render.planner import HALTON, SOBOL, STRATIFIED, halton_points, plan_frames, plan_size, sobol_points, stratified_points
+
+@pytest.mark.parametrize('sampler', [SOBOL, HALTON, STRATIFIED])
+def test_samplers_plan_the_frame_budget(sweep, sampler):
+    sweep.sampler = sampler
+
+    plan: np.ndarray = plan_frames(sweep)
+    assert plan_size(sweep) == len(plan) == sweep.frame_budget
+    assert plan['frame'].tolist() == list(range(1, len(plan) + 1))
+
+@pytest.mark.parametrize('points', [sobol_points, halton_points, stratified_points])
+def test_sampler_points_are_seeded_and_in_range(points):
+    first: np.ndarray = points(256, 4, np.random.default_rng(3))
+    again: np.ndarray = points(256, 4, np.random.default_rng(3))
+    other: np.ndarray = points(256, 4, np.random.default_rng(4))
+
+    assert first.shape == (256, 4)
+    assert np.all((first >= 0) & (first < 1))
+    assert np.array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+@pytest.mark.parametrize('points', [sobol_points, stratified_points])
+def test_sampler_points_are_stratified(points):
+    # Both put the same number of points in every eighth of each dimension, Halton only roughly does
+    samples: np.ndarray = points(64, 4, np.random.default_rng(0))
+    for dimension in range(4):
+        strata: np.ndarray = np.floor(samples[:, dimension]*8).astype(int)
+        assert np.bincount(strata, minlength=8).tolist() == [8]*8
+
+def test_samples_stay_in_sweep_ranges(sweep):
+    sweep.sampler = SOBOL
+    plan: np.ndarray = plan_frames(sweep)
+
+    assert np.all((plan['azimuth'] >= 0) & (plan['azimuth'] < 360))
+    assert np.all((plan['elevation'] >= 30) & (plan['elevation'] <= 90))
+    assert np.all((plan['zoom'] >= 1.0) & (plan['zoom'] <= 1.5))
+    assert np.all((plan['liquid_level'] >= 20) & (plan['liquid_level'] <= 100))
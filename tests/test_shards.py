@@ -0,0 +1,80 @@
+import json
+import tarfile
+
+from gb_render.manifest import CompletionManifest, read_manifests
+from gb_render.shards import ShardWriter, write_shard_summary
+
+def add_sample(writer: ShardWriter, folder, frame: int, size: int=100):
+    for part in writer.parts:
+        path = folder/f'{part}_{frame}.png'
+        path.write_bytes(bytes([frame])*size + part.encode())
+        writer.add(frame, part, str(path), {'frame': frame}, content_hash=f'{part}-{frame}')
+
+def read_index(path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_index_offsets_point_at_tar_members(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    writer: ShardWriter = ShardWriter(str(tmp_path/'shards'), manifest, ('raw', 'mask'))
+    for frame in (1, 2, 3):
+        add_sample(writer, tmp_path, frame)
+    writer.close()
+
+    index: list[dict] = read_index(tmp_path/'shards'/'shard-000000.idx.jsonl')
+    assert [sample['key'] for sample in index] == ['00000001', '00000002', '00000003']
+
+    data: bytes = (tmp_path/'shards'/'shard-000000.tar').read_bytes()
+    with tarfile.open(tmp_path/'shards'/'shard-000000.tar') as tar:
+        members: dict[str, bytes] = {member.name: tar.extractfile(member).read() for member in tar.getmembers()}
+
+    offsets: dict[str, list[int]] = {name: offset for sample in index for name, offset in sample['members'].items()}
+    assert offsets.keys() == members.keys()
+    for name, (offset, size) in offsets.items():
+        assert data[offset:offset + size] == members[name]
+    assert json.loads(members['00000002.json']) == {'frame': 2}
+
+    # The loose files are gone once packed
+    assert list(tmp_path.glob('*.png')) == []
+
+def test_manifest_points_into_shards(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    writer: ShardWriter = ShardWriter(str(tmp_path/'shards'), manifest, ('raw', 'mask'))
+    add_sample(writer, tmp_path, 1)
+    writer.close()
+
+    entries: list[dict] = read_manifests(str(tmp_path), verify_checksums=True)
+    assert sorted((entry['type'], entry['hash']) for entry in entries) == [('mask', 'mask-1'), ('raw', 'raw-1')]
+    assert all(entry['path'] == 'shards/shard-000000.tar' for entry in entries)
+
+def test_samples_wait_for_every_part(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    writer: ShardWriter = ShardWriter(str(tmp_path/'shards'), manifest, ('raw', 'mask'))
+
+    (tmp_path/'mask_1.png').write_bytes(b'mask')
+    writer.stage(1, 'mask', str(tmp_path/'mask_1.png'))
+    assert not (tmp_path/'shards'/'shard-000000.tar').exists()
+
+    (tmp_path/'raw_1.png').write_bytes(b'raw')
+    writer.add(1, 'raw', str(tmp_path/'raw_1.png'), {'frame': 1})
+    writer.close()
+
+    assert [sample['key'] for sample in read_index(tmp_path/'shards'/'shard-000000.idx.jsonl')] == ['00000001']
+
+def test_shards_roll_over_and_are_summarized(tmp_path):
+    manifest: CompletionManifest = CompletionManifest(str(tmp_path))
+    writer: ShardWriter = ShardWriter(str(tmp_path/'shards'), manifest, ('raw',), max_bytes=8192)
+    for frame in range(1, 6):
+        add_sample(writer, tmp_path, frame, size=2000)
+    writer.close()
+
+    summary: dict = write_shard_summary(str(tmp_path/'shards'))
+    assert len(summary['shards']) > 1
+    assert summary['samples'] == 5
+    assert summary['shards'][0]['first_key'] == '00000001'
+
+    # A new writer never appends to the shards of an earlier run
+    writer = ShardWriter(str(tmp_path/'shards'), manifest, ('raw',))
+    add_sample(writer, tmp_path, 6)
+    writer.close()
+    assert read_index(tmp_path/'shards'/f'shard-{len(summary["shards"]):06d}.idx.jsonl')[0]['frame'] == 6
@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from gb_render.work_queue import WorkQueue
+
+def published(tmp_path, worker: str, lease_timeout: float=600) -> WorkQueue:
+    queue: WorkQueue = WorkQueue(str(tmp_path/'queue'), worker, lease_timeout)
+    queue.publish(list(range(1, 11)), 4, 'plan')
+    return queue
+
+def expire(path: str):
+    # As if the worker stopped touching its lease an hour ago
+    old: float = time.time() - 3600
+    os.utime(path, (old, old))
+
+def test_publish_splits_frames_into_chunks(tmp_path):
+    queue: WorkQueue = published(tmp_path, 'a')
+
+    assert queue.status() == {'pending': 3, 'leased': 0, 'done': 0}
+    assert not os.path.exists(f'{queue.folder}.a.tmp')
+
+def test_publish_keeps_the_first_plan(tmp_path):
+    published(tmp_path, 'a')
+    other: WorkQueue = WorkQueue(str(tmp_path/'queue'), 'b')
+
+    other.publish(list(range(1, 11)), 4, 'plan')
+    assert other.status()['pending'] == 3
+    with pytest.raises(Exception, match='different frame plan'):
+        other.publish(list(range(1, 21)), 4, 'other plan')
+
+def test_leases_are_exclusive(tmp_path):
+    first: WorkQueue = published(tmp_path, 'a')
+    second: WorkQueue = WorkQueue(first.folder, 'b')
+
+    leases = [first.lease(), second.lease(), first.lease()]
+    assert [lease.chunk for lease in leases] == [0, 1, 2]
+    assert leases[0].frames == [1, 2, 3, 4]
+    assert leases[2].frames == [9, 10]
+    assert second.lease() is None
+
+    first.complete(leases[0])
+    second.release(leases[1])
+    first.complete(leases[2])
+    assert first.status() == {'pending': 1, 'leased': 0, 'done': 2}
+    assert not first.finished()
+
+def test_complete_finishes_the_queue(tmp_path):
+    queue: WorkQueue = published(tmp_path, 'a')
+
+    while (lease := queue.lease()) is not None:
+        assert queue.complete(lease)
+    assert queue.finished()
+
+def test_expired_leases_go_back_to_pending(tmp_path):
+    first: WorkQueue = published(tmp_path, 'a')
+    second: WorkQueue = WorkQueue(first.folder, 'b')
+
+    lease = first.lease()
+    expire(lease.path)
+
+    # The stale worker finds out when it tries to complete the chunk the other one took over
+    taken = second.lease()
+    assert taken.chunk == lease.chunk
+    assert not first.complete(lease)
+    assert second.complete(taken)
+
+def test_fresh_leases_are_kept(tmp_path):
+    first: WorkQueue = published(tmp_path, 'a')
+    second: WorkQueue = WorkQueue(first.folder, 'b')
+
+    lease = first.lease()
+    second.requeue_expired()
+    assert second.status()['leased'] == 1
+    first.complete(lease)
+
+def test_heartbeat_keeps_a_lease_alive(tmp_path):
+    first: WorkQueue = published(tmp_path, 'a', lease_timeout=0.4)
+    second: WorkQueue = WorkQueue(first.folder, 'b', lease_timeout=0.4)
+
+    lease = first.lease()
+    time.sleep(0.6)
+    second.requeue_expired()
+    assert first.complete(lease)
+
+def test_restarted_worker_gives_back_its_leases(tmp_path):
+    queue: WorkQueue = published(tmp_path, 'a')
+    lease = queue.lease()
+
+    restarted: WorkQueue = WorkQueue(queue.folder, 'a')
+    restarted.requeue_own()
+    assert restarted.status() == {'pending': 3, 'leased': 0, 'done': 0}
+    assert not queue.complete(lease)
+
+def test_claim_succeeds_once(tmp_path):
+    first: WorkQueue = published(tmp_path, 'a')
+    second: WorkQueue = WorkQueue(first.folder, 'b')
+
+    assert first.claim('metadata')
+    assert not second.claim('metadata')
+    assert second.claim('summary')
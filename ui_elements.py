@@ -3,18 +3,25 @@ import bpy
 from bpy.props import IntProperty, FloatProperty, BoolProperty, StringProperty, PointerProperty, EnumProperty, FloatVectorProperty
 from bpy.types import PropertyGroup, Object, Material, Context, Collection
 from uuid import uuid4
+from .planner import plan_size
+from .utils import RENDER_SEQUENCES
+
+def redraw_area(self, ctx: Context):
+    # No area exists when running in the background (blender -b)
+    if ctx.area is not None:
+        ctx.area.tag_redraw()
 
 class DataElements(PropertyGroup):  
     render_estimate: IntProperty(
         name='Render Estimate',
-        default=int(round((360/10) * ((90/10)+1)))
+        default=1296  # Both passes over the default parameters' 648 frames
     ) 
 
     render_progress: FloatProperty(
         name = 'Render Progress',
         min = 0,
         max = 1,
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     show_render_progress: BoolProperty(
@@ -22,38 +29,21 @@ class DataElements(PropertyGroup):
         default = False
     ) 
 
-    keyframes_generated: BoolProperty(
-        name = 'data_keyframes_generated',
-        default = False
+    # Plan hash of the keyframes in the scene, keyframing is skipped while it matches
+    keyframes_hash: StringProperty(
+        name = 'data_keyframes_hash',
+        default = ''
     ) 
 
 def update_render_btn(self, ctx: Context):
-    # Access properties from their respective classes
-    azimuth_step = ctx.scene.parameter_settings_elements.azimuth_step
-
-    starting_elevation = ctx.scene.parameter_settings_elements.starting_elevation
-    max_elevation = ctx.scene.parameter_settings_elements.max_elevation
-    elevation_step = ctx.scene.parameter_settings_elements.elevation_step
-
-    zoom_levels = ctx.scene.parameter_settings_elements.zoom_levels
-
-    starting_liquid_level = ctx.scene.parameter_settings_elements.starting_liquid_level
-    liquid_level_step = ctx.scene.parameter_settings_elements.liquid_level_step
-
-    render_sequence = ctx.scene.render_settings_elements.render_sequence
-
-    # Calculate the estimated number of frames
-    azimuths_rendered: float = 360 / azimuth_step
-    elevations_rendered: int = ((max_elevation-starting_elevation) // elevation_step) + 1
-    liquid_levels: int = ((100-starting_liquid_level) / liquid_level_step) + 1
-
-    estimate = azimuths_rendered * elevations_rendered * zoom_levels * liquid_levels
-    if int(render_sequence) == 0:
-        estimate *= 2
-        
-    ctx.scene.gb_data.render_estimate = int(round(estimate))
+    # Same plan the renderer builds, once for every pass of the render sequence
+    passes: int = len(RENDER_SEQUENCES[int(ctx.scene.render_settings_elements.render_sequence)])
+    ctx.scene.gb_data.render_estimate = plan_size(ctx.scene.parameter_settings_elements)*passes
 
     # Update the UI
+    if ctx.screen is None:
+        return
+
     for area in ctx.screen.areas:
         if area.type == 'VIEW_3D':
             for region in area.regions:
@@ -91,49 +81,49 @@ class ObjectSelectionElements(PropertyGroup):
         name = 'Bin',
         type = Object,
         description = 'Select the bin',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     camera: PointerProperty(
         name = 'Camera',
         type = Object,
         description = 'Select the camera',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     camera_track: PointerProperty(
         name = 'Camera Track',
         type = Object,
         description = 'Select the camera track curve',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     bin_cutter: PointerProperty(
         name = 'Grease Cutter',
         type = Object,
         description = 'Select the grease cutter',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     )
 
     seg_bin_cutter: PointerProperty(
         name = 'Seg Grease Cutter',
         type = Object,
         description = 'Select the segmentation grease cutter',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     rgb_bin: PointerProperty(
         name = 'RGB Bin',
         type = Collection,
         description = 'Select the textured bin collection',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
     seg_bin: PointerProperty(
         name = 'SEG Bin',
         type = Collection,
         description = 'Select the segmented bin colleciton',
-        update=lambda self, ctx: ctx.area.tag_redraw()  # Update the UI when changed
+        update=redraw_area  # Update the UI when changed
     ) 
 
 class SegmentationColorsElements(PropertyGroup):
@@ -238,7 +228,7 @@ class MaterialElements(PropertyGroup):
 class ParameterSettingsElements(PropertyGroup):
     starting_liquid_level: IntProperty(
         name = 'Starting Liquid Level',
-        default = 100,
+        default = 20,
         min = 0,
         max = 100,
         subtype = 'PERCENTAGE',
@@ -317,6 +307,39 @@ class ParameterSettingsElements(PropertyGroup):
         update = update_render_btn
     )   
 
+    skip_duplicates: BoolProperty(
+        name = 'Skip Duplicate Poses',
+        description = 'Only render one of the frames that would render the same image, such as every azimuth when looking straight down',
+        default = True,
+        update = update_render_btn
+    )
+
+    sampler: EnumProperty(
+        items = [
+            ('0', 'Grid', 'Every combination of the liquid levels, zooms, elevations and azimuths', '', 0),
+            ('1', 'Sobol', 'Frame Budget poses from a Sobol sequence over the parameter ranges', '', 1),
+            ('2', 'Halton', 'Frame Budget poses from a Halton sequence over the parameter ranges', '', 2),
+            ('3', 'Stratified', 'Frame Budget poses with every parameter range split into jittered strata', '', 3)
+        ],
+        name = 'Sampler',
+        default = '0',
+        update = update_render_btn
+    )
+
+    frame_budget: IntProperty(
+        name = 'Frame Budget',
+        default = 1000,
+        min = 1,
+        max = 10000000,
+        update = update_render_btn
+    )
+
+    sampler_seed: IntProperty(
+        name = 'Seed',
+        default = 0,
+        min = 0
+    )
+
     focal_length: IntProperty(
         name = 'Focal length',
         default = 50,
@@ -365,11 +388,126 @@ class RenderSettingsElements(PropertyGroup):
         max = 2048
     ) 
 
+    persistent_data: BoolProperty(
+        name = 'Persistent Data',
+        description = 'Keep static geometry, its BVH and images in memory between frames and passes, at the cost of memory',
+        default = False
+    ) 
+
+    cache_grease: BoolProperty(
+        name = 'Cache Grease',
+        description = 'Bake the cut grease for every liquid level before rendering, instead of evaluating the cutters every frame',
+        default = False
+    ) 
+
+    calibrate: BoolProperty(
+        name = 'Calibrate',
+        description = 'Render a few probe frames first and pick the samples and noise threshold that fit the frame time budget',
+        default = False
+    ) 
+
+    frame_time_budget: FloatProperty(
+        name = 'Seconds per Frame',
+        description = 'Time budget for each RGB frame when calibrating',
+        default = 10,
+        min = 0.1,
+        max = 600
+    ) 
+
+    resume: BoolProperty(
+        name = 'Resume',
+        description = 'Skip frames that an earlier, interrupted render of this dataset already finished',
+        default = True
+    ) 
+
+    reuse_frames: BoolProperty(
+        name = 'Reuse Frames',
+        description = 'When resuming, copy frames rendered with the same pose and settings from this or other datasets in the render directory',
+        default = True
+    ) 
+
+    output_mode: EnumProperty(
+        items = [
+            ('0', 'Direct', 'Blender writes each image straight to its final location', '', 0),
+            ('1', 'Temp Files', 'Blender writes a temp file, which is saved again to its final location', '', 1),
+            ('2', 'Buffered', 'Frames are copied from the compositor and written in the background while the next frame renders', '', 2)
+        ],
+        name = 'Output',
+        default = '0'
+    )  
+
+    mask_format: EnumProperty(
+        items = [
+            ('0', 'RGB', 'Masks use the segmentation colors', '', 0),
+            ('1', 'Label Map', 'Masks are single channel images of class indices', '', 1),
+            ('2', 'Palette', 'Masks are class indices with the segmentation colors as their palette', '', 2)
+        ],
+        name = 'Mask Format',
+        default = '0'
+    )  
+
+    pack_shards: BoolProperty(
+        name = 'Pack Shards',
+        description = 'Pack each image, mask and its frame parameters into tar shards with an offset index',
+        default = False
+    ) 
+
+    shard_size: IntProperty(
+        name = 'Shard Size (MB)',
+        default = 1024,
+        min = 16,
+        max = 16384
+    ) 
+
+    crop_mode: EnumProperty(
+        items = [
+            ('0', 'Off', 'Render the whole image', '', 0),
+            ('1', 'Cropped', 'Only render the region around the bin and crop the outputs to it', '', 1),
+            ('2', 'Padded', 'Only render the region around the bin, the rest of the full size outputs stays black', '', 2)
+        ],
+        name = 'Crop to Bin',
+        default = '0'
+    )  
+
+    crop_padding: FloatProperty(
+        name = 'Crop Padding',
+        description = 'Margin around the bin, as a percentage of the larger image side',
+        subtype = 'PERCENTAGE',
+        default = 5,
+        min = 0,
+        max = 50
+    ) 
+
+    aux_depth: BoolProperty(
+        name = 'Depth',
+        description = 'Write the distance to the camera of every pixel as a half float EXR',
+        default = False
+    ) 
+
+    aux_normal: BoolProperty(
+        name = 'Normals',
+        description = 'Write world space surface normals as a half float EXR',
+        default = False
+    ) 
+
+    aux_object_index: BoolProperty(
+        name = 'Object Index',
+        description = "Write every object's pass index as a half float EXR",
+        default = False
+    ) 
+
+    aux_material_index: BoolProperty(
+        name = 'Material Index',
+        description = "Write every material's pass index as a half float EXR",
+        default = False
+    ) 
+
     render_sequence: EnumProperty(
         items = [
             ('0', 'Masks then Images', 'All masks are rendered, followed by all images', '', 0),
             ('1', 'Images Only', 'Only the images are rendered', '', 1),
-            ('2', 'Masks Only', 'Only the masks are rendered', '', 2)
+            ('2', 'Masks Only', 'Only the masks are rendered', '', 2),
+            ('3', 'Images and Masks (Single Pass)', 'Images and masks are rendered together from two view layers', '', 3)
         ],
         name = '',
         default = '0',
@@ -201,6 +201,27 @@ class WM_OT_parameter_tuning(Operator):
 
         layout.separator(factor= 1)
 
+        layout.label(text="Sampling:")
+        box = layout.box()
+        row = box.row()
+        row.label(text= "Sampler:", icon = 'STICKY_UVS_DISABLE')
+        row.prop(props, "sampler", text='')
+
+        # Samplers draw poses from the continuous ranges instead of stepping through them
+        if props.sampler != '0':
+            row = box.row()
+            row.label(text= "Frame Budget:", icon = 'RENDER_ANIMATION')
+            row.prop(props, "frame_budget")
+
+            row = box.row()
+            row.label(text= "Seed:", icon = 'MOD_NOISE')
+            row.prop(props, "sampler_seed")
+
+        row = box.row()
+        row.prop(props, "skip_duplicates")
+
+        layout.separator(factor= 1)
+
         layout.label(text="Camera Properties (Intrinsic):")
         box = layout.box()
         row = box.row()
@@ -240,6 +261,8 @@ class WM_OT_render_settings(Operator):
         row.prop(props, 'image_prefix')
         row = box.row()
         row.prop(props, 'dataset_name')
+        row.prop(props, 'resume')
+        row.prop(props, 'reuse_frames')
 
         row = layout.row()
         row.label(text='Image Quality Settings')
@@ -249,6 +272,30 @@ class WM_OT_render_settings(Operator):
         row.prop(props, 'height')
         row = box.row()
         row.prop(props, 'sample_amount')
+        row.prop(props, 'output_mode')
+        row = box.row()
+        row.prop(props, 'persistent_data')
+        row.prop(props, 'cache_grease')
+        row = box.row()
+        row.prop(props, 'calibrate')
+        row.prop(props, 'frame_time_budget')
+        row = box.row()
+        row.prop(props, 'mask_format')
+        row = box.row()
+        row.prop(props, 'crop_mode')
+        row.prop(props, 'crop_padding')
+        row = box.row()
+        row.prop(props, 'pack_shards')
+        row.prop(props, 'shard_size')
+
+        row = layout.row()
+        row.label(text='Auxiliary Passes')
+        box = layout.box()
+        row = box.row()
+        row.prop(props, 'aux_depth')
+        row.prop(props, 'aux_normal')
+        row.prop(props, 'aux_object_index')
+        row.prop(props, 'aux_material_index')
 
         row = layout.row()
         row.label(text='Render Sequence')
@@ -285,6 +332,8 @@ class VIEW3D_PT_controls(Panel):
         box = layout.box()
         row = box.row()
         row.operator("render.render_generated_animation", text=f'Render Images ({data.render_estimate} Frames)', icon="RENDER_RESULT")
+        row = box.row()
+        row.operator("render.dry_run_generated_animation", text='Dry Run', icon="INFO")
 
     def register():
         Scene.gb_data = bpy.props.PointerProperty(type=DataElements)
@@ -3,13 +3,113 @@ import os
 import glob
 import math
 import json
+import time
+import shutil
+import hashlib
+import numpy as np
 
-from bpy.types import Scene, Object, Context, Collection
+from bpy.types import Scene, Object, Context, Collection, ViewLayer, LayerCollection, CompositorNodeTree, Node
 from enum import Enum
+from .manifest import CompletionManifest, read_manifests, content_index, copy_entry
+from .planner import plan_frames, plan_size, plan_aliases, liquid_levels, sample_ranges, describe_frame, GRID
+from .output import FrameWriter
+from .shards import ShardWriter, write_shard_summary
+from .frame_index import build_index, camera_intrinsics, write_index
+from .profiling import RunProfile
+from .estimate import append_history, read_history, estimate_render
+from .calibration import THRESHOLDS, LOCK_TIMEOUT, probe_frames, choose_settings, claim_lock, read_lock, lock_is_stale, break_lock, describe_owner
+from .grease_cache import GreaseCache
+from .content_hash import frame_hashes, plan_hash
+from .crop_regions import CropRegions
 
 class FrameType(Enum):
     MASK = 'mask'
     RAW = 'raw'
+    COMBINED = 'combined'
+
+class OutputMode(Enum):
+    DIRECT = 0 # Blender writes the final files through the output path and compositor
+    TEMP = 1 # Blender writes a temp file and each frame is saved again from the render result
+    BUFFERED = 2 # Frames are copied from the compositor's viewer and written by a background thread pool
+
+class MaskFormat(Enum):
+    RGB = 0 # Segmentation colors
+    LABEL_MAP = 1 # Single channel class indices
+    PALETTE = 2 # Class indices with the segmentation colors as the PNG palette
+
+class CropMode(Enum):
+    OFF = 0 # The whole image is rendered
+    CROPPED = 1 # Outputs are cropped to the region around the bin
+    PADDED = 2 # Only the region is rendered, the rest of the full size output stays black
+
+# Frame types rendered for each `render_sequence` setting, in order
+RENDER_SEQUENCES: dict[int, tuple[FrameType, ...]] = {
+    0: (FrameType.MASK, FrameType.RAW),
+    1: (FrameType.RAW,),
+    2: (FrameType.MASK,),
+    3: (FrameType.COMBINED,)
+}
+
+def pass_outputs(frame_type: FrameType) -> tuple[FrameType, ...]:
+    # Files a render pass produces for each frame
+    return (FrameType.MASK, FrameType.RAW) if frame_type == FrameType.COMBINED else (frame_type,)
+
+# View layer and compositor nodes the addon creates for single pass rendering
+SEG_VIEW_LAYER: str = 'GB Segmentation'
+SEG_LAYER_NODE: str = 'GB Segmentation Layer'
+MASK_OUTPUT_NODE: str = 'GB Mask Output'
+
+# Auxiliary passes of the RGB view layer, with the view layer setting and render layer socket for each
+AUX_PASSES: dict[str, tuple[str, str]] = {
+    'depth': ('use_pass_z', 'Depth'),
+    'normal': ('use_pass_normal', 'Normal'),
+    'object_index': ('use_pass_object_index', 'IndexOB'),
+    'material_index': ('use_pass_material_index', 'IndexMA')
+}
+
+# Compositor nodes the addon creates for auxiliary passes
+AUX_LAYER_NODE: str = 'GB Aux Layer'
+AUX_OUTPUT_NODE: str = 'GB Aux Output'
+
+# Compositor nodes the addon creates for buffered output
+VIEWER_NODE: str = 'GB Viewer'
+VIEWER_COLORSPACE_NODE: str = 'GB Viewer Colorspace'
+
+# Color space that bakes each view transform into the viewer's pixels, None needs no conversion
+DISPLAY_COLORSPACES: dict[str, str | None] = {
+    'Standard': 'sRGB',
+    'AgX': 'AgX Base sRGB',
+    'Filmic': 'Filmic sRGB',
+    'Raw': None
+}
+
+# Pixel filter widths of RGB images and masks. Cycles only has a scene wide filter, so masks from
+# the single pass render are filtered like the RGB images.
+RGB_FILTER_WIDTH: float = 1.5
+MASK_FILTER_WIDTH: float = 0.01
+
+# Integrator settings for masks, paths are relative to the scene. Masks are flat emission,
+# so there is nothing to bounce, shadow, scatter or blur.
+MASK_PROFILE: dict[str, object] = {
+    'cycles.max_bounces': 0,
+    'cycles.diffuse_bounces': 0,
+    'cycles.glossy_bounces': 0,
+    'cycles.transmission_bounces': 0,
+    'cycles.volume_bounces': 0,
+    'cycles.transparent_max_bounces': 0,
+    'cycles.caustics_reflective': False,
+    'cycles.caustics_refractive': False,
+    'cycles.use_light_tree': False,
+    'cycles.use_fast_gi': False,
+    'cycles.use_guiding': False,
+    'render.use_motion_blur': False,
+    'view_layers["ViewLayer"].use_sky': False,
+    'view_layers["ViewLayer"].use_volumes': False,
+    'view_layers["ViewLayer"].use_motion_blur': False,
+    'view_layers["ViewLayer"].use_pass_z': False,
+    'view_layers["ViewLayer"].use_pass_mist': False,
+    'view_layers["ViewLayer"].use_pass_normal': False
+}
 
 class RenderConfig():
     def __init__(self, scene: Scene):
@@ -34,6 +134,11 @@ class RenderConfig():
 
         self.focal_length: int = param_props.focal_length
 
+        self.sampler: int = int(param_props.sampler)
+        self.frame_budget: int = param_props.frame_budget
+        self.sampler_seed: int = param_props.sampler_seed
+        self.skip_duplicates: bool = param_props.skip_duplicates
+
         # Render Settings
         self.directory: str = bpy.path.abspath(render_props.directory)
         self.dataset_name: str = render_props.dataset_name
@@ -44,6 +149,20 @@ class RenderConfig():
         self.mask_prefix: str = render_props.mask_prefix
         self.image_prefix: str = render_props.image_prefix
         self.sample_amount: int = render_props.sample_amount
+        self.calibrate: bool = render_props.calibrate
+        self.persistent_data: bool = render_props.persistent_data
+        self.cache_grease: bool = render_props.cache_grease
+        self.frame_time_budget: float = render_props.frame_time_budget
+        self.resume: bool = render_props.resume
+        self.reuse_frames: bool = render_props.reuse_frames
+        self.output_mode: OutputMode = OutputMode(int(render_props.output_mode))
+        self.mask_format: MaskFormat = MaskFormat(int(render_props.mask_format))
+        self.crop_mode: CropMode = CropMode(int(render_props.crop_mode))
+        self.crop_padding: float = render_props.crop_padding/100
+        self.pack_shards: bool = render_props.pack_shards
+        self.shard_size: int = render_props.shard_size
+        self.shard_dir: str = os.path.join(self.dataset_folder, 'shards')
+        self.aux_passes: tuple[str, ...] = tuple(name for name in AUX_PASSES if getattr(render_props, f'aux_{name}'))
         self.width: int = render_props.width
         self.height: int = render_props.height
 
@@ -80,7 +199,7 @@ class RenderConfig():
 
         metadata = {
             'dataset_name': self.dataset_name,
-            'liquid_levels': [i for i in range(0, 101, self.liquid_level_step)],
+            'liquid_levels': liquid_levels(self).tolist(),
             'azimuth_step': self.azimuth_step,
             'elevation_step': self.elevation_step,
             'max_elevation': self.max_elevation,
@@ -88,10 +207,17 @@ class RenderConfig():
             'starting_zoom': self.starting_zoom,
             'zoom_step': self.zoom_step,
             'zoom_levels': self.zoom_levels,
+            'sampling': {
+                'sampler': ['grid', 'sobol', 'halton', 'stratified'][self.sampler]
+            },
 
             'color_data': {
                 'segmentation_colors': seg_colors,
-                'material_settings': self.material_colors
+                'material_settings': self.material_colors,
+                'mask_format': self.mask_format.name.lower(),
+                'classes': [
+                    {'index': i, 'name': name, 'color': color} for i, (name, color) in enumerate(seg_colors.items())
+                ]
             },
 
             'image_data': {
@@ -99,29 +225,32 @@ class RenderConfig():
                 'height': self.height,
                 'sample_amount': self.sample_amount,
                 'mask_prefix': self.mask_prefix,
-                'image_prefix': self.image_prefix
+                'image_prefix': self.image_prefix,
+                'packed_shards': self.pack_shards,
+                'aux_passes': {name: f'{name}/{name}_########.exr' for name in self.aux_passes}
             }
         }
 
+        # Every frame's region is in the frame index
+        if self.crop_mode != CropMode.OFF:
+            metadata['image_data']['crop'] = {'mode': self.crop_mode.name.lower(), 'padding': self.crop_padding}
+
         return metadata
 
 class FrameData():
-    __camera: Object = None
-    __camera_track: Object = None
-    __bin_cutter: Object = None
-    __seg_cutter: Object = None
-    __grease: Object = None
-    __bin_cutter_location: float = 0
-
-    def __init__(self, scene: Scene, cfg: RenderConfig, azimuth: int=0, elevation: int=0, zoom: float=1.0, liquid_level: int=100):
-        self.__scene = scene
+    def __init__(self, objects: dict[str, Object | Collection], cfg: RenderConfig, grease_height: float,
+                 azimuth: float=0, elevation: float=0, zoom: float=1.0, liquid_level: float=100):
         self.__azimuth = azimuth
         self.__elevation = elevation
         self.__zoom = zoom
         self.__liquid_level = liquid_level
         self.__cfg = cfg
 
-        self.__get_scene_objects()
+        self.__camera: Object = objects['camera']
+        self.__camera_track: Object = objects['camera_track']
+        self.__bin_cutter: Object = objects['bin_cutter']
+        self.__seg_cutter: Object = objects['seg_cutter']
+        self.__bin_cutter_location: float = grease_height*(self.__liquid_level*.01)
 
     def generate_keyframe(self, frame_num: int):
         # Setting elevation
@@ -146,95 +275,506 @@ class FrameData():
         self.__bin_cutter.keyframe_insert(data_path="location", index=2, frame=frame_num)
         self.__seg_cutter.keyframe_insert(data_path="location", index=2, frame=frame_num)
 
-    def __get_scene_objects(self):
-        objects: dict[str, Object] = get_objects(self.__scene)
-        self.__camera = objects['camera']
-        self.__camera_track = objects['camera_track']
-        self.__bin_cutter = objects['bin_cutter']
-        self.__seg_cutter = objects['seg_cutter']
-        self.__grease = objects['grease']
-        self.__bin_cutter_location = self.__grease.dimensions.z*(self.__liquid_level*.01)
-
     def __repr__(self) -> str:
         return f'Frame: <Azimuth: {self.__azimuth}, Elevation: {self.__elevation}, Zoom: {self.__zoom}, Liquid Level: {self.__liquid_level}>'
 
-class RenderQueue():
-    def __init__(self, *items: FrameData):
-        self.__queue: list[FrameData] = []
-        self.__length: int = 0
-        self.__max_len: int = 0
-        self.__curr_frame: int = 0
-        for item in items:
-            self.add(item)
-
-    def add(self, item):
-        self.__queue.append(item)
-        self.__length += 1
-        self.__max_len += 1
-        return self
-
-    def pop(self) -> FrameData:
-        if len(self) > 0:
-            curr_frame: FrameData = self.__queue[self.__curr_frame]
-            self.__curr_frame += 1
-            self.__length -= 1
-
-            if len(self) == 0:
-                self.__curr_frame = 0
-                self.__max_len = 0
-                self.__queue = []
-
-            return curr_frame
-        else:
-            raise IndexError('This RenderQueue does not have any items.')
-    
-    def max_length(self) -> int:
-        return self.__max_len
-
-    def __getitem__(self, i: int) -> FrameData:
-        return self.__queue[i]
-        
-    def __len__(self) -> int:
-        return self.__length
-    
-    def __repr__(self) -> str:
-        repr_str: str = '['
-        for i in self.__queue:
-            repr_str += f'{i}, '
-
-        repr_str = repr_str.removesuffix(', ')
-        repr_str += ']'
-        return repr_str
-    
 class AnimationSequence():
-    def __init__(self, ctx: Context, frames: RenderQueue):
+    def __init__(self, ctx: Context, frames: np.ndarray, manifest_name: str='manifest', bulk_keyframes: bool=True,
+                 profile: RunProfile | None=None, force_keyframes: bool=False, metadata_only: bool=False):
+        """
+        With metadata_only, only what create_metadata needs is prepared: nothing is baked, calibrated
+        or fingerprinted, and crop regions come from the workers that rendered them.
+        """
         self.__scene: Scene = ctx.scene
-        self.__cfg: RenderConfig = RenderConfig(self.__scene)
+        self.__manifest_name: str = manifest_name
+
+        # Phase timings for the whole run, written next to metadata.json
+        self.profile: RunProfile = RunProfile() if profile is None else profile
+        with self.profile.phase('config'):
+            self.__cfg: RenderConfig = RenderConfig(self.__scene)
         self.temp_save_path: str = os.path.join(self.__cfg.dataset_folder, 'temp_render')
 
-        self.__generate_keyframes(ctx, frames)
+        # Finished files are recorded so an interrupted render can pick up where it stopped
+        self.manifest: CompletionManifest = CompletionManifest(self.__cfg.dataset_folder, manifest_name)
+        if not self.__cfg.resume and not metadata_only:
+            self.manifest.clear()
+
+        # Scene settings the mask profile overrides, restored for RGB frames
+        self.__default_profile: dict[str, object] = capture_settings(self.__scene, MASK_PROFILE)
+
+        self.render_times: dict[FrameType, list[float]] = {frame_type: [] for frame_type in FrameType}
+        self.__frame_start_time: float = 0
+        self.__direct: bool = True
+        self.__saved_compression: int | None = None
+        self.__sync_time: float | None = None
+
+        # Encodes and writes frames while the next one renders
+        self.__writer: FrameWriter | None = None
+        if self.__cfg.output_mode == OutputMode.BUFFERED or self.__cfg.mask_format != MaskFormat.RGB:
+            self.__writer = FrameWriter(workers=min(os.cpu_count() or 1, 4))
+
+        self.__frames: np.ndarray = frames
+        self.__grease_height: float = 0
+        self.__calibration: dict | None = None
+        self.__grease_cache: GreaseCache | None = None
+        self.__crop_regions: CropRegions | None = None
+        self.__shards: ShardWriter | None = None
+
+        # Auxiliary passes come from the RGB view layer during the first pass that renders it
+        sequence: tuple[FrameType, ...] = RENDER_SEQUENCES[self.__cfg.sequence_setting]
+        self.__aux_pass: FrameType | None = None
+        if len(self.__cfg.aux_passes) > 0:
+            self.__aux_pass = next((frame_type for frame_type in sequence if frame_type != FrameType.MASK), sequence[0])
+
+        if self.__cfg.pack_shards and not metadata_only:
+            self.__shards = self.__create_shard_writer(manifest_name)
+
+        with self.profile.phase('generate_keyframes'):
+            self.__generate_keyframes(ctx, frames, bulk_keyframes, force_keyframes)
+
+        # Cut meshes for every liquid level, swapped in while rendering
+        if self.__cfg.cache_grease and not metadata_only:
+            objects: dict[str, Object | Collection] = get_objects(self.__scene)
+            self.__grease_cache = GreaseCache(self.__scene, [objects['bin_cutter'], objects['seg_cutter']], frames, self.__grease_height)
+            with self.profile.phase('bake_grease'):
+                self.__grease_cache.bake()
+
+        # Render borders around the bins, from the camera at every pose
+        if self.__cfg.crop_mode != CropMode.OFF:
+            objects: dict[str, Object | Collection] = get_objects(self.__scene)
+            bounds: list[Object] = [objects['grease']] + [
+                obj for collection in (objects['rgb_bin'], objects['seg_bin']) for obj in collection.all_objects if obj.type == 'MESH'
+            ]
+            self.__crop_regions = CropRegions(self.__scene, objects['camera'], bounds, frames, self.__cfg.crop_padding,
+                                              self.__cfg.crop_mode == CropMode.CROPPED)
+            self.__plan_crops(metadata_only)
+
+        # Probe renders have to happen before the render operator adds its handlers
+        rgb_pass: bool = any(frame_type != FrameType.MASK for frame_type in RENDER_SEQUENCES[self.__cfg.sequence_setting])
+        if self.__cfg.calibrate and rgb_pass and metadata_only:
+            # The metadata lists the calibration the workers rendered with
+            self.__calibration = self.__read_calibration(self.__calibration_path(), self.__calibration_settings())
+        elif self.__cfg.calibrate and rgb_pass:
+            with self.profile.phase('calibrate'):
+                self.__calibrate()
+
+        # Files rendered from an edited scene or another .blend never match this one's
+        self.__scene_fingerprint: str = ''
+        self.__content_hashes: dict[FrameType, dict[int, str]] = {}
+        if not metadata_only:
+            with self.profile.phase('fingerprint'):
+                self.__scene_fingerprint = scene_fingerprint(self.__scene)
+
+            # Identifies each output by what it shows, so it can be found again after the plan changes
+            self.__content_hashes = {
+                output_type: frame_hashes(frames, self.__content_settings(output_type)) for output_type in (FrameType.MASK, FrameType.RAW)
+            }
+        # Files in the other datasets of the render directory, read the first time frames are reused
+        self.__content_index: dict[str, tuple[str, dict]] | None = None
+
+    def render(self, frame_type: FrameType, blocking: bool=False, frames: list[int] | None=None) -> bool:
+        """
+        Renders a pass, and returns whether it's still rendering in a render job that finishes
+        it from the scheduler's handlers.
+        """
+        remaining: list[int] = self.prepare_pass(frame_type, blocking, frames)
+
+        # Render frame by frame without a UI, saving each frame as soon as it's done
+        if blocking:
+            for frame in remaining:
+                self.render_frame(frame, blocking=True)
+                self.save_frame(frame_type)
+                self.frame_written(frame_type)
 
-    def render(self, frame_type: FrameType):
-        self.__setup_engine(frame_type)
-        self.__scene.render.filepath = self.temp_save_path
+            self.finish_pass(frame_type)
+            return False
+
+        if self.renders_per_frame():
+            raise Exception('Cropped frames render one at a time, use render_frame for each frame')
+
+        # An animation render would still render the last frame again
+        if len(remaining) == 0:
+            self.finish_pass(frame_type)
+            return False
+
+        # Animation renders can only skip ahead to the first unfinished frame
+        self.__scene.frame_start = min(remaining)
 
         bpy.ops.render.render('INVOKE_DEFAULT', animation=True, write_still=False)
+        return True
+
+    def prepare_pass(self, frame_type: FrameType, blocking: bool=False, frames: list[int] | None=None) -> list[int]:
+        """
+        Sets up the engine and output path for a pass, and returns the frames it still has to render.
+        """
+        with self.profile.phase('setup_engine'):
+            self.__setup_engine(frame_type)
+
+        if self.render_stats not in bpy.app.handlers.render_stats:
+            bpy.app.handlers.render_stats.append(self.render_stats)
+        if self.__grease_cache is not None:
+            self.__grease_cache.activate()
+
+        if frames is None:
+            frames = range(1, self.__scene.frame_end + 1)
+
+        # Other workers rendering the same dataset, such as queue workers whose chunk came back,
+        # append to their own manifests meanwhile
+        if self.__cfg.resume:
+            self.manifest.refresh()
+
+        # Skip frames an earlier, interrupted render already finished
+        completed: set[int] = self.completed_frames(frame_type, frames)
+        remaining: list[int] = [frame for frame in frames if frame not in completed]
+        if len(remaining) < len(frames):
+            print(f'Skipping {len(frames) - len(remaining)} {frame_type.value} frames that are already rendered')
+
+        # Frames with the same pose and settings under another frame number or in another dataset
+        if self.__cfg.resume and self.__cfg.reuse_frames and len(remaining) > 0:
+            with self.profile.phase('reuse_frames'):
+                reused: set[int] = self.__reuse_frames(frame_type, remaining)
+            remaining = [frame for frame in remaining if frame not in reused]
+
+        # Output path template with the frame number filled in by Blender, or a temp file when
+        # the frame is saved again in save_frame or only captured
+        written_type: FrameType | None = self.__written_type(frame_type)
+        direct: bool = written_type is not None and self.__cfg.output_mode != OutputMode.TEMP
+        self.__scene.render.filepath = self.output_template(written_type) if direct else self.temp_save_path
+        self.__scene.render.image_settings.file_format = 'PNG'
+        self.__scene.render.use_file_extension = True
+        self.__scene.render.use_overwrite = True
+        self.__scene.render.use_placeholder = False
+        self.__direct = direct
+
+        # Animation renders write a file for every frame even when it's only captured, so at least
+        # skip compressing a file that's deleted right away
+        if written_type is None and not blocking and not self.renders_per_frame():
+            self.__saved_compression = self.__scene.render.image_settings.compression
+            self.__scene.render.image_settings.compression = 0
+
+        return remaining
+
+    def render_frame(self, frame: int, blocking: bool=False):
+        """
+        Renders a single frame of the prepared pass. Crop regions change the border every frame,
+        which animation renders only read once.
+        """
+        self.__scene.frame_set(frame)
+        if self.__crop_regions is not None:
+            self.__crop_regions.apply(frame)
+
+        if blocking:
+            self.frame_started()
+            bpy.ops.render.render(write_still=self.__direct)
+        else:
+            bpy.ops.render.render('INVOKE_DEFAULT', write_still=self.__direct)
+
+    def completed_frames(self, frame_type: FrameType, frames: list[int] | None=None) -> set[int]:
+        if not self.__cfg.resume:
+            return set()
+
+        # Files from an earlier plan only count when they show what this plan puts under their frame number
+        completed: list[set[int]] = [
+            self.manifest.completed(output_type.value, content_hashes=self.__content_hashes[output_type], frames=frames)
+            for output_type in pass_outputs(frame_type)
+        ]
+        return set.intersection(*completed)
+
+    def frame_path(self, frame_type: FrameType, frame: int) -> str:
+        if frame_type == FrameType.MASK:
+            return os.path.join(self.__cfg.mask_dir, f'{self.__cfg.mask_prefix}_{frame:08d}.png')
+        return os.path.join(self.__cfg.image_dir, f'{self.__cfg.image_prefix}_{frame:08d}.png')
+
+    def output_template(self, frame_type: FrameType) -> str:
+        # Blender replaces the #'s with the zero padded frame number, matching frame_path
+        if frame_type == FrameType.MASK:
+            return os.path.join(self.__cfg.mask_dir, f'{self.__cfg.mask_prefix}_########')
+        return os.path.join(self.__cfg.image_dir, f'{self.__cfg.image_prefix}_########')
+
+    def frame_started(self):
+        self.__frame_start_time = time.perf_counter()
+        self.__sync_time = None
+
+    def render_stats(self, stats: str, *args):
+        # Cycles reports samples once the scene is synced and the BVH is built
+        if self.__sync_time is None and 'Sample ' in stats:
+            self.__sync_time = time.perf_counter() - self.__frame_start_time
+
+    def renders_per_frame(self) -> bool:
+        return self.__crop_regions is not None
+
+    def remove_handlers(self):
+        if self.render_stats in bpy.app.handlers.render_stats:
+            bpy.app.handlers.render_stats.remove(self.render_stats)
+        if self.__grease_cache is not None:
+            self.__grease_cache.deactivate()
+        if self.__crop_regions is not None:
+            self.__crop_regions.restore()
+
+        # The mask profile would otherwise stay in the scene, and the next run would capture it as the default
+        apply_settings(self.__scene, self.__default_profile)
+        if self.__saved_compression is not None:
+            self.__scene.render.image_settings.compression = self.__saved_compression
+            self.__saved_compression = None
 
     def save_frame(self, frame_type: FrameType):
         frame: int = self.__scene.frame_current
+        render_time: float = time.perf_counter() - self.__frame_start_time
+        self.render_times[frame_type].append(render_time)
+        self.profile.record(f'render_{frame_type.value}', render_time, frame)
+
+        if self.__sync_time is None:
+            print(f'Rendered {frame_type.value} frame {frame} in {render_time:.3f}s')
+        else:
+            self.profile.record(f'sync_{frame_type.value}', self.__sync_time, frame)
+            print(f'Rendered {frame_type.value} frame {frame} in {render_time:.3f}s ({self.__sync_time:.3f}s sync)')
+
+        with self.profile.phase('save_frame', frame):
+            self.__save_frame(frame_type, frame)
+
+    def __save_frame(self, frame_type: FrameType, frame: int):
+        captured_type: FrameType | None = self.__captured_type(frame_type)
+        if captured_type is not None:
+            self.__capture_frame(captured_type, frame)
+
+        # Blender writes the other final files itself, unless they go through a temp file
+        written_type: FrameType | None = self.__written_type(frame_type)
+        if written_type is None or self.__cfg.output_mode != OutputMode.TEMP:
+            return
+
         render_result: bpy.types.Image = bpy.data.images.get("Render Result")
 
         if render_result is None:
-            self.report({"ERROR"}, "Render Result not found")
-            return
+            raise Exception('Render Result not found')
+
+        render_result.save_render(filepath=self.frame_path(written_type, frame))
+
+    def frame_written(self, frame_type: FrameType):
+        frame: int = self.__scene.frame_current
+
+        # Anything Blender wrote to the temp path is either saved again or captured by now
+        if not self.__direct:
+            with self.profile.phase('cleanup', frame):
+                self.cleanup()
+
+        # Every file Blender writes for the frame is on disk at this point, captured
+        # frames are recorded by the frame writer once they're written
+        captured_type: FrameType | None = self.__captured_type(frame_type)
+        for written_type in (FrameType.MASK, FrameType.RAW):
+            if frame_type in (written_type, FrameType.COMBINED) and written_type != captured_type:
+                self.file_finished(frame, written_type, self.frame_path(written_type, frame))
+
+        if frame_type == self.__aux_pass:
+            for name in self.__cfg.aux_passes:
+                self.aux_finished(frame, name, self.aux_path(name, frame))
+
+    def file_finished(self, frame: int, frame_type: FrameType, path: str):
+        content_hash: str = self.__content_hashes[frame_type][frame]
+        self.manifest.append(frame, frame_type.value, path, content_hash=content_hash)
+
+        if self.__shards is not None:
+            self.__shards.add(frame, frame_type.value, path, self.__sample_metadata(frame), content_hash)
+
+    def aux_finished(self, frame: int, name: str, path: str):
+        # Only the images and masks are identified by content, auxiliary files are recorded as they are
+        self.manifest.append(frame, name, path)
+
+        if self.__shards is not None:
+            self.__shards.add(frame, name, path, self.__sample_metadata(frame))
+
+    def __sample_metadata(self, frame: int) -> dict:
+        row: np.void = self.__frames[frame - 1]
+        metadata: dict = {name: row[name].item() for name in row.dtype.names}
+
+        # Where a cropped output sits in the full image
+        if self.__crop_regions is not None:
+            metadata['crop'] = self.__crop_regions.rects[frame - 1].tolist()
+
+        return metadata
+
+    def aux_path(self, name: str, frame: int) -> str:
+        return os.path.join(self.__cfg.dataset_folder, name, f'{name}_{frame:08d}.exr')
+
+    def __reuse_frames(self, frame_type: FrameType, frames: list[int]) -> set[int]:
+        """
+        Copies files with the same content hash from earlier renders, in this dataset under another
+        frame number or in another dataset in the render directory. Returns the frames that were reused.
+        """
+        start: float = time.perf_counter()
+        if self.__content_index is None:
+            self.__content_index = content_index(self.__cfg.directory, exclude=self.__cfg.dataset_folder)
+        output_types: tuple[FrameType, ...] = pass_outputs(frame_type)
+
+        # A frame is only reused when every output of the pass is found
+        sources: dict[int, list[tuple[str, dict]]] = {}
+        for frame in frames:
+            found: list[tuple[str, dict] | None] = [self.__find_content(self.__content_hashes[output_type][frame]) for output_type in output_types]
+            if None not in found:
+                sources[frame] = found
+
+        if len(sources) == 0:
+            return set()
+
+        # Everything is copied to temp files before any file is replaced, since a file this plan
+        # renders again can be the source of another frame
+        copied: dict[int, list[str]] = {}
+        for frame, found in sources.items():
+            temp_paths: list[str] = []
+            for output_type, (dataset_folder, entry) in zip(output_types, found):
+                temp_path: str = self.frame_path(output_type, frame) + '.reuse'
+                if not copy_entry(dataset_folder, entry, temp_path):
+                    break
+                temp_paths.append(temp_path)
+
+            if len(temp_paths) == len(output_types):
+                copied[frame] = temp_paths
+                continue
+            for temp_path in temp_paths:
+                os.remove(temp_path)
+
+        for frame, temp_paths in copied.items():
+            for output_type, temp_path in zip(output_types, temp_paths):
+                path: str = self.frame_path(output_type, frame)
+                os.replace(temp_path, path)
+                self.file_finished(frame, output_type, path)
+
+        print(f'Reused {len(copied)} {frame_type.value} frames from earlier renders in {time.perf_counter() - start:.1f}s')
+        return set(copied)
+
+    def __find_content(self, content_hash: str) -> tuple[str, dict] | None:
+        # This dataset's manifest also knows the files rendered since it was read
+        entry: dict | None = self.manifest.find(content_hash)
+        if entry is not None:
+            return self.__cfg.dataset_folder, entry
+        return self.__content_index.get(content_hash)
+
+    def __content_settings(self, output_type: FrameType) -> dict:
+        """
+        Settings besides the pose that change an output's pixels, including the scene fingerprint.
+        """
+        # Single pass renders use other filter and dither settings than the separate passes
+        single_pass: bool = FrameType.COMBINED in RENDER_SEQUENCES[self.__cfg.sequence_setting]
+        settings: dict = {
+            'type': output_type.value,
+            'pass': (FrameType.COMBINED if single_pass else output_type).value,
+            'width': self.__cfg.width,
+            'height': self.__cfg.height,
+            'focal_length': self.__cfg.focal_length,
+            'scene': self.__scene_fingerprint
+        }
+
+        if output_type == FrameType.MASK:
+            settings['segmentation_colors'] = self.__cfg.segmentation_colors
+            settings['mask_format'] = self.__cfg.mask_format.name
+            # Label edges of single pass masks shift with the RGB filter
+            if single_pass:
+                settings['filter_width'] = RGB_FILTER_WIDTH
+        else:
+            settings['material_colors'] = self.__cfg.material_colors
+            settings['samples'] = self.__cfg.sample_amount
+            settings['calibration'] = None if self.__calibration is None else {
+                key: self.__calibration[key] for key in ('samples', 'adaptive_threshold', 'time_limit')
+            }
+
+        # Only added when cropping, so hashes of full frames stay the same
+        if self.__cfg.crop_mode != CropMode.OFF:
+            settings['crop'] = {'mode': self.__cfg.crop_mode.name, 'padding': self.__cfg.crop_padding}
+
+        return settings
+
+    def __create_shard_writer(self, manifest_name: str) -> ShardWriter:
+        parts: list[str] = []
+        for frame_type in RENDER_SEQUENCES[self.__cfg.sequence_setting]:
+            parts.extend(output_type.value for output_type in pass_outputs(frame_type))
+        parts.extend(self.__cfg.aux_passes)
+
+        # Workers each get their own shards, named like their manifest
+        shards: ShardWriter = ShardWriter(self.__cfg.shard_dir, self.manifest, tuple(parts), 'shard' + manifest_name.removeprefix('manifest'),
+                                          self.__cfg.shard_size*1024*1024)
+
+        # Files an earlier run finished but never packed still wait for the rest of their sample
+        if self.__cfg.resume:
+            entries: list[dict] = read_manifests(self.__cfg.dataset_folder)
+            packed: set[tuple[int, str]] = {(entry['frame'], entry['type']) for entry in entries if 'offset' in entry}
+            for entry in entries:
+                if 'offset' not in entry and (entry['frame'], entry['type']) not in packed:
+                    shards.stage(entry['frame'], entry['type'], os.path.join(self.__cfg.dataset_folder, entry['path']), entry.get('hash'))
+
+        return shards
+
+    def __captured_type(self, frame_type: FrameType) -> FrameType | None:
+        """
+        Output of a pass that's copied from the compositor's viewer and written by the frame writer.
+        """
+        buffered: bool = self.__cfg.output_mode == OutputMode.BUFFERED
+        label_masks: bool = self.__cfg.mask_format != MaskFormat.RGB
 
         match frame_type:
             case FrameType.MASK:
-                path: str = os.path.join(self.__cfg.mask_dir, f'{self.__cfg.mask_prefix}_{frame:08d}.png')
-                render_result.save_render(filepath=path)
+                return FrameType.MASK if buffered or label_masks else None
             case FrameType.RAW:
-                path: str = os.path.join(self.__cfg.image_dir, f'{self.__cfg.image_prefix}_{frame:08d}.png')
-                render_result.save_render(filepath=path)
+                return FrameType.RAW if buffered else None
+            case FrameType.COMBINED:
+                # There's a single viewer, label masks need it more than the RGB image
+                if label_masks:
+                    return FrameType.MASK
+                return FrameType.RAW if buffered else None
+
+    def __written_type(self, frame_type: FrameType) -> FrameType | None:
+        """
+        Output of a pass that comes from the render result. Single pass masks come from their own file output node.
+        """
+        result_type: FrameType = FrameType.MASK if frame_type == FrameType.MASK else FrameType.RAW
+        return None if result_type == self.__captured_type(frame_type) else result_type
+
+    def finish_pass(self, frame_type: FrameType):
+        self.remove_handlers()
+
+        # Buffered frames might still be encoding
+        if self.__writer is not None:
+            self.__writer.drain()
+
+        self.report_render_times(frame_type)
+
+    def report_render_times(self, frame_type: FrameType):
+        times: list[float] = self.render_times[frame_type]
+        if len(times) == 0:
+            return
+
+        print(f'Rendered {len(times)} {frame_type.value} frames in {sum(times):.1f}s ({sum(times)/len(times):.3f}s per frame)')
+
+        sync_times: list[float] = [duration for name, _, duration, _ in self.profile.events if name == f'sync_{frame_type.value}']
+        if len(sync_times) > 0:
+            print(f'Synced the scene in {sum(sync_times)/len(sync_times):.3f}s per frame ({sum(sync_times)/sum(times):.0%} of render time)')
+
+        if self.__writer is not None and len(self.__writer.encode_times) > 0:
+            encode_times: list[float] = self.__writer.encode_times
+            for encode_time in encode_times:
+                self.profile.record('encode', encode_time)
+            print(f'Encoded {len(encode_times)} frames in the background in {sum(encode_times):.1f}s ({sum(encode_times)/len(encode_times):.3f}s per frame)')
+            encode_times.clear()
+
+    def __capture_frame(self, frame_type: FrameType, frame: int):
+        viewer: bpy.types.Image | None = bpy.data.images.get('Viewer Node')
+        if viewer is None:
+            raise Exception('Viewer Node image not found, buffered output needs the compositor to run')
+
+        # Copy the pixels out so Blender can move on to the next frame
+        width, height = viewer.size
+        buffer: np.ndarray = self.__writer.acquire(width*height*4)
+        viewer.pixels.foreach_get(buffer)
+
+        image_settings = self.__scene.render.image_settings
+        channels: int = {'BW': 1, 'RGB': 3, 'RGBA': 4}[image_settings.color_mode]
+
+        # Masks can be written as class indices, in the same order as the classes in metadata.json
+        label_colors: np.ndarray | None = None
+        if frame_type == FrameType.MASK and self.__cfg.mask_format != MaskFormat.RGB:
+            label_colors = np.array(list(self.__cfg.segmentation_colors.values()), dtype=np.float32)
+
+        self.__writer.submit(buffer, width, height, self.frame_path(frame_type, frame), channels, int(image_settings.color_depth),
+                             on_written=lambda path: self.file_finished(frame, frame_type, path),
+                             label_colors=label_colors, use_palette=self.__cfg.mask_format == MaskFormat.PALETTE)
 
     def cleanup(self):
         for f in glob.glob(f'{self.temp_save_path}*.png'):
@@ -242,25 +782,299 @@ class AnimationSequence():
 
     def create_metadata(self):
         metadata: dict = self.__cfg.dump_json()
+
+        # Sampled poses aren't on a grid, so every frame's exact values are listed
+        if self.__cfg.sampler != GRID:
+            metadata['sampling'].update({
+                'frame_budget': self.__cfg.frame_budget,
+                'seed': self.__cfg.sampler_seed,
+                'ranges': sample_ranges(self.__cfg),
+                'columns': list(self.__frames.dtype.names),
+                'frames': [list(row) for row in self.__frames.tolist()]
+            })
+
+        # Dropped frames point at the rendered frame that shows the same image
+        if self.__cfg.skip_duplicates:
+            aliases: np.ndarray = plan_aliases(self.__cfg)
+            metadata['sampling']['duplicates'] = {
+                'columns': list(aliases.dtype.names),
+                'frames': [list(row) for row in aliases.tolist()]
+            }
+        if self.__calibration is not None:
+            metadata['image_data']['calibration'] = {
+                key: self.__calibration[key] for key in ('budget', 'samples', 'adaptive_threshold', 'time_limit', 'predicted_seconds', 'probes')
+            }
         with open(os.path.join(self.__cfg.dataset_folder, 'metadata.json'), 'w') as f:
             json.dump(metadata, f, indent=4)
 
-    def __generate_keyframes(self, ctx: Context, frames: RenderQueue):
+        with self.profile.phase('frame_index'):
+            self.__write_frame_index()
+
+        # Every frame is rendered, so the last shard can be closed and listed
+        if self.__cfg.pack_shards:
+            self.close_shards()
+            write_shard_summary(self.__cfg.shard_dir)
+
+    def __write_frame_index(self):
+        start: float = time.perf_counter()
+        frames: np.ndarray = self.__frames
+        camera: Object = get_objects(self.__scene)['camera']
+
+        # The pose only depends on azimuth, elevation and zoom, so each pose is evaluated once
+        # instead of once per liquid level
+        _, first_frames, pose_ids = np.unique(frames[['azimuth', 'elevation', 'zoom']], return_index=True, return_inverse=True)
+        matrices: np.ndarray = np.empty((len(first_frames), 4, 4), dtype=np.float32)
+
+        current_frame: int = self.__scene.frame_current
+        for i, row in enumerate(first_frames):
+            self.__scene.frame_set(int(frames['frame'][row]))
+            evaluated: Object = camera.evaluated_get(bpy.context.evaluated_depsgraph_get())
+            matrices[i] = np.array(evaluated.matrix_world, dtype=np.float32)
+        self.__scene.frame_set(current_frame)
+
+        render = self.__scene.render
+        scale: float = render.resolution_percentage/100
+        intrinsics: dict[str, float] = camera_intrinsics(
+            camera.data.lens, camera.data.sensor_width, camera.data.sensor_height, camera.data.sensor_fit,
+            int(render.resolution_x*scale), int(render.resolution_y*scale), camera.data.shift_x, camera.data.shift_y
+        )
+
+        # Packed frames are named by their shard member, loose ones by their path in the dataset
+        if self.__cfg.pack_shards:
+            image_files: list[str] = [f'{frame:08d}.{FrameType.RAW.value}.png' for frame in frames['frame']]
+            mask_files: list[str] = [f'{frame:08d}.{FrameType.MASK.value}.png' for frame in frames['frame']]
+        else:
+            image_files: list[str] = [os.path.relpath(self.frame_path(FrameType.RAW, frame), self.__cfg.dataset_folder) for frame in frames['frame']]
+            mask_files: list[str] = [os.path.relpath(self.frame_path(FrameType.MASK, frame), self.__cfg.dataset_folder) for frame in frames['frame']]
+
+        # Uncropped frames cover the whole image
+        if self.__crop_regions is not None:
+            crops: np.ndarray = self.__crop_regions.rects
+        else:
+            crops: np.ndarray = np.tile([0, 0, int(render.resolution_x*scale), int(render.resolution_y*scale)], (len(frames), 1))
+
+        index: np.ndarray = build_index(frames, image_files, mask_files, matrices[pose_ids.ravel()],
+                                        self.__grease_height*frames['liquid_level']*.01, intrinsics, crops)
+        write_index(self.__cfg.dataset_folder, index)
+
+        print(f'Wrote the frame index for {len(frames)} frames ({len(first_frames)} camera poses) in {time.perf_counter() - start:.3f}s')
+
+    def finish_run(self):
+        # Workers each write their own profile, named like their manifest
+        self.profile.print_summary()
+        self.profile.write(self.__cfg.dataset_folder, 'profile' + self.__manifest_name.removeprefix('manifest'))
+        self.__record_history()
+
+        if self.__grease_cache is not None:
+            self.__grease_cache.clear()
+
+    def __record_history(self):
+        # Measured speed and file sizes, used to estimate later renders with the same settings
+        sizes: dict[str, list[int]] = {}
+        for entry in read_manifests(self.__cfg.dataset_folder):
+            sizes.setdefault(entry['type'], []).append(entry['size'])
+
+        for frame_type in FrameType:
+            times: list[float] = self.render_times[frame_type]
+            type_sizes: list[int] = sizes.get(frame_type.value, [])
+            if len(times) == 0 and len(type_sizes) == 0:
+                continue
+
+            append_history(self.__cfg.directory, {
+                'time': time.time(),
+                'dataset_name': self.__cfg.dataset_name,
+                'type': frame_type.value,
+                'width': self.__cfg.width,
+                'height': self.__cfg.height,
+                'samples': self.__cfg.sample_amount,
+                'seconds_per_frame': sum(times)/len(times) if len(times) > 0 else None,
+                'bytes_per_frame': sum(type_sizes)/len(type_sizes) if len(type_sizes) > 0 else None
+            })
+
+    def __plan_crops(self, metadata_only: bool):
+        """
+        Plans the crop regions, or loads them from the workers for metadata. Workers save them with a
+        hash of the plan and crop settings, so regions of an earlier plan aren't mistaken for these.
+        """
+        path: str = os.path.join(self.__cfg.dataset_folder, 'crops.npz')
+        key: str = plan_hash(self.__frames, {
+            'crop': self.__cfg.crop_mode.name, 'padding': self.__cfg.crop_padding, 'width': self.__cfg.width, 'height': self.__cfg.height
+        })
+
+        if metadata_only and os.path.isfile(path):
+            with np.load(path) as saved:
+                if str(saved['plan']) == key:
+                    self.__crop_regions.rects = saved['rects']
+                    return
+
+        with self.profile.phase('plan_crops'):
+            self.__crop_regions.plan()
+
+        if not metadata_only:
+            os.makedirs(self.__cfg.dataset_folder, exist_ok=True)
+            temp_path: str = f'{path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                np.savez(f, rects=self.__crop_regions.rects, plan=np.array(key))
+            os.replace(temp_path, path)
+
+    def close_shards(self):
+        if self.__shards is not None:
+            self.__shards.close()
+
+    def __calibration_path(self) -> str:
+        return os.path.join(self.__cfg.dataset_folder, 'calibration.json')
+
+    def __calibration_settings(self) -> dict:
+        # A calibration is only reused for the same settings
+        return {'width': self.__cfg.width, 'height': self.__cfg.height, 'max_samples': self.__cfg.sample_amount}
+
+    def __calibrate(self):
+        path: str = self.__calibration_path()
+        lock_path: str = f'{path}.lock'
+        settings: dict = self.__calibration_settings()
+
+        # Resumed renders and other workers reuse the first calibration, so every frame renders alike.
+        # Workers started together leave it to whoever claims the lock, so the probes don't compete for cores.
+        wait_start: float = time.time()
+        waiting: bool = False
+        while True:
+            self.__calibration = self.__read_calibration(path, settings)
+            if self.__calibration is not None:
+                print(f'Using the calibration from {path}')
+                return
+
+            if claim_lock(lock_path):
+                break
+
+            # A worker that was killed while calibrating leaves its lock behind
+            owner: dict | None = read_lock(lock_path)
+            if lock_is_stale(lock_path, owner):
+                print(f'Taking over the calibration from {describe_owner(owner)}, which stopped')
+                break_lock(lock_path, owner)
+                continue
+
+            if time.time() - wait_start > 2*LOCK_TIMEOUT:
+                raise Exception(f'Gave up waiting for {describe_owner(owner)} to calibrate, check {lock_path}')
+            if not waiting:
+                print(f'Waiting for {describe_owner(owner)} to calibrate')
+                waiting = True
+            time.sleep(5)
+
+        try:
+            # Another worker might have finished between reading and claiming
+            self.__calibration = self.__read_calibration(path, settings)
+            if self.__calibration is None:
+                self.__calibration = self.__run_calibration(settings, lock_path)
+
+                temp_path: str = f'{path}.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump(self.__calibration, f, indent=4)
+                os.replace(temp_path, path)
+        finally:
+            os.remove(lock_path)
+
+    def __read_calibration(self, path: str, settings: dict) -> dict | None:
+        if not os.path.isfile(path):
+            return None
+
+        with open(path) as f:
+            calibration: dict = json.load(f)
+        if calibration['budget'] != self.__cfg.frame_time_budget or any(calibration.get(key) != value for key, value in settings.items()):
+            return None
+
+        return calibration
+
+    def __run_calibration(self, settings: dict, lock_path: str) -> dict:
+        probes: list[int] = probe_frames(self.__frames)
+        print(f'Calibrating for {self.__cfg.frame_time_budget:g}s per frame with frames {", ".join(map(str, probes))}')
+
+        self.__setup_engine(FrameType.RAW)
+        self.__scene.cycles.time_limit = 0
+
+        # The file output nodes would write auxiliary passes and masks of the probes into the dataset
+        use_compositing: bool = self.__scene.render.use_compositing
+        self.__scene.render.use_compositing = False
+
+        measurements: dict[float, list[float]] = {}
+        try:
+            # The first render also builds the BVH and loads kernels
+            self.__scene.frame_set(probes[0])
+            bpy.ops.render.render()
+
+            for threshold in THRESHOLDS:
+                self.__scene.cycles.adaptive_threshold = threshold
+                times: list[float] = []
+                for frame in probes:
+                    self.__scene.frame_set(frame)
+                    start: float = time.perf_counter()
+                    bpy.ops.render.render()
+                    times.append(time.perf_counter() - start)
+                    # Shows waiting workers the calibration is still going
+                    os.utime(lock_path)
+
+                measurements[threshold] = times
+                print(f'Noise threshold {threshold:g}: {max(times):.2f}s slowest probe')
+
+                # Lower thresholds only take longer
+                if max(times) > self.__cfg.frame_time_budget:
+                    break
+        finally:
+            self.__scene.render.use_compositing = use_compositing
+
+        calibration: dict = choose_settings(measurements, self.__cfg.sample_amount, self.__cfg.frame_time_budget)
+        calibration.update(settings, probes=probes)
+
+        print(f'Calibrated to {calibration["samples"]} samples with a noise threshold of {calibration["adaptive_threshold"]:g}'
+              f' ({calibration["predicted_seconds"]:.2f}s per frame)')
+        return calibration
+
+    def __apply_rgb_sampling(self):
+        if self.__calibration is None:
+            self.__scene.cycles.samples = self.__cfg.sample_amount
+            self.__scene.cycles.time_limit = 60
+            return
+
+        self.__scene.cycles.samples = self.__calibration['samples']
+        self.__scene.cycles.adaptive_threshold = self.__calibration['adaptive_threshold']
+        self.__scene.cycles.time_limit = self.__calibration['time_limit']
+
+    def __generate_keyframes(self, ctx: Context, frames: np.ndarray, bulk: bool=True, force: bool=False):
+        start: float = time.perf_counter()
+
         ctx.scene.frame_start = 1
-        ctx.scene.frame_end = frames.max_length()
+        ctx.scene.frame_end = len(frames)
+
+        # Objects and the grease height are the same for every frame
+        objects: dict[str, Object | Collection] = get_objects(ctx.scene)
+        grease_height: float = objects['grease'].dimensions.z
+        self.__grease_height = grease_height
+
+        # The scene still has the keyframes of this exact plan, such as when rendering it again.
+        # Timing comparisons force keyframing, or they'd measure the skip.
+        keyframes_hash: str = plan_hash(frames, {'focal_length': self.__cfg.focal_length, 'grease_height': grease_height})
+        animated: bool = all(objects[name].animation_data is not None for name in ('camera', 'camera_track', 'bin_cutter', 'seg_cutter'))
+        if ctx.scene.gb_data.keyframes_hash == keyframes_hash and animated and not force:
+            print(f'Keyframes for {len(frames)} frames are up to date')
+            return
 
         # Clear old keyframes
-        for obj in get_objects(ctx.scene).values():
+        for obj in objects.values():
             if isinstance(obj, Collection):
                 continue
             if obj.animation_data:
                 obj.animation_data_clear()
 
-        for i in range(1, frames.max_length()):
-            frame: FrameData = frames.pop()
-            frame.generate_keyframe(i)
+        if bulk:
+            write_keyframes(objects, self.__cfg, grease_height, frames)
+        else:
+            for row in frames:
+                frame: FrameData = FrameData(objects, self.__cfg, grease_height, float(row['azimuth']), float(row['elevation']),
+                                             float(row['zoom']), float(row['liquid_level']))
+                frame.generate_keyframe(int(row['frame']))
+
+        ctx.scene.gb_data.keyframes_hash = keyframes_hash
 
-        ctx.scene.gb_data.keyframes_generated = True
+        print(f'Generated keyframes for {len(frames)} frames in {time.perf_counter() - start:.3f}s ({"bulk" if bulk else "per frame"})')
 
     def __setup_engine(self, frame_type: FrameType):    
         objects: dict[str, Object] = get_objects(self.__scene)
@@ -269,18 +1083,44 @@ class AnimationSequence():
 
         self.__scene.render.engine = 'CYCLES'
 
+        # Keeps static geometry, its BVH and images loaded between frames and passes, so Cycles
+        # only syncs the camera, the track and the cutters again
+        self.__scene.render.use_persistent_data = self.__cfg.persistent_data
+
         self.__scene.frame_current = 1
         self.__scene.render.resolution_x = self.__cfg.width
         self.__scene.render.resolution_y = self.__cfg.height
 
         # Enable emmision pass; Used for masks
         self.__scene.view_layers["ViewLayer"].use_pass_emit = True
+
+        self.__setup_view_layers(frame_type, rgb_bin_collection, seg_bin_collection)
         
-        if frame_type == FrameType.RAW: # Settings for rendering RGB images
+        if frame_type == FrameType.COMBINED: # Settings for rendering RGB images and masks in one pass
+            # RGB settings apply to the whole scene, the segmentation layer overrides its own samples
+            self.__apply_rgb_sampling()
+            self.__scene.cycles.filter_width = RGB_FILTER_WIDTH
+
+            # Dithering would be applied to the masks as well
+            self.__scene.render.dither_intensity = 0.0
+
+            self.__scene.cycles.use_denoising = True
+            self.__scene.cycles.use_adaptive_sampling = True
+            self.__scene.view_settings.view_transform = 'AgX'
+
+            # The mask profile would apply to the RGB view layer as well
+            apply_settings(self.__scene, self.__default_profile)
+
+            # Both bins render, each view layer excludes the other one
+            rgb_bin_collection.hide_render = False
+            seg_bin_collection.hide_render = False
+
+            # Composite result is the RGB image, the mask is written by its own file output node
+            self.__scene.node_tree.nodes['Switch'].check = False
+        elif frame_type == FrameType.RAW: # Settings for rendering RGB images
             # Set samples, time limit, dithering, and anti-aliasing
-            self.__scene.cycles.samples = self.__cfg.sample_amount
-            self.__scene.cycles.time_limit = 60
-            self.__scene.cycles.filter_width = 1.5
+            self.__apply_rgb_sampling()
+            self.__scene.cycles.filter_width = RGB_FILTER_WIDTH
             self.__scene.render.dither_intensity = 1.0
             
             # Enable denoising and adaptive sampling ('noise threshold')
@@ -290,6 +1130,9 @@ class AnimationSequence():
             # Change color profile to one that adds color grading
             self.__scene.view_settings.view_transform = 'AgX'
 
+            # Undo the mask profile
+            apply_settings(self.__scene, self.__default_profile)
+
             # Setup render visibility
             rgb_bin_collection.hide_render = False
             seg_bin_collection.hide_render = True
@@ -300,7 +1143,7 @@ class AnimationSequence():
             # Lower samples, set time limit to 0, and disable anti-aliasing and dithering
             self.__scene.cycles.samples = 1
             self.__scene.cycles.time_limit = 0
-            self.__scene.cycles.filter_width = 0.01
+            self.__scene.cycles.filter_width = MASK_FILTER_WIDTH
             self.__scene.render.dither_intensity = 0.0
 
             # Disable denoising and adaptive sampling
@@ -310,6 +1153,9 @@ class AnimationSequence():
             # Change color profile to one which doesn't change the colors
             self.__scene.view_settings.view_transform = 'Raw'
 
+            # Skip light paths, shadows, volumes and passes that flat emission doesn't need
+            apply_settings(self.__scene, MASK_PROFILE)
+
             # Setup render visibility
             rgb_bin_collection.hide_render = True
             seg_bin_collection.hide_render = False
@@ -317,6 +1163,170 @@ class AnimationSequence():
             # Setup compositor
             self.__scene.node_tree.nodes['Switch'].check = True
 
+        captured_type: FrameType | None = self.__captured_type(frame_type)
+        if captured_type is not None:
+            self.__setup_viewer(frame_type, captured_type)
+
+        self.__setup_aux_passes(frame_type)
+
+    def __setup_aux_passes(self, frame_type: FrameType):
+        tree: CompositorNodeTree = self.__scene.node_tree
+        output_node: Node | None = tree.nodes.get(AUX_OUTPUT_NODE)
+        active: bool = frame_type == self.__aux_pass
+
+        # Nothing to undo if auxiliary passes were never used in this file
+        if output_node is None and not active:
+            return
+        if output_node is not None:
+            output_node.mute = not active
+        if not active:
+            return
+
+        # Passes have to be enabled before the render layer node shows their sockets. This comes
+        # after the mask profile, which turns depth and normals off.
+        rgb_layer: ViewLayer = self.__scene.view_layers["ViewLayer"]
+        for name in self.__cfg.aux_passes:
+            setattr(rgb_layer, AUX_PASSES[name][0], True)
+
+        layer_node: Node = tree.nodes.get(AUX_LAYER_NODE) or tree.nodes.new('CompositorNodeRLayers')
+        layer_node.name = AUX_LAYER_NODE
+        layer_node.layer = "ViewLayer"
+
+        output_node = output_node or tree.nodes.new('CompositorNodeOutputFile')
+        output_node.name = AUX_OUTPUT_NODE
+        output_node.base_path = self.__cfg.dataset_folder
+        output_node.mute = False
+
+        # One half float EXR per pass and frame, in a folder named after the pass
+        output_node.file_slots.clear()
+        for name in self.__cfg.aux_passes:
+            slot = output_node.file_slots.new(name)
+            slot.path = f'{name}/{name}_########'
+            slot.use_node_format = False
+            slot.format.file_format = 'OPEN_EXR'
+            slot.format.color_depth = '16'
+            slot.format.exr_codec = 'ZIP'
+            slot.format.color_mode = 'RGB' if name == 'normal' else 'BW'
+            tree.links.new(layer_node.outputs[AUX_PASSES[name][1]], output_node.inputs[name])
+
+    def __setup_viewer(self, frame_type: FrameType, captured_type: FrameType):
+        tree: CompositorNodeTree = self.__scene.node_tree
+        viewer: Node = tree.nodes.get(VIEWER_NODE) or tree.nodes.new('CompositorNodeViewer')
+        viewer.name = VIEWER_NODE
+        tree.nodes.active = viewer
+
+        # Single pass masks are the segmentation layer's emission, which are already the label colors
+        if frame_type == FrameType.COMBINED and captured_type == FrameType.MASK:
+            tree.links.new(tree.nodes[SEG_LAYER_NODE].outputs['Emit'], viewer.inputs['Image'])
+            return
+
+        view_settings = self.__scene.view_settings
+        if view_settings.view_transform not in DISPLAY_COLORSPACES:
+            raise Exception(f'Buffered output doesn\'t support the "{view_settings.view_transform}" view transform')
+        if view_settings.look != 'None' or view_settings.exposure != 0 or view_settings.gamma != 1 or view_settings.use_curve_mapping:
+            raise Exception('Buffered output doesn\'t support looks, exposure, gamma or curves, use direct output instead')
+
+        composite: Node | None = next((node for node in tree.nodes if node.type == 'COMPOSITE'), None)
+        if composite is None or not composite.inputs['Image'].is_linked:
+            raise Exception('Buffered output needs a connected Composite node in the compositor')
+
+        # The viewer shows what the composite node gets, converted to display colors
+        source = composite.inputs['Image'].links[0].from_socket
+        colorspace: str | None = DISPLAY_COLORSPACES[view_settings.view_transform]
+        if colorspace is None:
+            tree.links.new(source, viewer.inputs['Image'])
+            return
+
+        convert: Node = tree.nodes.get(VIEWER_COLORSPACE_NODE) or tree.nodes.new('CompositorNodeConvertColorSpace')
+        convert.name = VIEWER_COLORSPACE_NODE
+        convert.from_color_space = 'Linear Rec.709'
+        convert.to_color_space = colorspace
+        tree.links.new(source, convert.inputs['Image'])
+        tree.links.new(convert.outputs['Image'], viewer.inputs['Image'])
+
+    def __setup_view_layers(self, frame_type: FrameType, rgb_bin_collection: Collection, seg_bin_collection: Collection):
+        rgb_layer: ViewLayer = self.__scene.view_layers["ViewLayer"]
+        seg_layer: ViewLayer | None = self.__scene.view_layers.get(SEG_VIEW_LAYER)
+        single_pass: bool = frame_type == FrameType.COMBINED
+
+        if seg_layer is None:
+            # Nothing to undo if single pass rendering was never used in this file
+            if not single_pass:
+                return
+            seg_layer = self.__scene.view_layers.new(SEG_VIEW_LAYER)
+
+        # RGB view layer renders the textured bin, segmentation view layer renders the segmented bin
+        find_layer_collection(rgb_layer.layer_collection, seg_bin_collection).exclude = single_pass
+        find_layer_collection(seg_layer.layer_collection, rgb_bin_collection).exclude = True
+        find_layer_collection(seg_layer.layer_collection, seg_bin_collection).exclude = False
+        seg_layer.use = single_pass
+
+        # Flat emission only needs a single sample
+        rgb_layer.samples = 0
+        seg_layer.samples = 1
+        seg_layer.cycles.use_denoising = False
+        seg_layer.use_pass_emit = True
+
+        # Write the emission pass of the segmentation layer straight to the masks folder
+        tree: CompositorNodeTree = self.__scene.node_tree
+        layer_node: Node = tree.nodes.get(SEG_LAYER_NODE) or tree.nodes.new('CompositorNodeRLayers')
+        layer_node.name = SEG_LAYER_NODE
+        layer_node.layer = SEG_VIEW_LAYER
+
+        output_node: Node = tree.nodes.get(MASK_OUTPUT_NODE) or tree.nodes.new('CompositorNodeOutputFile')
+        output_node.name = MASK_OUTPUT_NODE
+        output_node.base_path = self.__cfg.mask_dir
+        output_node.file_slots[0].path = f'{self.__cfg.mask_prefix}_########'
+        output_node.format.file_format = 'PNG'
+        output_node.format.color_mode = 'RGB'
+        output_node.format.color_depth = '8'
+        output_node.format.color_management = 'OVERRIDE'
+        output_node.format.view_settings.view_transform = 'Raw'
+        output_node.mute = not single_pass or self.__cfg.mask_format != MaskFormat.RGB
+
+        tree.links.new(layer_node.outputs['Emit'], output_node.inputs[0])
+
+def write_keyframes(objects: dict[str, Object | Collection], cfg: RenderConfig, grease_height: float, frames: np.ndarray):
+    """
+    Writes the whole animation at once by filling F-curves from the plan arrays, which
+    skips the RNA lookups and depsgraph updates keyframe_insert does for every key.
+    """
+    camera: Object = objects['camera']
+    camera_track: Object = objects['camera_track']
+
+    # Properties that aren't animated
+    camera.data.lens = cfg.focal_length
+    camera_track.rotation_mode = 'XYZ'
+
+    cutter_height: np.ndarray = grease_height*(frames['liquid_level']*.01)
+    curves: list[tuple[Object, str, int, np.ndarray]] = [
+        (camera, 'constraints["Follow Path"].offset_factor', 0, 0.25 + frames['elevation']/360),
+        (camera_track, 'rotation_euler', 2, np.radians(frames['azimuth'])),
+        (camera_track, 'scale', 0, frames['zoom']),
+        (camera_track, 'scale', 1, frames['zoom']),
+        (camera_track, 'scale', 2, frames['zoom']),
+        (objects['bin_cutter'], 'location', 2, cutter_height),
+        (objects['seg_cutter'], 'location', 2, cutter_height)
+    ]
+
+    # Keyframe points are stored as flat (frame, value) pairs
+    co: np.ndarray = np.empty(2*len(frames), dtype=np.float32)
+    co[0::2] = frames['frame']
+    interpolation: np.ndarray = np.zeros(len(frames), dtype=np.int32)  # 'CONSTANT'
+
+    for obj, data_path, index, values in curves:
+        if obj.animation_data is None:
+            obj.animation_data_create()
+        if obj.animation_data.action is None:
+            obj.animation_data.action = bpy.data.actions.new(f'{obj.name}Action')
+
+        fcurve: bpy.types.FCurve = obj.animation_data.action.fcurves.new(data_path, index=index)
+        co[1::2] = values
+        fcurve.keyframe_points.add(len(frames))
+        fcurve.keyframe_points.foreach_set('co', co)
+        fcurve.keyframe_points.foreach_set('interpolation', interpolation)
+        fcurve.update()
+
 def get_objects(scene: Scene) -> dict[str, Object | Collection]:
     object_selection_props = scene.object_selection_elements
     objects = {
@@ -363,51 +1373,220 @@ def get_objects(scene: Scene) -> dict[str, Object | Collection]:
     
     return objects
 
-def create_frames(scene: Scene) -> RenderQueue:
-    cfg: RenderConfig = RenderConfig(scene)
-
-    # Creating Directories
-    if not os.path.exists(cfg.dataset_folder):
-        os.mkdir(cfg.dataset_folder)
-    if not os.path.exists(cfg.mask_dir):
-        os.mkdir(cfg.mask_dir)
-    if not os.path.exists(cfg.image_dir):
-        os.mkdir(cfg.image_dir)
-
-    # Loop variables
-    frames: RenderQueue = RenderQueue()
+def capture_settings(scene: Scene, settings: dict[str, object]) -> dict[str, object]:
+    captured: dict[str, object] = {}
+    for path in settings:
+        owner_path, attr = path.rsplit('.', 1)
+        captured[path] = getattr(scene.path_resolve(owner_path), attr)
+
+    return captured
+
+def apply_settings(scene: Scene, settings: dict[str, object]):
+    for path, value in settings.items():
+        owner_path, attr = path.rsplit('.', 1)
+        setattr(scene.path_resolve(owner_path), attr, value)
+
+def scene_fingerprint(scene: Scene) -> str:
+    """
+    Digest of the .blend file and the scene data that changes rendered pixels: objects with their
+    geometry, modifiers, lights and cameras, materials and the world. Animated objects are hashed
+    without their transforms, since the plan moves them. Meshes are hashed before modifiers, as
+    the cut grease differs from frame to frame, but the modifier settings are hashed with them.
+    """
+    digest = hashlib.sha256(bpy.data.filepath.encode())
+    materials: dict[str, bpy.types.Material] = {}
+
+    for obj in sorted(scene.objects, key=lambda obj: obj.name):
+        animated: bool = obj.animation_data is not None and obj.animation_data.action is not None
+        values: dict = {
+            'name': obj.name,
+            'type': obj.type,
+            'parent': None if obj.parent is None else obj.parent.name,
+            'transform': None if animated else [list(row) for row in obj.matrix_basis],
+            'modifiers': [rna_values(modifier) for modifier in obj.modifiers]
+        }
 
-    max_zoom: float = cfg.starting_zoom + (cfg.zoom_levels - 1)*cfg.zoom_step
+        if obj.type == 'MESH':
+            digest.update(mesh_digest(obj.data).encode())
+        elif obj.type == 'CAMERA':
+            # The focal length is part of the settings, and keyframing sets it on the camera
+            values['data'] = {name: value for name, value in rna_values(obj.data).items() if name != 'lens'}
+        elif obj.data is not None:
+            values['data'] = rna_values(obj.data)
+
+        for slot in obj.material_slots:
+            if slot.material is not None:
+                materials[slot.material.name] = slot.material
+        digest.update(json.dumps(values, sort_keys=True, default=list).encode())
+
+    for name in sorted(materials):
+        digest.update(json.dumps(node_tree_values(materials[name].node_tree), sort_keys=True, default=list).encode())
+    if scene.world is not None:
+        digest.update(json.dumps([rna_values(scene.world), node_tree_values(scene.world.node_tree)], sort_keys=True, default=list).encode())
+
+    return digest.hexdigest()
+
+def mesh_digest(mesh: bpy.types.Mesh) -> str:
+    digest = hashlib.sha256()
+    coordinates: np.ndarray = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coordinates)
+    loops: np.ndarray = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    digest.update(coordinates.tobytes())
+    digest.update(loops.tobytes())
+
+    if mesh.uv_layers.active is not None:
+        uvs: np.ndarray = np.empty(len(mesh.loops)*2, dtype=np.float32)
+        mesh.uv_layers.active.data.foreach_get('uv', uvs)
+        digest.update(uvs.tobytes())
+
+    return digest.hexdigest()
+
+def node_tree_values(tree: bpy.types.NodeTree | None) -> list:
+    if tree is None:
+        return []
+
+    values: list = []
+    for node in sorted(tree.nodes, key=lambda node: node.name):
+        values.append([node.name, node.bl_idname, rna_values(node), [
+            rna_values(socket) for socket in node.inputs if hasattr(socket, 'default_value')
+        ]])
+        # Node groups are hashed with their contents
+        if getattr(node, 'node_tree', None) is not None:
+            values.append(node_tree_values(node.node_tree))
+
+    values.append(sorted(
+        [link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier] for link in tree.links
+    ))
+    return values
+
+# Editor state that doesn't change the image
+UI_PROPERTIES: set[str] = {
+    'select', 'location', 'width', 'height', 'hide', 'color', 'use_custom_color', 'label', 'is_active', 'use_fake_user',
+    'tag', 'show_expanded', 'show_options', 'show_preview', 'show_texture', 'show_viewport', 'show_in_editmode', 'show_on_cage'
+}
+
+def rna_values(struct: bpy.types.bpy_struct) -> dict:
+    # Settable properties of a data block, with linked data blocks by name. Read only properties
+    # are derived or runtime state, such as user counts and evaluation times.
+    values: dict = {}
+    for prop in struct.bl_rna.properties:
+        if prop.is_readonly or prop.type == 'COLLECTION' or prop.identifier in UI_PROPERTIES:
+            continue
+
+        value = getattr(struct, prop.identifier, None)
+        if prop.type == 'POINTER':
+            values[prop.identifier] = getattr(value, 'name_full', None)
+        elif isinstance(value, set):
+            values[prop.identifier] = sorted(value)
+        elif hasattr(value, '__len__') and not isinstance(value, str):
+            values[prop.identifier] = [list(item) if hasattr(item, '__len__') else item for item in value]
+        else:
+            values[prop.identifier] = value
 
-    curr_zoom: float = cfg.starting_zoom
-    curr_azimuth: int = cfg.starting_elevation
-    curr_elevation: int = 0
-    liquid_level = 0
+    return values
 
-    while liquid_level < 100:
-        liquid_level = min((liquid_level + cfg.liquid_level_step), 100)
+def find_layer_collection(layer_collection: LayerCollection, collection: Collection) -> LayerCollection | None:
+    if layer_collection.collection == collection:
+        return layer_collection
 
-        while curr_zoom <= max_zoom:
-            while curr_elevation <= cfg.max_elevation:
-                while curr_azimuth < 360:
-                    frame_data: FrameData = FrameData(scene, cfg, curr_azimuth, curr_elevation, curr_zoom, liquid_level)
-                    frames.add(frame_data)
+    for child in layer_collection.children:
+        found: LayerCollection | None = find_layer_collection(child, collection)
+        if found is not None:
+            return found
 
-                    curr_azimuth += cfg.azimuth_step
+    return None
 
-                curr_elevation += cfg.elevation_step
-                curr_azimuth = 0
+def create_frames(scene: Scene) -> np.ndarray:
+    cfg: RenderConfig = RenderConfig(scene)
 
-            curr_zoom += cfg.zoom_step
-            curr_elevation = cfg.starting_elevation
-            curr_azimuth = 0
+    # Creating Directories
+    os.makedirs(cfg.mask_dir, exist_ok=True)
+    os.makedirs(cfg.image_dir, exist_ok=True)
 
-        curr_zoom = cfg.starting_zoom
-        curr_elevation = cfg.starting_elevation
-        curr_azimuth = 0
+    frames: np.ndarray = plan_frames(cfg)
+    if len(frames) == 0:
+        raise Exception('These settings don\'t produce any frames. Check the elevation settings.')
 
-    print(f'First frame: {frames[0]}')
-    print(f'Last frame: {frames[len(frames)-1]}')
+    print(f'First frame: {describe_frame(frames[0])}')
+    print(f'Last frame: {describe_frame(frames[-1])}')
     print(f'Rendering {len(frames)} frames.')
         
     return frames
+
+def plan_report(scene: Scene) -> dict:
+    """
+    Frames left to render and write for each type, with their predicted time and disk usage.
+    """
+    cfg: RenderConfig = RenderConfig(scene)
+    frame_count: int = plan_size(cfg)
+    frame_types: tuple[FrameType, ...] = RENDER_SEQUENCES[cfg.sequence_setting]
+
+    # Frames an earlier render finished are skipped when resuming
+    completed: dict[str, set[int]] = {FrameType.MASK.value: set(), FrameType.RAW.value: set()}
+    if cfg.resume and os.path.isdir(cfg.dataset_folder):
+        for entry in read_manifests(cfg.dataset_folder):
+            if entry['frame'] <= frame_count:
+                completed.setdefault(entry['type'], set()).add(entry['frame'])
+
+    render_counts: dict[str, int] = {}
+    output_counts: dict[str, int] = {}
+    for frame_type in frame_types:
+        if frame_type == FrameType.COMBINED:
+            both: set[int] = completed[FrameType.MASK.value] & completed[FrameType.RAW.value]
+            render_counts[frame_type.value] = frame_count - len(both)
+            output_counts[FrameType.MASK.value] = frame_count - len(both)
+            output_counts[FrameType.RAW.value] = frame_count - len(both)
+        else:
+            render_counts[frame_type.value] = frame_count - len(completed[frame_type.value])
+            output_counts[frame_type.value] = frame_count - len(completed[frame_type.value])
+
+    return {
+        'directory': cfg.directory,
+        'frames': frame_count,
+        'render_frames': render_counts,
+        'output_frames': output_counts,
+        'estimate': estimate_render(render_counts, output_counts, read_history(cfg.directory), cfg.width, cfg.height, cfg.sample_amount),
+        'free_bytes': shutil.disk_usage(cfg.directory).free
+    }
+
+def print_plan_report(report: dict):
+    estimate: dict = report['estimate']
+
+    print(f'Plan: {report["frames"]} frames')
+    for frame_type, count in report['render_frames'].items():
+        seconds: float | None = estimate['seconds'][frame_type]
+        print(f'  Render {frame_type}: {count} frames, {"unknown time" if seconds is None else format_duration(seconds)}')
+    for frame_type, count in report['output_frames'].items():
+        size: float | None = estimate['bytes'][frame_type]
+        print(f'  Write {frame_type}: {count} files, {"unknown size" if size is None else format_size(size)}')
+
+    print(f'  Total: {summarize_plan_report(report)}')
+    if not estimate['exact']:
+        print('  No earlier render with the same resolution and samples, so estimates are scaled from other settings')
+
+def summarize_plan_report(report: dict) -> str:
+    estimate: dict = report['estimate']
+    seconds: str = 'unknown time' if estimate['total_seconds'] is None else format_duration(estimate['total_seconds'])
+    size: str = 'unknown size' if estimate['total_bytes'] is None else format_size(estimate['total_bytes'])
+
+    return f'{sum(report["render_frames"].values())} frames, {seconds}, {size} of {format_size(report["free_bytes"])} free'
+
+def check_disk_space(report: dict):
+    # Some headroom for metadata, shards being packed and estimate error
+    needed: float | None = report['estimate']['total_bytes']
+    if needed is not None and needed*1.1 > report['free_bytes']:
+        raise Exception(f'Not enough disk space in "{report["directory"]}": the render needs about {format_size(needed)}, '
+                        f'but only {format_size(report["free_bytes"])} is free')
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}'
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
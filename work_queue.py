@@ -0,0 +1,193 @@
+"""
+Work queue on a shared directory, so render nodes can split a dataset without a
+server. The plan is published as chunk files in `pending`, and a worker leases a
+chunk by renaming it into `leased`, which only one worker can win. Workers touch
+their lease while rendering, and leases that stop being touched are put back in
+`pending` by whoever notices first. Finished chunks move to `done`. This module
+doesn't import bpy.
+
+    queue/
+        plan.json               Chunk size, frame count and plan hash
+        pending/000042.json     {"chunk": 42, "frames": [...]}
+        leased/000042.node-a-1234.json
+        done/000041.json
+"""
+import glob
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+
+QUEUE_STATES: tuple[str, ...] = ('pending', 'leased', 'done')
+
+class Lease():
+    def __init__(self, chunk: int, frames: list[int], path: str):
+        self.chunk: int = chunk
+        self.frames: list[int] = frames
+        self.path: str = path
+
+class WorkQueue():
+    def __init__(self, folder: str, worker: str | None=None, lease_timeout: float=600):
+        self.folder: str = folder
+        self.worker: str = f'{socket.gethostname()}-{os.getpid()}' if worker is None else worker
+        self.lease_timeout: float = lease_timeout
+
+        self.__heartbeat_stop: threading.Event | None = None
+        self.__heartbeat_thread: threading.Thread | None = None
+
+    def publish(self, frames: list[int], chunk_size: int, plan_hash: str):
+        """
+        Splits the frames into chunks, unless another worker already did. Every worker calls this.
+        The queue is built in a temporary folder and renamed into place, so a worker that crashes
+        while publishing leaves nothing behind and only one worker's queue is used.
+        """
+        if os.path.isdir(self.folder):
+            self.__check_plan(plan_hash)
+            return
+
+        temp_folder: str = f'{self.folder}.{self.worker}.tmp'
+        for state in QUEUE_STATES:
+            os.makedirs(os.path.join(temp_folder, state), exist_ok=True)
+
+        for chunk, start in enumerate(range(0, len(frames), chunk_size)):
+            write_json(os.path.join(temp_folder, 'pending', f'{chunk:06d}.json'), {'chunk': chunk, 'frames': frames[start:start + chunk_size]})
+        write_json(os.path.join(temp_folder, 'plan.json'), {'chunk_size': chunk_size, 'frames': len(frames), 'plan_hash': plan_hash, 'published_by': self.worker})
+
+        try:
+            os.rename(temp_folder, self.folder)
+        except OSError:
+            # Another worker published first
+            shutil.rmtree(temp_folder, ignore_errors=True)
+            self.__check_plan(plan_hash)
+            return
+
+        print(f'Published {len(frames)} frames as {-(-len(frames)//chunk_size)} chunks to {self.folder}')
+
+    def lease(self) -> Lease | None:
+        """
+        Claims the lowest pending chunk, or returns None once nothing is pending. Chunks leased by
+        others might still come back if their lease expires, so check `finished` before stopping.
+        """
+        self.requeue_expired()
+
+        for path in sorted(glob.glob(os.path.join(self.folder, 'pending', '*.json'))):
+            name: str = os.path.basename(path).removesuffix('.json')
+            leased_path: str = os.path.join(self.folder, 'leased', f'{name}.{self.worker}.json')
+
+            # Only one worker's rename succeeds, the others move on to the next chunk
+            try:
+                os.rename(path, leased_path)
+            except FileNotFoundError:
+                continue
+
+            # The file keeps its old modification time through the rename
+            os.utime(leased_path)
+            with open(leased_path) as f:
+                chunk: dict = json.load(f)
+
+            lease: Lease = Lease(chunk['chunk'], chunk['frames'], leased_path)
+            self.__start_heartbeat(lease)
+            return lease
+
+        return None
+
+    def complete(self, lease: Lease) -> bool:
+        """
+        Marks a leased chunk as done. Returns False if the lease expired and the chunk was handed
+        out again, in which case its frames are already on disk for the next worker to skip.
+        """
+        self.__stop_heartbeat()
+        try:
+            os.rename(lease.path, os.path.join(self.folder, 'done', f'{lease.chunk:06d}.json'))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def release(self, lease: Lease):
+        # Gives a chunk back without finishing it, such as after an error
+        self.__stop_heartbeat()
+        try:
+            os.rename(lease.path, os.path.join(self.folder, 'pending', f'{lease.chunk:06d}.json'))
+        except FileNotFoundError:
+            pass
+
+    def requeue_expired(self):
+        now: float = time.time()
+        for path in glob.glob(os.path.join(self.folder, 'leased', '*.json')):
+            try:
+                if now - os.path.getmtime(path) < self.lease_timeout:
+                    continue
+
+                chunk: str = os.path.basename(path).split('.')[0]
+                os.rename(path, os.path.join(self.folder, 'pending', f'{chunk}.json'))
+                print(f'Lease on chunk {chunk} expired, putting it back in the queue')
+            except FileNotFoundError:
+                continue
+
+    def requeue_own(self):
+        # A restarted worker with the same name gives back what it held before it died
+        for path in glob.glob(os.path.join(self.folder, 'leased', f'*.{self.worker}.json')):
+            chunk: str = os.path.basename(path).split('.')[0]
+            try:
+                os.rename(path, os.path.join(self.folder, 'pending', f'{chunk}.json'))
+                print(f'Putting chunk {chunk} from an earlier run of {self.worker} back in the queue')
+            except FileNotFoundError:
+                continue
+
+    def claim(self, name: str) -> bool:
+        """
+        True for exactly one worker, for one-off steps such as writing metadata.json once the queue is finished.
+        """
+        try:
+            os.close(os.open(os.path.join(self.folder, f'{name}.claimed'), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except FileExistsError:
+            return False
+
+        return True
+
+    def status(self) -> dict[str, int]:
+        return {state: len(glob.glob(os.path.join(self.folder, state, '*.json'))) for state in QUEUE_STATES}
+
+    def finished(self) -> bool:
+        status: dict[str, int] = self.status()
+        return status['pending'] == 0 and status['leased'] == 0
+
+    def __check_plan(self, plan_hash: str):
+        with open(os.path.join(self.folder, 'plan.json')) as f:
+            plan: dict = json.load(f)
+
+        if plan['plan_hash'] != plan_hash:
+            raise Exception(f'The queue in {self.folder} was published for a different frame plan, check that every node uses the same settings')
+
+    def __start_heartbeat(self, lease: Lease):
+        # Touching the lease from a thread keeps it alive through frames longer than the timeout
+        self.__heartbeat_stop = threading.Event()
+
+        def beat(stop: threading.Event):
+            while not stop.wait(self.lease_timeout/4):
+                try:
+                    os.utime(lease.path)
+                except FileNotFoundError:
+                    return
+
+        self.__heartbeat_thread = threading.Thread(target=beat, args=(self.__heartbeat_stop,), daemon=True)
+        self.__heartbeat_thread.start()
+
+    def __stop_heartbeat(self):
+        if self.__heartbeat_stop is None:
+            return
+
+        self.__heartbeat_stop.set()
+        self.__heartbeat_thread.join()
+        self.__heartbeat_stop = None
+        self.__heartbeat_thread = None
+
+def write_json(path: str, data: dict):
+    # Other nodes never see a partially written file
+    temp_path: str = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)